@@ -0,0 +1,88 @@
+"""
+Rows/sec of EnergyConsumptionDAL bulk inserts into a scratch copy of the schema, for the
+row path (`bulk_insert` with COPY and with execute_values) and the columnar batch path
+(`bulk_insert_batches`). Each variant starts from empty tables and writes in chunks the
+size of one ETL round:
+
+    python -m benchmarks.bulk_insert --devices 200 --days 365 --chunk-days 31
+"""
+import argparse
+import json
+import time
+from array import array
+from datetime import date, timedelta
+from common.config import PostgresConfig
+from common.energy_consumption import EnergyConsumption, EnergyConsumptionBatch
+from common.energy_consumption_dal import EnergyConsumptionDAL
+from benchmarks.harness import insert_devices, scratch_schema
+
+SCHEMA = "bench_bulk_insert"
+START = date(2024, 1, 1)
+
+def _windows(days, chunk_days):
+    for offset in range(0, days, chunk_days):
+        yield START + timedelta(days=offset), min(chunk_days, days - offset)
+
+def _energy(device, ordinal):
+    return float(800 + (device * 37 + ordinal) % 400)
+
+def _row_chunks(device_ids, days, chunk_days):
+    for window_start, length in _windows(days, chunk_days):
+        yield [
+            EnergyConsumption(device_id, window_start + timedelta(days=day), _energy(i, (window_start + timedelta(days=day)).toordinal()))
+            for i, device_id in enumerate(device_ids)
+            for day in range(length)
+        ]
+
+def _batch_chunks(device_ids, days, chunk_days):
+    for window_start, length in _windows(days, chunk_days):
+        ordinals = array("l", range(window_start.toordinal(), window_start.toordinal() + length))
+        yield [
+            EnergyConsumptionBatch(device_id, ordinals, array("d", [_energy(i, ordinal) for ordinal in ordinals]))
+            for i, device_id in enumerate(device_ids)
+        ]
+
+def _reset(conn):
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE energy_consumption, energy_consumption_rollup;")
+    conn.commit()
+
+def bench_variant(conn, chunks, insert):
+    _reset(conn)
+    rows = 0
+    elapsed = 0.0
+    # Generating the input is not part of the measurement
+    for chunk in chunks:
+        started = time.perf_counter()
+        rows += insert(chunk)
+        conn.commit()
+        elapsed += time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 3), "rows_per_sec": round(rows / elapsed) if elapsed else None}
+
+def run(devices=200, days=365, chunk_days=31, partitioned=False):
+    device_ids = [f"device-{i:04d}" for i in range(devices)]
+    with scratch_schema(PostgresConfig().conn_string, SCHEMA, partitioned) as conn:
+        insert_devices(conn, device_ids)
+        copy_dal = EnergyConsumptionDAL(conn)
+        values_dal = EnergyConsumptionDAL(conn, use_copy=False)
+        copy_dal.ensure_partitions(START, START + timedelta(days=days))
+        return {
+            "devices": devices,
+            "days": days,
+            "partitioned": partitioned,
+            "bulk_insert_copy": bench_variant(conn, _row_chunks(device_ids, days, chunk_days), copy_dal.bulk_insert),
+            "bulk_insert_values": bench_variant(conn, _row_chunks(device_ids, days, chunk_days), values_dal.bulk_insert),
+            "bulk_insert_batches": bench_variant(conn, _batch_chunks(device_ids, days, chunk_days), copy_dal.bulk_insert_batches),
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--chunk-days", type=int, default=31)
+    parser.add_argument("--partitioned", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(run(args.devices, args.days, args.chunk_days, args.partitioned), indent=2))
+
+if __name__ == "__main__":
+    main()
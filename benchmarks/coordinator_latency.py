@@ -0,0 +1,64 @@
+"""
+p50/p99 latency of the coordinator's read endpoints under concurrent load. Point it at a
+running coordinator, e.g. the docker-compose one (ideally with LG_API_BASE_URL set to the
+LG API stub so `/devices` does not depend on the real API):
+
+    python -m benchmarks.coordinator_latency --url http://localhost:8000 --requests 500 --concurrency 8
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from benchmarks.harness import summarize_ms
+
+ENDPOINTS = {
+    "devices": "/devices",
+    "devices_page": "/devices?offset=0&limit=50",
+    "catalog_stats": "/devices/catalog/stats",
+    "energy_totals_month": "/energy/totals?period=month",
+    "energy_totals_day": "/energy/totals?period=day",
+}
+
+def bench_endpoint(client, path, requests, concurrency):
+    def call(_):
+        started = time.perf_counter()
+        try:
+            ok = client.get(path).is_success
+        except httpx.HTTPError:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    # Warm connections and caches (device catalog, rollups) before measuring
+    for _ in range(min(concurrency, requests)):
+        call(None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        **summarize_ms([ms for ms, _ in results]),
+        "errors": sum(1 for _, ok in results if not ok),
+        "requests_per_sec": round(requests / elapsed, 1),
+    }
+
+def run(url="http://localhost:8000", requests=500, concurrency=8, endpoints=None):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    with httpx.Client(base_url=url, timeout=30.0, limits=limits) as client:
+        return {
+            "url": url,
+            "concurrency": concurrency,
+            **{name: bench_endpoint(client, ENDPOINTS[name], requests, concurrency) for name in (endpoints or ENDPOINTS)},
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS), help="Limit to these endpoints (repeatable).")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.requests, args.concurrency, args.endpoint), indent=2))
+
+if __name__ == "__main__":
+    main()
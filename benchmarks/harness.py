@@ -0,0 +1,73 @@
+"""
+Shared pieces of the benchmark suite: latency summaries and scratch database schemas.
+
+Database benchmarks run against the PostgreSQL configured through the usual POSTGRES_*
+variables (e.g. the docker-compose Postgres). Each one builds the project schema from
+`sql/schema/` inside its own scratch schema, which is dropped afterwards, so the real
+tables are never touched.
+"""
+import statistics
+from contextlib import contextmanager
+from pathlib import Path
+import psycopg2
+
+SCHEMA_DIR = Path(__file__).resolve().parent.parent / "sql" / "schema"
+BASE_SCRIPTS = (
+    "01_create_devices.sql",
+    "02_create_energy_consumption.sql",
+    "03_create_energy_consumption_read_log.sql",
+    "04_create_energy_sync_pending.sql",
+    "05_create_energy_consumption_rollup.sql",
+    "07_create_energy_sync_leases.sql",
+    "08_create_energy_consumption_hourly.sql",
+    "09_create_energy_anomalies.sql",
+    "10_create_energy_sync_spool.sql",
+    "11_create_energy_consumption_empty_days.sql",
+)
+PARTITION_SCRIPT = "06_partition_energy_consumption.sql"
+
+def summarize_ms(samples):
+    """mean/p50/p99 of latency samples in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+def search_path_options(schema: str) -> str:
+    """libpq `options` (or PGOPTIONS for subprocesses) routing unqualified names to `schema`."""
+    return f"-c search_path={schema}"
+
+@contextmanager
+def scratch_schema(conn_string: str, schema: str, partitioned: bool = False):
+    """
+    Create `schema` with the project tables (monthly partitions when `partitioned`) and
+    yield a connection whose search_path points at it; the schema is dropped on exit.
+    """
+    conn = psycopg2.connect(conn_string, options=search_path_options(schema))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema};")
+            scripts = BASE_SCRIPTS + ((PARTITION_SCRIPT,) if partitioned else ())
+            for script in scripts:
+                cur.execute((SCHEMA_DIR / script).read_text())
+        conn.commit()
+        yield conn
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        conn.commit()
+        conn.close()
+
+def insert_devices(conn, device_ids):
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO devices (id, device_type, model_name, alias) VALUES (%s, 'DEVICE_REFRIGERATOR', 'STUB', %s) ON CONFLICT DO NOTHING;",
+            [(device_id, device_id) for device_id in device_ids]
+        )
+    conn.commit()
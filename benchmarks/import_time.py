@@ -0,0 +1,71 @@
+"""
+Import time of each entry point, measured in fresh interpreters with every LG_*, POSTGRES_*
+and RABBITMQ_* variable removed: importing a component must neither connect anywhere nor
+need its secrets. Exits with status 1 when an import fails or exceeds its budget.
+
+    python -m benchmarks.import_time --repeat 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET_PREFIXES = ("LG_", "POSTGRES_", "RABBITMQ_")
+
+# (name, module, working directory) — the ETL modules import each other as top-level modules
+ENTRY_POINTS = (
+    ("coordinator", "coordinator.main", ROOT),
+    ("coordinator_export", "coordinator.export", ROOT),
+    ("etl_app", "app", ROOT / "etl"),
+    ("etl_worker", "worker", ROOT / "etl"),
+    ("etl_poller", "poller", ROOT / "etl"),
+)
+
+MEASURE = "import time; started = time.perf_counter(); import {module}; print((time.perf_counter() - started) * 1000)"
+
+def _clean_env():
+    env = {name: value for name, value in os.environ.items() if not name.startswith(SECRET_PREFIXES)}
+    env["PYTHONPATH"] = str(ROOT)
+    # Measure imports, not bytecode compilation
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def measure(module: str, cwd: Path, repeat: int):
+    """Median import time of `module` in milliseconds, or the error output when it fails."""
+    env = _clean_env()
+    samples = []
+    for _ in range(repeat + 1):
+        result = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module)],
+            cwd=cwd, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    # The first run warms the bytecode cache
+    return round(statistics.median(samples[1:]), 3), None
+
+def run(repeat=5, budget_ms=1500.0):
+    results = {}
+    for name, module, cwd in ENTRY_POINTS:
+        import_ms, error = measure(module, cwd, repeat)
+        results[name] = {"import_ms": import_ms, "over_budget": error is not None or import_ms > budget_ms}
+        if error:
+            results[name]["error"] = error
+    return {"budget_ms": budget_ms, "repeat": repeat, "entry_points": results}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Maximum median import time per entry point.")
+    args = parser.parse_args()
+    report = run(args.repeat, args.budget_ms)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if any(result["over_budget"] for result in report["entry_points"].values()) else 0)
+
+if __name__ == "__main__":
+    main()
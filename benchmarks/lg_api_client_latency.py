@@ -0,0 +1,41 @@
+"""
+Compare per-call `requests.get` (new connection per request) against the pooled LGApiClient.
+
+    python -m benchmarks.lg_api_client_latency --calls 200 --latency-ms 5
+"""
+import argparse
+import time
+from datetime import date
+import requests
+from benchmarks.harness import summarize_ms
+from benchmarks.lg_api_stub import start_stub_server
+from common.lg_api_client import LGApiClient
+
+def _timed(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize_ms(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = start_stub_server(latency_ms=args.latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = LGApiClient("BR", "key", "client", "token", base_url=base_url)
+    start, end = date(2025, 1, 1), date(2025, 1, 31)
+    params = {"period": "DAILY", "startDate": "20250101", "endDate": "20250131"}
+
+    unpooled = _timed(lambda: requests.get(f"{base_url}/devices/energy/d/usage", params=params, headers=client.request_headers()).json(), args.calls)
+    pooled = _timed(lambda: client.get_energy_consumption("d", start, end), args.calls)
+    print(f"unpooled requests.get: {unpooled}")
+    print(f"pooled LGApiClient:    {pooled}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Minimal local stand-in for the LG ThinQ API.
+
+Serves `/devices` and `/devices/energy/<device_id>/usage` with an artificial latency so
+client-side changes (pooling, keep-alive, retries) can be measured without touching the real API.
+A share of requests can fail with 500 or be throttled with 429 + Retry-After, and usage
+payloads are deterministic per device and day (a per-device baseline plus daily variation).
+
+Run standalone with:
+    python -m benchmarks.lg_api_stub --port 8900 --latency-ms 20 --error-rate 0.01 --throttle-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import zlib
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def _devices_payload(device_count):
+    return {
+        "response": [
+            {
+                "deviceId": f"stub-device-{i:04d}",
+                "deviceInfo": {"deviceType": "DEVICE_REFRIGERATOR", "modelName": "STUB", "alias": f"Stub {i}"},
+            }
+            for i in range(device_count)
+        ]
+    }
+
+def _usage_payload(device_id, start_date, end_date):
+    baseline = 800 + zlib.crc32(device_id.encode()) % 1200
+    data = []
+    day = start_date
+    # Like the real API, days that have not finished yet are not reported
+    while day <= min(end_date, date.today() - timedelta(days=1)):
+        variation = (zlib.crc32(f"{device_id}{day}".encode()) % 4000) / 10.0 - 200
+        data.append({"usedDate": day.strftime("%Y%m%d"), "energyUsage": round(baseline + variation, 1)})
+        day += timedelta(days=1)
+    return {"response": {"resultCode": "0000", "result": {"dataList": data}}}
+
+def _hourly_usage_payload(device_id, day):
+    now = datetime.now()
+    hours = 24 if day < now.date() else (now.hour + 1 if day == now.date() else 0)
+    data = [
+        {"usedDate": f"{day:%Y%m%d}{hour:02d}", "energyUsage": round((zlib.crc32(f"{device_id}{day}{hour}".encode()) % 1000) / 10.0, 1)}
+        for hour in range(hours)
+    ]
+    return {"response": {"resultCode": "0000", "result": {"dataList": data}}}
+
+def _parse_date(value):
+    return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    device_count = 10
+    error_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 1
+    rng = random.Random(0)
+    stats = None
+    stats_lock = None
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self._count("requests")
+        with self.stats_lock:
+            roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self._count("throttled")
+            self._send_json(429, {"error": "Too Many Requests"}, [("Retry-After", str(self.retry_after))])
+            return
+        if roll < self.throttle_rate + self.error_rate:
+            self._count("errors")
+            self._send_json(500, {"error": "Internal Server Error"})
+            return
+        url = urlparse(self.path)
+        if url.path == "/devices":
+            payload = _devices_payload(self.device_count)
+        elif url.path.startswith("/devices/energy/") and url.path.endswith("/usage"):
+            query = parse_qs(url.query)
+            device_id = url.path[len("/devices/energy/"):-len("/usage")]
+            if query.get("period", ["DAILY"])[0] == "HOURLY":
+                payload = _hourly_usage_payload(device_id, _parse_date(query["startDate"][0]))
+            else:
+                payload = _usage_payload(device_id, _parse_date(query["startDate"][0]), _parse_date(query["endDate"][0]))
+        else:
+            self.send_error(404)
+            return
+        self._send_json(200, payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency_ms=0.0, device_count=10, error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=0, host="127.0.0.1"):
+    """
+    Start the stub server in a daemon thread and return it; `server.server_port` holds the
+    bound port and `server.stats` counts requests, errors and throttled responses.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency_ms / 1000.0,
+        "device_count": device_count,
+        "error_rate": error_rate,
+        "throttle_rate": throttle_rate,
+        "retry_after": retry_after,
+        "rng": random.Random(seed),
+        "stats": {"requests": 0, "errors": 0, "throttled": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.stats = handler.stats
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--host", default="127.0.0.1", help="Use 0.0.0.0 to serve the docker-compose services.")
+    args = parser.parse_args()
+    server = start_stub_server(args.port, args.latency_ms, args.devices, args.error_rate, args.throttle_rate, host=args.host)
+    print(f"LG API stub listening on http://{args.host}:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,81 @@
+"""
+Compare the per-row cost of mapping LG energy usage into Python objects: the original
+dataclass built with strptime/strftime, the slotted dataclass with date.fromisoformat, and
+the columnar EnergyConsumptionBatch. Reports time and peak traced memory per variant:
+
+    python -m benchmarks.models --rows 1000000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from common.energy_consumption import EnergyConsumption, EnergyConsumptionBatch
+
+DAYS_PER_RESPONSE = 31
+
+@dataclass
+class LegacyEnergyConsumption:
+    device_id: str
+    used_date: str
+    energy_wh: float
+
+    def __post_init__(self):
+        if not self.device_id:
+            raise ValueError("device_id must not be empty")
+        if not isinstance(self.energy_wh, (int, float)) or self.energy_wh < 0:
+            raise ValueError("energy_wh must be a non-negative number")
+
+def _responses(rows):
+    start = date(2025, 1, 1)
+    data_list = [
+        {"usedDate": (start + timedelta(days=i)).strftime("%Y%m%d"), "energyUsage": str(100 + i)}
+        for i in range(DAYS_PER_RESPONSE)
+    ]
+    return [(f"device-{i}", data_list) for i in range(rows // DAYS_PER_RESPONSE)]
+
+def legacy(responses):
+    return [
+        [
+            LegacyEnergyConsumption(
+                device_id=device_id,
+                used_date=datetime.strptime(d["usedDate"], "%Y%m%d").strftime("%Y-%m-%d"),
+                energy_wh=float(d["energyUsage"])
+            )
+            for d in data_list
+        ]
+        for device_id, data_list in responses
+    ]
+
+def slotted(responses):
+    return [
+        [EnergyConsumption(device_id, date.fromisoformat(d["usedDate"]), float(d["energyUsage"])) for d in data_list]
+        for device_id, data_list in responses
+    ]
+
+def batch(responses):
+    return [EnergyConsumptionBatch.from_api(device_id, data_list) for device_id, data_list in responses]
+
+def measure(fn, responses):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(responses)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"seconds": round(elapsed, 3), "peak_mb": round(peak / (1024 * 1024), 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    responses = _responses(args.rows)
+    rows = len(responses) * DAYS_PER_RESPONSE
+    for name, fn in (("legacy", legacy), ("slotted", slotted), ("batch", batch)):
+        print(json.dumps({"variant": name, "rows": rows, **measure(fn, responses)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Compare insert and query costs of a plain energy_consumption heap against the monthly
+partitioned layout from sql/schema/06_partition_energy_consumption.sql.
+
+Both layouts are built in a scratch schema of the database configured through the usual
+POSTGRES_* variables (e.g. the docker-compose Postgres), which is dropped afterwards:
+
+    python -m benchmarks.partitioning --devices 200 --days 730
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+import psycopg2
+from common.config import PostgresConfig
+from common.pg_copy import IterableCsvStream
+
+SCHEMA = "bench_partitioning"
+
+PLAIN_DDL = """
+    CREATE TABLE energy_consumption (
+        id SERIAL PRIMARY KEY,
+        device_id VARCHAR(65),
+        used_date DATE NOT NULL,
+        energy_wh DECIMAL(12,3) NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        UNIQUE (device_id, used_date)
+    );
+"""
+
+PARTITIONED_DDL = """
+    CREATE TABLE energy_consumption (
+        id BIGSERIAL,
+        device_id VARCHAR(65),
+        used_date DATE NOT NULL,
+        energy_wh DECIMAL(12,3) NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (device_id, used_date) INCLUDE (energy_wh)
+    ) PARTITION BY RANGE (used_date);
+    CREATE INDEX energy_consumption_used_date_brin ON energy_consumption USING BRIN (used_date);
+"""
+
+QUERIES = {
+    "device_range": "SELECT used_date, energy_wh FROM energy_consumption WHERE device_id = 'device-0007' AND used_date BETWEEN %(mid)s AND %(mid)s::date + 90",
+    "fleet_month": "SELECT SUM(energy_wh) FROM energy_consumption WHERE used_date >= date_trunc('month', %(mid)s::date) AND used_date < date_trunc('month', %(mid)s::date) + INTERVAL '1 month'",
+    "conflict_insert": "INSERT INTO energy_consumption (device_id, used_date, energy_wh) SELECT 'device-0007', d::date, 1 FROM generate_series(%(mid)s::date, %(mid)s::date + 30, '1 day') d ON CONFLICT DO NOTHING",
+}
+
+def _rows(devices, start, days):
+    for day in range(days):
+        used_date = start + timedelta(days=day)
+        for device in range(devices):
+            yield (f"device-{device:04d}", used_date, 1000 + (device * 31 + day) % 500)
+
+def _create_partitions(cur, start, days):
+    month = date(start.year, start.month, 1)
+    end = start + timedelta(days=days)
+    while month <= end:
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        cur.execute(
+            f"CREATE TABLE energy_consumption_{month:%Y_%m} PARTITION OF energy_consumption FOR VALUES FROM (%s) TO (%s)",
+            (month, next_month)
+        )
+        month = next_month
+
+def _timed_ms(cur, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        if cur.description:
+            cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 3)
+
+def bench_layout(conn, ddl, partitioned, devices, days, repeat):
+    start = date(2023, 1, 1)
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path TO {SCHEMA};")
+        cur.execute(ddl)
+        if partitioned:
+            _create_partitions(cur, start, days)
+        conn.commit()
+
+        began = time.perf_counter()
+        cur.copy_expert(
+            "COPY energy_consumption (device_id, used_date, energy_wh) FROM STDIN WITH (FORMAT csv)",
+            IterableCsvStream(_rows(devices, start, days))
+        )
+        conn.commit()
+        load_seconds = time.perf_counter() - began
+        cur.execute("ANALYZE energy_consumption;")
+        conn.commit()
+
+        params = {"mid": start + timedelta(days=days // 2)}
+        result = {
+            "rows": devices * days,
+            "load_rows_per_sec": round(devices * days / load_seconds),
+        }
+        for name, sql in QUERIES.items():
+            result[f"{name}_p50_ms"] = _timed_ms(cur, sql, params, repeat)
+            conn.rollback()
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE;")
+        conn.commit()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(PostgresConfig().conn_string)
+    try:
+        print(json.dumps({
+            "plain": bench_layout(conn, PLAIN_DDL, False, args.devices, args.days, args.repeat),
+            "partitioned": bench_layout(conn, PARTITIONED_DDL, True, args.devices, args.days, args.repeat),
+        }, indent=2))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-batch cost of publishing sync requests to the docker-compose RabbitMQ: a channel in
+publisher-confirm mode (one broker round trip per message) against `RabbitMQPublisher`
+(one transaction commit per batch). Messages go to a scratch queue that is deleted afterwards.
+
+    python -m benchmarks.publisher_batch --batches 20 --batch-size 500
+"""
+import argparse
+import json
+import time
+import pika
+from benchmarks.harness import summarize_ms
+from common.config import RabbitMQConfig
+from common.rabbitmq_publisher import RabbitMQPublisher
+
+QUEUE = "bench_publisher_queue"
+
+def _timed_batches(publish, batches, batch_size):
+    bodies = [f"bench-device-{i:05d}".encode() for i in range(batch_size)]
+    samples = []
+    for _ in range(batches):
+        start = time.perf_counter()
+        publish(bodies)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def run(batches=20, batch_size=500):
+    host = RabbitMQConfig().RABBITMQ_HOST
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE)
+    channel.confirm_delivery()
+    properties = pika.BasicProperties(delivery_mode=2)
+    publisher = RabbitMQPublisher(host, QUEUE)
+    try:
+        def publish_confirmed(bodies):
+            for body in bodies:
+                channel.basic_publish(exchange='', routing_key=QUEUE, body=body, properties=properties)
+
+        confirmed = _timed_batches(publish_confirmed, batches, batch_size)
+        transactional = _timed_batches(publisher.publish_batch, batches, batch_size)
+    finally:
+        publisher.close()
+        channel.queue_delete(queue=QUEUE)
+        connection.close()
+
+    confirmed_ms, transactional_ms = summarize_ms(confirmed), summarize_ms(transactional)
+    return {
+        "batches": batches,
+        "batch_size": batch_size,
+        "per_message_confirms": confirmed_ms,
+        "batch_commit": transactional_ms,
+        "confirms_msgs_per_sec": round(batches * batch_size / (sum(confirmed) / 1000)),
+        "batch_commit_msgs_per_sec": round(batches * batch_size / (sum(transactional) / 1000)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(run(args.batches, args.batch_size), indent=2))
+
+if __name__ == "__main__":
+    main()
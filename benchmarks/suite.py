@@ -0,0 +1,79 @@
+"""
+Run the benchmark suite and write one JSON report; with `--baseline` every throughput or
+latency figure that moved the wrong way by more than `--tolerance` is listed under
+"regressions" and the exit status is 1.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output new.json --baseline results.json --skip coordinator_latency
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from benchmarks import bulk_insert, coordinator_latency, import_time, worker_throughput
+
+BENCHMARKS = {
+    "import_time": lambda args: import_time.run(),
+    "bulk_insert": lambda args: bulk_insert.run(devices=args.devices, days=args.days),
+    "worker_throughput": lambda args: worker_throughput.run(devices=args.devices, days=args.days, workers=args.workers,
+                                                            latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                                            throttle_rate=args.throttle_rate),
+    "coordinator_latency": lambda args: coordinator_latency.run(url=args.coordinator_url),
+}
+
+HIGHER_IS_BETTER = ("_per_sec", "_per_min")
+LOWER_IS_BETTER = ("_ms", "seconds")
+
+def _flatten(result, prefix=""):
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+def regressions(current, baseline, tolerance):
+    previous = dict(_flatten(baseline))
+    found = []
+    for name, value in _flatten(current):
+        before = previous.get(name)
+        if not before:
+            continue
+        change = (value - before) / before
+        if (name.endswith(HIGHER_IS_BETTER) and change < -tolerance) or (name.endswith(LOWER_IS_BETTER) and change > tolerance):
+            found.append({"metric": name, "baseline": before, "current": value, "change": round(change, 3)})
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="Write the report here as well as to stdout.")
+    parser.add_argument("--baseline", help="Earlier report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--skip", action="append", default=[], choices=sorted(BENCHMARKS))
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--coordinator-url", default="http://localhost:8000")
+    args = parser.parse_args()
+
+    report = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "results": {}}
+    for name, bench in BENCHMARKS.items():
+        if name not in args.skip:
+            report["results"][name] = bench(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = regressions(report["results"], json.load(f)["results"], args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    sys.exit(1 if report.get("regressions") else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+End-to-end devices/min of `etl/worker.py`: sync requests are published to a scratch queue
+on the docker-compose RabbitMQ, worker subprocesses fetch from the local LG API stub
+(with optional latency, 500s and 429s) and write into a scratch schema of the configured
+Postgres. A device counts as done once its read log reaches yesterday.
+
+    python -m benchmarks.worker_throughput --devices 50 --days 90 --workers 2 --latency-ms 20 --throttle-rate 0.05
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+import pika
+from common.config import PostgresConfig, RabbitMQConfig
+from common.rabbitmq_publisher import RabbitMQPublisher
+from common.sync_retry import dead_letter_queue_name, retry_queue_name
+from benchmarks.harness import insert_devices, scratch_schema, search_path_options
+from benchmarks.lg_api_stub import start_stub_server
+
+SCHEMA = "bench_worker"
+QUEUE = "bench_worker_queue"
+RETRY_DELAYS = (1, 2, 5)
+ROOT = Path(__file__).resolve().parent.parent
+
+def _worker_env(base_url, worker_env):
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "PGOPTIONS": search_path_options(SCHEMA),
+        # An explicit statement_timeout would replace PGOPTIONS in the pool's connection options
+        "POSTGRES_STATEMENT_TIMEOUT_MS": "0",
+        "LG_API_BASE_URL": base_url,
+        "RABBITMQ_QUEUE": QUEUE,
+        "SYNC_RETRY_DELAYS": ",".join(str(delay) for delay in RETRY_DELAYS),
+        "ETL_METRICS_PORT": "0",
+        **worker_env,
+    }
+    for var in ("LG_COUNTRY", "LG_API_KEY", "LG_API_TOKEN", "LG_CLIENT_ID"):
+        env.setdefault(var, "bench")
+    return env
+
+def _done_count(conn, yesterday):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM energy_consumption_read_log WHERE end_date >= %s;", (yesterday,))
+        done = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM energy_consumption;")
+        rows = cur.fetchone()[0]
+    conn.commit()
+    return done, rows
+
+def _delete_queues(host):
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+    channel = connection.channel()
+    for queue in (QUEUE, dead_letter_queue_name(QUEUE), *(retry_queue_name(QUEUE, delay) for delay in RETRY_DELAYS)):
+        channel.queue_delete(queue=queue)
+    connection.close()
+
+def run(devices=50, days=90, workers=1, latency_ms=20.0, error_rate=0.0, throttle_rate=0.0, timeout=600.0, worker_env=None):
+    rabbitmq_host = RabbitMQConfig().RABBITMQ_HOST
+    stub = start_stub_server(latency_ms=latency_ms, device_count=devices, error_rate=error_rate, throttle_rate=throttle_rate)
+    device_ids = [f"stub-device-{i:04d}" for i in range(devices)]
+    yesterday = date.today() - timedelta(days=1)
+    processes = []
+    try:
+        with scratch_schema(PostgresConfig().conn_string, SCHEMA) as conn:
+            insert_devices(conn, device_ids)
+            # Read logs start `days` behind so every device syncs the same history
+            with conn.cursor() as cur:
+                cur.executemany(
+                    "INSERT INTO energy_consumption_read_log (device_id, start_date, end_date) VALUES (%s, %s, %s);",
+                    [(device_id, yesterday - timedelta(days=days), yesterday - timedelta(days=days)) for device_id in device_ids]
+                )
+            conn.commit()
+
+            env = _worker_env(f"http://127.0.0.1:{stub.server_port}", worker_env or {})
+            for _ in range(workers):
+                processes.append(subprocess.Popen(
+                    [sys.executable, "worker.py"], cwd=ROOT / "etl", env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                ))
+            # Let workers declare the queue and start consuming before the clock starts
+            time.sleep(2)
+
+            publisher = RabbitMQPublisher(rabbitmq_host, QUEUE)
+            started = time.perf_counter()
+            publisher.publish_batch(device_id.encode() for device_id in device_ids)
+            publisher.close()
+
+            done, rows = 0, 0
+            while time.perf_counter() - started < timeout:
+                done, rows = _done_count(conn, yesterday)
+                if done >= devices:
+                    break
+                time.sleep(0.25)
+            elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        stub.shutdown()
+        _delete_queues(rabbitmq_host)
+
+    return {
+        "devices": devices,
+        "days": days,
+        "workers": workers,
+        "completed": done,
+        "timed_out": done < devices,
+        "seconds": round(elapsed, 3),
+        "devices_per_min": round(done / elapsed * 60, 2),
+        "rows_per_sec": round(rows / elapsed),
+        "lg_api": dict(stub.stats),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra worker setting, e.g. --env ETL_WORKER_BATCH_SIZE=8 (repeatable).")
+    args = parser.parse_args()
+    worker_env = dict(item.split("=", 1) for item in args.env)
+    print(json.dumps(run(args.devices, args.days, args.workers, args.latency_ms, args.error_rate,
+                         args.throttle_rate, args.timeout, worker_env), indent=2))
+
+if __name__ == "__main__":
+    main()
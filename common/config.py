@@ -1,11 +1,37 @@
+"""
+Settings are read from the environment when a config object is created, never at import.
+Every field can also be passed explicitly (e.g. `PostgresConfig(POSTGRES_HOST="localhost")`),
+and each class validates only the variables it needs, so a component that never talks to
+RabbitMQ does not need RabbitMQ settings.
+"""
 import os
-from dotenv import load_dotenv
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 
-load_dotenv()
+@lru_cache(maxsize=None)
+def load_env():
+	"""Load `.env` into the environment once, the first time any setting is read."""
+	from dotenv import load_dotenv
+	load_dotenv()
 
-def _validate_env_vars(required_vars):
-	missing = [var for var in required_vars if os.getenv(var) is None]
+def _env(name: str, default=None):
+	load_env()
+	return os.getenv(name, default)
+
+def _str(name: str, default=None):
+	return field(default_factory=lambda: _env(name, default))
+
+def _int(name: str, default: str):
+	return field(default_factory=lambda: int(_env(name, default)))
+
+def _float(name: str, default: str):
+	return field(default_factory=lambda: float(_env(name, default)))
+
+def _bool(name: str, default: str):
+	return field(default_factory=lambda: _env(name, default).lower() in ("1", "true", "yes"))
+
+def _validate_env_vars(config, required_vars):
+	missing = [var for var in required_vars if getattr(config, var) is None]
 	if missing:
 		raise EnvironmentError(f"Missing environment variables: {', '.join(missing)}")
 
@@ -14,32 +40,108 @@ class LgApiConfig:
 	"""
 	LG ThinQ API configuration loaded from environment variables.
 	"""
-	LG_COUNTRY: str = os.getenv("LG_COUNTRY")
-	LG_API_KEY: str = os.getenv("LG_API_KEY")
-	LG_API_TOKEN: str = os.getenv("LG_API_TOKEN")
-	LG_CLIENT_ID: str = os.getenv("LG_CLIENT_ID")
+	LG_COUNTRY: str = _str("LG_COUNTRY")
+	LG_API_KEY: str = _str("LG_API_KEY")
+	LG_API_TOKEN: str = _str("LG_API_TOKEN")
+	LG_CLIENT_ID: str = _str("LG_CLIENT_ID")
+	LG_API_BASE_URL: str = _str("LG_API_BASE_URL", "https://api-aic.lgthinq.com")
+	LG_API_TIMEOUT: float = _float("LG_API_TIMEOUT", "10")
+	LG_API_MAX_RETRIES: int = _int("LG_API_MAX_RETRIES", "3")
+	LG_API_CACHE_DIR: str = _str("LG_API_CACHE_DIR", "")
+	LG_API_CACHE_MAX_MB: int = _int("LG_API_CACHE_MAX_MB", "512")
+	LG_API_CACHE_OPEN_TTL_SECONDS: float = _float("LG_API_CACHE_OPEN_TTL_SECONDS", "900")
+	LG_API_REPLAY: bool = _bool("LG_API_REPLAY", "false")
+	LG_API_HOURLY_PERIOD: str = _str("LG_API_HOURLY_PERIOD", "HOURLY")
 
-_validate_env_vars(["LG_COUNTRY", "LG_API_KEY", "LG_API_TOKEN", "LG_CLIENT_ID"])
+	def __post_init__(self):
+		_validate_env_vars(self, ["LG_COUNTRY", "LG_API_KEY", "LG_API_TOKEN", "LG_CLIENT_ID"])
 
 @dataclass
 class PostgresConfig:
 	"""
 	PostgreSQL connection configuration loaded from environment variables.
 	"""
-	POSTGRES_USER: str = os.getenv("POSTGRES_USER")
-	POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD")
-	POSTGRES_HOST: str = os.getenv("POSTGRES_HOST")
-	POSTGRES_DB: str = os.getenv("POSTGRES_DB")
-	POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
+	POSTGRES_USER: str = _str("POSTGRES_USER")
+	POSTGRES_PASSWORD: str = _str("POSTGRES_PASSWORD")
+	POSTGRES_HOST: str = _str("POSTGRES_HOST")
+	POSTGRES_DB: str = _str("POSTGRES_DB")
+	POSTGRES_PORT: str = _str("POSTGRES_PORT", "5432")
+	POSTGRES_POOL_MIN: int = _int("POSTGRES_POOL_MIN", "1")
+	POSTGRES_POOL_MAX: int = _int("POSTGRES_POOL_MAX", "10")
+	POSTGRES_STATEMENT_TIMEOUT_MS: int = _int("POSTGRES_STATEMENT_TIMEOUT_MS", "60000")
+
+	def __post_init__(self):
+		_validate_env_vars(self, ["POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_DB"])
 
-_validate_env_vars(["POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_DB"])
+	@property
+	def conn_string(self) -> str:
+		return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
 @dataclass
 class RabbitMQConfig:
 	"""
 	RabbitMQ connection configuration loaded from environment variables.
 	"""
-	RABBITMQ_HOST: str = os.getenv("RABBITMQ_HOST", "rabbitmq")
-	RABBITMQ_QUEUE: str = os.getenv("RABBITMQ_QUEUE", "rabbitmq_queue")
+	RABBITMQ_HOST: str = _str("RABBITMQ_HOST", "rabbitmq")
+	RABBITMQ_QUEUE: str = _str("RABBITMQ_QUEUE", "rabbitmq_queue")
+
+	def __post_init__(self):
+		_validate_env_vars(self, ["RABBITMQ_HOST", "RABBITMQ_QUEUE"])
+
+@dataclass
+class EtlConfig:
+	"""
+	ETL tuning options loaded from environment variables.
+	"""
+	ETL_FETCH_CONCURRENCY: int = _int("ETL_FETCH_CONCURRENCY", "4")
+	LG_API_RATE_LIMIT: float = _float("LG_API_RATE_LIMIT", "2")
+	LG_API_RATE_BURST: int = _int("LG_API_RATE_BURST", "4")
+	ETL_WORKER_CONCURRENCY: int = _int("ETL_WORKER_CONCURRENCY", "1")
+	ETL_WORKER_PREFETCH: int = field(default_factory=lambda: int(_env("ETL_WORKER_PREFETCH", _env("ETL_WORKER_CONCURRENCY", "1"))))
+	ETL_WORKER_BATCH_SIZE: int = _int("ETL_WORKER_BATCH_SIZE", "1")
+	ETL_WORKER_BATCH_WAIT_SECONDS: float = _float("ETL_WORKER_BATCH_WAIT_SECONDS", "0.5")
+	ETL_COVERAGE_PLANNING: bool = _bool("ETL_COVERAGE_PLANNING", "false")
+	ETL_GAP_RECHECK_DAYS: int = _int("ETL_GAP_RECHECK_DAYS", "7")
+	ETL_METRICS_PORT: int = _int("ETL_METRICS_PORT", "9000")
+	ETL_POLL_INTERVAL_SECONDS: float = _float("ETL_POLL_INTERVAL_SECONDS", "900")
+	ETL_HOURLY_RETENTION_DAYS: int = _int("ETL_HOURLY_RETENTION_DAYS", "7")
+	ETL_POLL_RATE_SHARE: float = _float("ETL_POLL_RATE_SHARE", "0.25")
+	ETL_WINDOW_SPOOL: bool = _bool("ETL_WINDOW_SPOOL", "true")
+	ETL_ANOMALY_DETECTION: bool = _bool("ETL_ANOMALY_DETECTION", "true")
+	ETL_ANOMALY_ALPHA: float = _float("ETL_ANOMALY_ALPHA", "0.2")
+	ETL_ANOMALY_Z_THRESHOLD: float = _float("ETL_ANOMALY_Z_THRESHOLD", "3")
+	ETL_ANOMALY_MIN_SAMPLES: int = _int("ETL_ANOMALY_MIN_SAMPLES", "4")
+	ETL_TRACE_FILE: str = _str("ETL_TRACE_FILE", "")
+	ETL_TRACE_PROFILE_DIR: str = _str("ETL_TRACE_PROFILE_DIR", "")
+	ETL_TRACE_PROFILE_RATE: float = _float("ETL_TRACE_PROFILE_RATE", "0.1")
+	ETL_TRACE_PROFILE_TOP: int = _int("ETL_TRACE_PROFILE_TOP", "5")
 
-_validate_env_vars(["RABBITMQ_HOST", "RABBITMQ_QUEUE"])
\ No newline at end of file
+	def __post_init__(self):
+		if not 0 <= self.ETL_POLL_RATE_SHARE < 1:
+			raise ValueError("ETL_POLL_RATE_SHARE must be in [0, 1)")
+
+
+@dataclass
+class SyncConfig:
+	"""
+	Sync request coalescing and retry options loaded from environment variables.
+	"""
+	SYNC_PENDING_TTL_SECONDS: int = _int("SYNC_PENDING_TTL_SECONDS", "3600")
+	SYNC_RETRY_DELAYS: tuple = field(default_factory=lambda: tuple(int(d) for d in _env("SYNC_RETRY_DELAYS", "5,30,120,600").split(",")))
+	SYNC_MAX_RETRIES: int = _int("SYNC_MAX_RETRIES", "10")
+	SYNC_PLANNER_INTERVAL_SECONDS: float = _float("SYNC_PLANNER_INTERVAL_SECONDS", "3600")
+	SYNC_PLANNER_SPREAD_SECONDS: float = _float("SYNC_PLANNER_SPREAD_SECONDS", "600")
+	SYNC_PLANNER_BATCH_SIZE: int = _int("SYNC_PLANNER_BATCH_SIZE", "10")
+	SYNC_LEASE_TTL_SECONDS: float = _float("SYNC_LEASE_TTL_SECONDS", "120")
+	SYNC_LEASE_HEARTBEAT_SECONDS: float = _float("SYNC_LEASE_HEARTBEAT_SECONDS", "40")
+
+
+@dataclass
+class CoordinatorConfig:
+	"""
+	Coordinator options loaded from environment variables.
+	"""
+	DEVICE_CATALOG_TTL_SECONDS: float = _float("DEVICE_CATALOG_TTL_SECONDS", "60")
+	DEVICE_CATALOG_STALE_SECONDS: float = _float("DEVICE_CATALOG_STALE_SECONDS", "600")
+	EXPORT_CACHE_DIR: str = _str("EXPORT_CACHE_DIR", "")
+	EXPORT_BATCH_ROWS: int = _int("EXPORT_BATCH_ROWS", "50000")
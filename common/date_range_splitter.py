@@ -16,3 +16,27 @@ class DateRangeSplitter(object):
 			date_ranges.append((i_start_date,i_end_date))
 			i_start_date = i_end_date + timedelta(days=1)
 		return date_ranges
+
+	def split_gaps(self, gaps):
+		"""
+		Cover (start, end) date intervals with the fewest windows spanning at most
+		`max_count_records` days each. Nearby gaps share a window (days already stored in
+		between are re-fetched and ignored on insert) and long gaps are cut into several.
+		"""
+		span = timedelta(days=self.max_count_records)
+		date_ranges = []
+		window_start = window_end = None
+		for gap_start, gap_end in sorted(gaps):
+			while gap_start <= gap_end:
+				if window_start is None or gap_start > window_start + span:
+					if window_start is not None:
+						date_ranges.append((window_start, window_end))
+					window_start = gap_start
+				window_end = min(gap_end, window_start + span)
+				if window_end < gap_end:
+					date_ranges.append((window_start, window_end))
+					window_start = None
+				gap_start = window_end + timedelta(days=1)
+		if window_start is not None:
+			date_ranges.append((window_start, window_end))
+		return date_ranges
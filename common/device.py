@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class Device:
 	"""
 	Represents a device registered in the LG ThinQ database.
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List
+from common.device import Device
+
+logger = logging.getLogger(__name__)
+
+class DeviceCatalog:
+	"""
+	In-process cache of the LG ThinQ device list, used from one asyncio event loop.
+	Entries are fresh for `ttl` seconds. Once stale they are still served for up to
+	`stale_ttl` more seconds while a single background refresh runs; past that, callers
+	wait for a refresh. Concurrent misses share one upstream call (single-flight).
+	"""
+	def __init__(self, loader: Callable[[], Awaitable[List[Device]]], ttl: float = 60.0, stale_ttl: float = 600.0):
+		self.loader = loader
+		self.ttl = ttl
+		self.stale_ttl = stale_ttl
+		self._devices = None
+		self._loaded_at = 0.0
+		self._refresh_task = None
+		self._error = None
+		self._generation = 0
+		self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+	async def get(self) -> List[Device]:
+		age = time.monotonic() - self._loaded_at
+		if self._devices is not None and age < self.ttl:
+			self.stats["hits"] += 1
+			return self._devices
+		if self._devices is not None and age < self.ttl + self.stale_ttl:
+			self.stats["stale_hits"] += 1
+			self._refresh()
+			return self._devices
+		self.stats["misses"] += 1
+		while True:
+			generation = self._generation
+			# Shielded so a cancelled request does not cancel the refresh other callers wait on
+			await asyncio.shield(self._refresh())
+			if generation == self._generation:
+				break
+		if self._devices is None or time.monotonic() - self._loaded_at >= self.ttl + self.stale_ttl:
+			raise self._error or RuntimeError("Device catalog refresh failed")
+		return self._devices
+
+	def _refresh(self) -> asyncio.Task:
+		"""The running refresh, started if there is none."""
+		if self._refresh_task is None:
+			self._refresh_task = asyncio.ensure_future(self._load())
+		return self._refresh_task
+
+	async def _load(self):
+		generation = self._generation
+		devices, error = None, None
+		try:
+			devices = await self.loader()
+		except Exception as e:
+			error = e
+			logger.exception("Device catalog refresh failed")
+		self.stats["refreshes"] += 1
+		if error is not None:
+			self.stats["refresh_errors"] += 1
+		if generation != self._generation:
+			# Invalidated while loading: the list may predate the change, so drop it
+			return
+		if error is None:
+			self._devices = devices
+			self._loaded_at = time.monotonic()
+		self._error = error
+		self._refresh_task = None
+
+	def invalidate(self):
+		"""Drop the cached list so the next `get` reloads it, discarding any refresh already running."""
+		self._generation += 1
+		self._devices = None
+		self._loaded_at = 0.0
+		self._refresh_task = None
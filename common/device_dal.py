@@ -1,20 +1,23 @@
-from psycopg2.extras import RealDictCursor
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from common.postgres_connection import PostgresConn
 from common.device import Device
+from common.pg_copy import load_staging
+
+DEVICE_COLUMNS = "id, device_type, model_name, alias"
 
 class DeviceDAL:
 	"""
 	Data Access Layer for LG ThinQ devices.
 	Responsible for read operations on the devices table.
 	"""
-	def __init__(self, conn):
+	def __init__(self, conn, use_copy: bool = True):
 		self.conn = conn
+		self.use_copy = use_copy
 
 	def get(self, device_id: str) -> Optional[Device]:
-		sql = "SELECT * FROM devices WHERE id = %s;"
+		sql = f"SELECT {DEVICE_COLUMNS} FROM devices WHERE id = %s;"
 		try:
-			with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+			with self.conn.cursor() as cur:
 				cur.execute(sql, (device_id,))
 				row = cur.fetchone()
 		except Exception as e:
@@ -22,12 +25,18 @@ class DeviceDAL:
 			return None
 		if not row:
 			return None
-		return Device(
-			id=row["id"],
-			device_type=row["device_type"],
-			model_name=row["model_name"],
-			alias=row["alias"]
-		)
+		return Device(*row)
+
+	def get_many(self, device_ids: List[str]) -> Dict[str, Device]:
+		sql = f"SELECT {DEVICE_COLUMNS} FROM devices WHERE id = ANY(%s);"
+		try:
+			with self.conn.cursor() as cur:
+				cur.execute(sql, (list(device_ids),))
+				rows = cur.fetchall()
+		except Exception as e:
+			print(f"Error fetching devices: {e}")
+			return {}
+		return {row[0]: Device(*row) for row in rows}
 
 	def insert(self, device: Device):
 		sql = """
@@ -42,37 +51,48 @@ class DeviceDAL:
 		except Exception as e:
 			print(f"Error inserting device: {e}")
 
-	def bulk_insert(self, devices: List[Device]):
-		sql = """
-			INSERT INTO devices (id, device_type, model_name, alias)
-			VALUES (%s, %s, %s, %s)
-			ON CONFLICT (id) DO NOTHING;
-		"""
-		params = [
+	def bulk_insert(self, devices: Iterable[Device]):
+		params = (
 			(device.id, device.device_type, device.model_name, device.alias)
 			for device in devices
-		]
+		)
 		try:
 			with self.conn.cursor() as cur:
-				cur.executemany(sql, params)
+				load_staging(
+					cur,
+					"devices_stage",
+					"id VARCHAR(65), device_type VARCHAR(50), model_name VARCHAR(100), alias VARCHAR(100)",
+					("id", "device_type", "model_name", "alias"),
+					params,
+					use_copy=self.use_copy
+				)
+				cur.execute("""
+					INSERT INTO devices (id, device_type, model_name, alias)
+					SELECT id, device_type, model_name, alias FROM devices_stage
+					ON CONFLICT (id) DO NOTHING;
+				""")
+				cur.execute("TRUNCATE devices_stage;")
 		except Exception as e:
 			print(f"Error bulk inserting devices: {e}")
 
 	def list(self) -> List[Device]:
-		sql = "SELECT * FROM devices;"
+		sql = f"SELECT {DEVICE_COLUMNS} FROM devices;"
 		try:
-			with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+			with self.conn.cursor() as cur:
 				cur.execute(sql)
 				rows = cur.fetchall()
 		except Exception as e:
 			print(f"Error listing devices: {e}")
 			return []
-		return [
-			Device(
-				id=row["id"],
-				device_type=row["device_type"],
-				model_name=row["model_name"],
-				alias=row["alias"]
-			)
-			for row in rows
-		]
+		return [Device(*row) for row in rows]
+
+	def list_ids(self) -> List[str]:
+		sql = "SELECT id FROM devices;"
+		try:
+			with self.conn.cursor() as cur:
+				cur.execute(sql)
+				rows = cur.fetchall()
+		except Exception as e:
+			print(f"Error listing device ids: {e}")
+			return []
+		return [row[0] for row in rows]
@@ -0,0 +1,90 @@
+import math
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+@dataclass(slots=True)
+class UsageStats:
+	"""
+	Exponentially weighted mean and variance of a device's daily usage on one weekday (0 = Monday).
+	"""
+	device_id: str
+	weekday: int
+	mean_wh: float = 0.0
+	var_wh: float = 0.0
+	samples: int = 0
+	last_date: Optional[date] = None
+
+@dataclass(slots=True)
+class EnergyAnomaly:
+	"""
+	A day whose usage deviated from the device's weekday statistics; `kind` is "spike" or "drop".
+	"""
+	device_id: str
+	used_date: date
+	energy_wh: float
+	expected_wh: float
+	z_score: float
+	kind: str
+
+class EwmaAnomalyDetector:
+	"""
+	Flags outlier days against per-(device, weekday) EWMA statistics and folds every day
+	into them, so each new row costs O(1) whatever the history length.
+	A day is scored only once its weekday has `min_samples` earlier days; the standard
+	deviation is floored at `min_std_ratio` of the mean so near-constant devices are not
+	flagged for tiny changes. Outliers are folded in clipped to the threshold, so a single
+	spike does not mask the next anomaly while a lasting change is still learned.
+	"""
+	def __init__(self, alpha: float = 0.2, z_threshold: float = 3.0, min_samples: int = 4, min_std_ratio: float = 0.05):
+		if not 0 < alpha <= 1:
+			raise ValueError("alpha must be in (0, 1]")
+		self.alpha = alpha
+		self.z_threshold = z_threshold
+		self.min_samples = min_samples
+		self.min_std_ratio = min_std_ratio
+
+	def score(self, stats: UsageStats, energy_wh: float) -> Optional[float]:
+		"""z-score of `energy_wh` against `stats`, or None while the statistics are warming up."""
+		if stats.samples < self.min_samples:
+			return None
+		std = max(math.sqrt(stats.var_wh), self.min_std_ratio * abs(stats.mean_wh), 1.0)
+		return (energy_wh - stats.mean_wh) / std
+
+	def update(self, stats: UsageStats, used_date: date, energy_wh: float):
+		if stats.samples == 0:
+			stats.mean_wh, stats.var_wh = energy_wh, 0.0
+		else:
+			# Incremental EWMA mean and variance (West / Finch)
+			diff = energy_wh - stats.mean_wh
+			increment = self.alpha * diff
+			stats.mean_wh += increment
+			stats.var_wh = (1 - self.alpha) * (stats.var_wh + diff * increment)
+		stats.samples += 1
+		stats.last_date = max(stats.last_date, used_date) if stats.last_date else used_date
+
+	def observe(self, stats: Dict[Tuple[str, int], UsageStats], rows: Iterable[tuple]) -> Tuple[List[UsageStats], List[EnergyAnomaly]]:
+		"""
+		Score and fold (device_id, used_date, energy_wh) rows, oldest first, into `stats`
+		(keyed by (device_id, weekday), missing entries are created).
+		Returns the statistics that changed and the anomalies found.
+		"""
+		changed = {}
+		anomalies = []
+		for device_id, used_date, energy_wh in sorted(rows, key=lambda row: row[1]):
+			energy_wh = float(energy_wh)
+			key = (device_id, used_date.weekday())
+			entry = stats.get(key)
+			if entry is None:
+				entry = stats[key] = UsageStats(device_id, key[1])
+			z_score = self.score(entry, energy_wh)
+			folded_wh = energy_wh
+			if z_score is not None and abs(z_score) > self.z_threshold:
+				anomalies.append(EnergyAnomaly(
+					device_id, used_date, energy_wh, round(entry.mean_wh, 3), round(z_score, 3),
+					"spike" if z_score > 0 else "drop"
+				))
+				folded_wh = entry.mean_wh + (energy_wh - entry.mean_wh) * self.z_threshold / abs(z_score)
+			self.update(entry, used_date, folded_wh)
+			changed[key] = entry
+		return list(changed.values()), anomalies
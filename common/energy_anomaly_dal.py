@@ -0,0 +1,65 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from psycopg2.extras import RealDictCursor, execute_values
+from common.energy_anomaly import EnergyAnomaly, UsageStats
+
+class EnergyAnomalyDAL:
+	"""
+	Data Access Layer for energy_usage_stats (the detector state) and energy_anomalies.
+	"""
+	def __init__(self, conn):
+		self.conn = conn
+
+	def get_stats(self, device_ids: Iterable[str]) -> Dict[Tuple[str, int], UsageStats]:
+		"""Stored statistics of the given devices, keyed by (device_id, weekday)."""
+		sql = """
+			SELECT device_id, weekday, mean_wh, var_wh, samples, last_date
+			FROM energy_usage_stats
+			WHERE device_id = ANY(%s);
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids),))
+			return {(row[0], row[1]): UsageStats(*row) for row in cur.fetchall()}
+
+	def save_stats(self, stats: Iterable[UsageStats]):
+		rows = [(s.device_id, s.weekday, s.mean_wh, s.var_wh, s.samples, s.last_date) for s in stats]
+		if not rows:
+			return
+		sql = """
+			INSERT INTO energy_usage_stats (device_id, weekday, mean_wh, var_wh, samples, last_date)
+			VALUES %s
+			ON CONFLICT (device_id, weekday) DO UPDATE
+			SET mean_wh = EXCLUDED.mean_wh, var_wh = EXCLUDED.var_wh, samples = EXCLUDED.samples,
+				last_date = EXCLUDED.last_date, updated_at = NOW();
+		"""
+		with self.conn.cursor() as cur:
+			execute_values(cur, sql, rows)
+
+	def insert_anomalies(self, anomalies: Iterable[EnergyAnomaly]) -> List[EnergyAnomaly]:
+		"""Store `anomalies` and return those that were new; days already flagged are kept as they are."""
+		anomalies = {(a.device_id, a.used_date): a for a in anomalies}
+		rows = [(a.device_id, a.used_date, a.energy_wh, a.expected_wh, a.z_score, a.kind) for a in anomalies.values()]
+		if not rows:
+			return []
+		sql = """
+			INSERT INTO energy_anomalies (device_id, used_date, energy_wh, expected_wh, z_score, kind)
+			VALUES %s
+			ON CONFLICT (device_id, used_date) DO NOTHING
+			RETURNING device_id, used_date;
+		"""
+		with self.conn.cursor() as cur:
+			return [anomalies[tuple(key)] for key in execute_values(cur, sql, rows, fetch=True)]
+
+	def recent(self, since: date, device_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+		"""Anomalies on or after `since`, newest first; reads energy_anomalies only."""
+		sql = """
+			SELECT device_id, used_date, energy_wh, expected_wh, z_score, kind, detected_at
+			FROM energy_anomalies
+			WHERE used_date >= %(since)s
+			AND (%(device_id)s::varchar IS NULL OR device_id = %(device_id)s)
+			ORDER BY used_date DESC, device_id
+			LIMIT %(limit)s;
+		"""
+		with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+			cur.execute(sql, {"since": since, "device_id": device_id, "limit": limit})
+			return cur.fetchall()
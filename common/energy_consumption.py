@@ -1,7 +1,9 @@
+from array import array
 from datetime import date
 from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Tuple
 
-@dataclass
+@dataclass(slots=True)
 class EnergyConsumption:
 	"""
 	Represents the energy consumption of a device on a specific date.
@@ -15,3 +17,70 @@ class EnergyConsumption:
 			raise ValueError("device_id must not be empty")
 		if not isinstance(self.energy_wh, (int, float)) or self.energy_wh < 0:
 			raise ValueError("energy_wh must be a non-negative number")
+
+@dataclass(slots=True)
+class EnergyConsumptionHourly:
+	"""
+	Energy consumption of a device during one hour (0-23) of a day.
+	"""
+	device_id: str
+	used_date: date
+	hour: int
+	energy_wh: float
+
+	def __post_init__(self):
+		if not self.device_id:
+			raise ValueError("device_id must not be empty")
+		if not 0 <= self.hour <= 23:
+			raise ValueError("hour must be between 0 and 23")
+		if not isinstance(self.energy_wh, (int, float)) or self.energy_wh < 0:
+			raise ValueError("energy_wh must be a non-negative number")
+
+class EnergyConsumptionBatch:
+	"""
+	Columnar batch of one device's consumption: parallel arrays of date ordinals
+	(`date.toordinal()`) and watt-hours. Validation runs once per batch instead of per row,
+	and bulk paths move whole batches without creating an object per row.
+	"""
+	__slots__ = ("device_id", "used_dates", "energy_wh")
+
+	def __init__(self, device_id: str, used_dates: array, energy_wh: array):
+		if not device_id:
+			raise ValueError("device_id must not be empty")
+		if len(used_dates) != len(energy_wh):
+			raise ValueError("used_dates and energy_wh must have the same length")
+		if energy_wh and min(energy_wh) < 0:
+			raise ValueError("energy_wh must be a non-negative number")
+		self.device_id = device_id
+		self.used_dates = used_dates
+		self.energy_wh = energy_wh
+
+	@classmethod
+	def from_api(cls, device_id: str, data_list: Iterable[dict]) -> "EnergyConsumptionBatch":
+		"""Build a batch from LG API `dataList` entries (`usedDate` as YYYYMMDD, `energyUsage`)."""
+		data_list = list(data_list)
+		return cls(
+			device_id,
+			array("l", [date.fromisoformat(d["usedDate"]).toordinal() for d in data_list]),
+			array("d", [float(d["energyUsage"]) for d in data_list])
+		)
+
+	def __len__(self) -> int:
+		return len(self.used_dates)
+
+	def last_date(self) -> Optional[date]:
+		if not self.used_dates:
+			return None
+		return date.fromordinal(max(self.used_dates))
+
+	def rows(self) -> Iterator[Tuple[str, date, float]]:
+		for ordinal, energy_wh in zip(self.used_dates, self.energy_wh):
+			yield self.device_id, date.fromordinal(ordinal), energy_wh
+
+	def to_records(self):
+		return [EnergyConsumption(device_id, used_date, energy_wh) for device_id, used_date, energy_wh in self.rows()]
+
+	def to_csv(self) -> str:
+		"""CSV rows (device_id, date ordinal, energy_wh) for COPY FROM STDIN."""
+		device_id = '"' + self.device_id.replace('"', '""') + '"'
+		return "".join([f"{device_id},{ordinal},{energy_wh!r}\n" for ordinal, energy_wh in zip(self.used_dates, self.energy_wh)])
@@ -1,11 +1,19 @@
-from typing import List
-from datetime import datetime
+import time
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import Dict, Iterable, List, Optional
+from datetime import date, datetime
 from common.postgres_connection import PostgresConn
-from common.energy_consumption import EnergyConsumption
+from common.energy_consumption import EnergyConsumption, EnergyConsumptionBatch
+from common.metrics import observe_insert
+from common.pg_copy import load_staging, load_staging_csv
+
+ROLLUP_PERIODS = ("day", "week", "month", "year")
 
 class EnergyConsumptionDAL:
-	def __init__(self, conn):
+	def __init__(self, conn, use_copy: bool = True):
 		self.conn = conn
+		self.use_copy = use_copy
+		self._partitioned = None
 
 	def get_log(self, device_id: str):
 		sql = "SELECT start_date, end_date FROM energy_consumption_read_log WHERE device_id = %s"
@@ -13,6 +21,21 @@ class EnergyConsumptionDAL:
 			cur.execute(sql, (device_id,))
 			return cur.fetchone()
 
+	def get_logs(self, device_ids: List[str]) -> Dict[str, tuple]:
+		sql = "SELECT device_id, start_date, end_date FROM energy_consumption_read_log WHERE device_id = ANY(%s)"
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids),))
+			return {device_id: (start_date, end_date) for device_id, start_date, end_date in cur.fetchall()}
+
+	def create_logs(self, device_ids: List[str], start_date):
+		sql = """
+		INSERT INTO energy_consumption_read_log (device_id, start_date, end_date)
+		SELECT unnest(%s::varchar[]), %s, NULL
+		ON CONFLICT (device_id) DO NOTHING;
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), start_date))
+
 	def create_log(self, device_id: str, start_date):
 		sql = """
 		INSERT INTO energy_consumption_read_log (device_id, start_date, end_date)
@@ -27,6 +50,101 @@ class EnergyConsumptionDAL:
 		with self.conn.cursor() as cur:
 			cur.execute(sql, (end_date, device_id))
 
+	def update_logs(self, end_dates: Dict[str, date]):
+		"""Advance several devices' log end dates in one statement; a log never moves backwards."""
+		sql = """
+			UPDATE energy_consumption_read_log l
+			SET end_date = GREATEST(l.end_date, u.end_date), read_timestamp = NOW()
+			FROM unnest(%s::varchar[], %s::date[]) AS u(device_id, end_date)
+			WHERE l.device_id = u.device_id
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(end_dates.keys()), list(end_dates.values())))
+
+	def missing_ranges(self, device_ids: List[str], start_date: date, end_date: date, recheck_days: int = 0) -> Dict[str, List[tuple]]:
+		"""
+		Date intervals in [start_date, end_date] with no stored consumption, per device,
+		as {device_id: [(gap_start, gap_end), ...]} (gaps-and-islands over the missing days).
+		Days folded from hourly readings count as missing until their daily value is stored.
+		Days recorded by `mark_empty_days` less than `recheck_days` days ago are left out.
+		"""
+		sql = """
+			SELECT device_id, MIN(day), MAX(day)
+			FROM (
+				SELECT d.device_id, g.day::date AS day,
+					g.day::date - (ROW_NUMBER() OVER (PARTITION BY d.device_id ORDER BY g.day))::int AS island
+				FROM unnest(%s::varchar[]) AS d(device_id)
+				CROSS JOIN generate_series(%s::date, %s::date, INTERVAL '1 day') AS g(day)
+				WHERE (NOT EXISTS (
+					SELECT 1 FROM energy_consumption e
+					WHERE e.device_id = d.device_id AND e.used_date = g.day::date
+				) OR EXISTS (
+					SELECT 1 FROM energy_consumption_folded f
+					WHERE f.device_id = d.device_id AND f.used_date = g.day::date
+				))
+				AND NOT EXISTS (
+					SELECT 1 FROM energy_consumption_empty_days x
+					WHERE x.device_id = d.device_id AND x.used_date = g.day::date
+					AND x.checked_at > NOW() - make_interval(days => %s)
+				)
+			) missing
+			GROUP BY device_id, island
+			ORDER BY device_id, MIN(day);
+		"""
+		gaps = {}
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), start_date, end_date, recheck_days))
+			for device_id, gap_start, gap_end in cur.fetchall():
+				gaps.setdefault(device_id, []).append((gap_start, gap_end))
+		return gaps
+
+	def mark_empty_days(self, windows: Iterable[tuple]):
+		"""
+		Record the days of fetched (device_id, start_date, end_date) windows that still have
+		no daily value stored, i.e. the LG API answered without one, for `missing_ranges`.
+		"""
+		windows = list(windows)
+		if not windows:
+			return
+		sql = """
+			INSERT INTO energy_consumption_empty_days AS x (device_id, used_date)
+			SELECT w.device_id, g.day::date
+			FROM unnest(%s::varchar[], %s::date[], %s::date[]) AS w(device_id, start_date, end_date)
+			CROSS JOIN LATERAL generate_series(w.start_date, w.end_date, INTERVAL '1 day') AS g(day)
+			WHERE NOT EXISTS (
+				SELECT 1 FROM energy_consumption e
+				WHERE e.device_id = w.device_id AND e.used_date = g.day::date
+			) OR EXISTS (
+				SELECT 1 FROM energy_consumption_folded f
+				WHERE f.device_id = w.device_id AND f.used_date = g.day::date
+			)
+			ON CONFLICT (device_id, used_date) DO UPDATE SET checked_at = NOW();
+		"""
+		device_ids, start_dates, end_dates = zip(*windows)
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), list(start_dates), list(end_dates)))
+
+	def lagging_devices(self, up_to: date) -> List[tuple]:
+		"""
+		Registered devices whose read log ends before `up_to` (or that were never read),
+		as (device_id, end_date) tuples, furthest behind first. Devices a worker currently
+		holds a lease on are left out.
+		"""
+		sql = """
+			SELECT d.id, l.end_date
+			FROM devices d
+			LEFT JOIN energy_consumption_read_log l ON l.device_id = d.id
+			WHERE (l.end_date IS NULL OR l.end_date < %s)
+			AND NOT EXISTS (
+				SELECT 1 FROM energy_sync_leases s
+				WHERE s.device_id = d.id AND s.expires_at >= NOW()
+			)
+			ORDER BY l.end_date NULLS FIRST, d.id;
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (up_to,))
+			return cur.fetchall()
+
 	def log_read(self, device_id: str, start_date, end_date):
 		sql = """
 			INSERT INTO energy_consumption_read_log (device_id, start_date, end_date)
@@ -36,6 +154,24 @@ class EnergyConsumptionDAL:
 		with self.conn.cursor() as cur:
 			cur.execute(sql, params)
 
+	def is_partitioned(self) -> bool:
+		if self._partitioned is None:
+			sql = "SELECT relkind = 'p' FROM pg_class WHERE oid = 'energy_consumption'::regclass;"
+			with self.conn.cursor() as cur:
+				cur.execute(sql)
+				self._partitioned = cur.fetchone()[0]
+		return self._partitioned
+
+	def ensure_partitions(self, start_date: date, end_date: date):
+		"""
+		Create any missing monthly partitions covering [start_date, end_date].
+		Does nothing while energy_consumption is still a plain table.
+		"""
+		if not self.is_partitioned():
+			return
+		with self.conn.cursor() as cur:
+			cur.execute("SELECT ensure_energy_consumption_partitions(%s, %s);", (start_date, end_date))
+
 	def insert(self, usage: EnergyConsumption):
 		sql = """
 			INSERT INTO energy_consumption (device_id, used_date, energy_wh)
@@ -50,19 +186,232 @@ class EnergyConsumptionDAL:
 		with self.conn.cursor() as cur:
 			cur.execute(sql, params)
 
-	def bulk_insert(self, rows: List[EnergyConsumption]):
-		sql = """
-			INSERT INTO energy_consumption (device_id, used_date, energy_wh)
-			VALUES (%s, %s, %s)
-			ON CONFLICT DO NOTHING;
+	def bulk_insert(self, rows: Iterable[EnergyConsumption], return_inserted: bool = False):
+		"""
+		Stream rows into a temp staging table (COPY, or execute_values when use_copy is False)
+		and merge them into energy_consumption in a single statement, which also adds the
+		newly inserted rows to energy_consumption_rollup.
+		Returns the number of newly inserted rows, or with `return_inserted` the rows
+		themselves as (device_id, used_date, energy_wh) tuples, along with the folded days
+		their daily values replaced.
 		"""
-		data = [
+		started = time.perf_counter()
+		data = (
 			(
 				row.device_id,
 				row.used_date,
 				row.energy_wh
 			)
 			for row in rows
-		]
+		)
+		with self.conn.cursor() as cur:
+			self._stage_rows(cur, data)
+			inserted = self._merge_stage(cur, "SELECT device_id, used_date, energy_wh FROM energy_consumption_stage", "energy_consumption_stage", return_inserted)
+		observe_insert("energy_consumption", started, len(inserted) if return_inserted else inserted)
+		return inserted
+
+	def bulk_insert_batches(self, batches: Iterable[EnergyConsumptionBatch], return_inserted: bool = False):
+		"""
+		Same as `bulk_insert` for columnar batches. With COPY, each batch is rendered to CSV
+		in one pass and dates travel as ordinals converted by Postgres, so no per-row objects
+		are created.
+		"""
+		started = time.perf_counter()
+		with self.conn.cursor() as cur:
+			if not self.use_copy:
+				self._stage_rows(cur, (row for batch in batches for row in batch.rows()))
+				inserted = self._merge_stage(cur, "SELECT device_id, used_date, energy_wh FROM energy_consumption_stage", "energy_consumption_stage", return_inserted)
+			else:
+				load_staging_csv(
+					cur,
+					"energy_consumption_batch_stage",
+					"device_id VARCHAR(65), used_ordinal INTEGER, energy_wh DOUBLE PRECISION",
+					("device_id", "used_ordinal", "energy_wh"),
+					(batch.to_csv() for batch in batches)
+				)
+				# Python date ordinals count days from 0001-01-01 (ordinal 1)
+				inserted = self._merge_stage(
+					cur,
+					"SELECT device_id, DATE '0001-01-01' + (used_ordinal - 1), energy_wh FROM energy_consumption_batch_stage",
+					"energy_consumption_batch_stage",
+					return_inserted
+				)
+		observe_insert("energy_consumption", started, len(inserted) if return_inserted else inserted)
+		return inserted
+
+	def fold_hourly(self, before: date, return_inserted: bool = False):
+		"""
+		Add the daily totals of complete (24-hour) days before `before` from
+		energy_consumption_hourly to energy_consumption and its rollups. Days the daily
+		sync already stored are kept as they are; incomplete days are left to it. Added days
+		are marked in energy_consumption_folded, so the LG API's daily value replaces them
+		once the daily sync fetches them.
+		Returns the number of days added, or the added rows with `return_inserted`.
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute("SELECT MIN(used_date), MAX(used_date) FROM energy_consumption_hourly WHERE used_date < %s;", (before,))
+			first, last = cur.fetchone()
+			if first is None:
+				return [] if return_inserted else 0
+			self.ensure_partitions(first, last)
+			source_sql = cur.mogrify("""
+				SELECT device_id, used_date, SUM(energy_wh)
+				FROM energy_consumption_hourly
+				WHERE used_date < %s
+				GROUP BY device_id, used_date
+				HAVING COUNT(*) = 24
+			""", (before,)).decode()
+			inserted = self._merge_stage(cur, source_sql, return_inserted=True, replace_folded=False)
+			if inserted:
+				execute_values(
+					cur,
+					"INSERT INTO energy_consumption_folded (device_id, used_date) VALUES %s ON CONFLICT DO NOTHING;",
+					[(device_id, used_date) for device_id, used_date, _ in inserted]
+				)
+			return inserted if return_inserted else len(inserted)
+
+	def _stage_rows(self, cur, data):
+		load_staging(
+			cur,
+			"energy_consumption_stage",
+			"device_id VARCHAR(65), used_date DATE, energy_wh DECIMAL(12,3)",
+			("device_id", "used_date", "energy_wh"),
+			data,
+			use_copy=self.use_copy
+		)
+
+	def _merge_stage(self, cur, source_sql: str, stage_table: str = None, return_inserted: bool = False, replace_folded: bool = True):
+		"""
+		Insert the (device_id, used_date, energy_wh) rows of `source_sql` that are new and add
+		them to the rollups. With `replace_folded`, staged rows for days folded from hourly
+		readings overwrite them instead, and the rollups move by the difference.
+		`return_inserted` returns the inserted and replaced rows, so both reach anomaly detection.
+		"""
+		replaced_sql = """
+				SELECT NULL::varchar AS device_id, NULL::date AS used_date, NULL::numeric AS energy_wh, NULL::numeric AS delta_wh WHERE false
+		"""
+		if replace_folded:
+			replaced_sql = """
+				UPDATE energy_consumption e
+				SET energy_wh = s.energy_wh
+				FROM staged s
+				JOIN energy_consumption_folded f ON f.device_id = s.device_id AND f.used_date = s.used_date
+				JOIN energy_consumption old ON old.device_id = s.device_id AND old.used_date = s.used_date
+				WHERE e.device_id = s.device_id AND e.used_date = s.used_date
+				RETURNING e.device_id, e.used_date, e.energy_wh, e.energy_wh - old.energy_wh AS delta_wh
+			"""
+		cur.execute(f"""
+			WITH staged AS MATERIALIZED (
+				SELECT * FROM ({source_sql}) AS staged(device_id, used_date, energy_wh)
+			), replaced AS (
+				{replaced_sql}
+			), unfolded AS (
+				DELETE FROM energy_consumption_folded f
+				USING replaced r
+				WHERE f.device_id = r.device_id AND f.used_date = r.used_date
+			), inserted AS (
+				INSERT INTO energy_consumption (device_id, used_date, energy_wh)
+				SELECT * FROM staged
+				ON CONFLICT DO NOTHING
+				RETURNING device_id, used_date, energy_wh
+			), changes AS (
+				SELECT device_id, used_date, energy_wh AS delta_wh, 1 AS new_days FROM inserted
+				UNION ALL
+				SELECT device_id, used_date, delta_wh, 0 FROM replaced
+			), rolled_up AS (
+				INSERT INTO energy_consumption_rollup AS r (device_id, period, period_start, energy_wh, days)
+				SELECT i.device_id, p.period, date_trunc(p.period, i.used_date)::date, SUM(i.delta_wh), SUM(i.new_days)
+				FROM changes i
+				CROSS JOIN (VALUES ('day'), ('week'), ('month'), ('year')) AS p(period)
+				GROUP BY 1, 2, 3
+				ORDER BY 1, 2, 3
+				ON CONFLICT (device_id, period, period_start) DO UPDATE
+				SET energy_wh = r.energy_wh + EXCLUDED.energy_wh, days = r.days + EXCLUDED.days
+			)
+			{"SELECT device_id, used_date, energy_wh::float8 FROM inserted UNION ALL SELECT device_id, used_date, energy_wh::float8 FROM replaced" if return_inserted else "SELECT COUNT(*) FROM inserted"};
+		""")
+		inserted = cur.fetchall() if return_inserted else cur.fetchone()[0]
+		if stage_table:
+			cur.execute(f"TRUNCATE {stage_table};")
+		return inserted
+
+	def totals(self, period: str, start_date: date, end_date: date, device_id: Optional[str] = None) -> List[dict]:
+		"""
+		Energy totals per `period` whose start falls in the periods covering [start_date, end_date],
+		for one device or, when `device_id` is None, summed over the fleet. Reads rollups only.
+		"""
+		if period not in ROLLUP_PERIODS:
+			raise ValueError(f"period must be one of {', '.join(ROLLUP_PERIODS)}")
+		params = {"period": period, "start_date": start_date, "end_date": end_date, "device_id": device_id}
+		if device_id:
+			sql = """
+				SELECT period_start, energy_wh, days
+				FROM energy_consumption_rollup
+				WHERE device_id = %(device_id)s AND period = %(period)s
+				AND period_start BETWEEN date_trunc(%(period)s, %(start_date)s::date)::date AND %(end_date)s
+				ORDER BY period_start;
+			"""
+		else:
+			sql = """
+				SELECT period_start, SUM(energy_wh) AS energy_wh, COUNT(*) AS devices, SUM(days) AS device_days
+				FROM energy_consumption_rollup
+				WHERE period = %(period)s
+				AND period_start BETWEEN date_trunc(%(period)s, %(start_date)s::date)::date AND %(end_date)s
+				GROUP BY period_start
+				ORDER BY period_start;
+			"""
+		with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+			cur.execute(sql, params)
+			return cur.fetchall()
+
+	def iter_range(self, start_date: date, end_date: date, device_ids: Optional[List[str]] = None, batch_rows: int = 50000):
+		"""
+		Yield lists of (device_id, used_date, energy_wh) rows in [start_date, end_date], ordered by
+		date then device. Rows come from a server-side (named) cursor `batch_rows` at a time,
+		so memory stays flat however long the range is. Runs inside the caller's transaction.
+		"""
+		sql = """
+			SELECT device_id, used_date, energy_wh::float8
+			FROM energy_consumption
+			WHERE used_date BETWEEN %(start_date)s AND %(end_date)s
+			AND (%(device_ids)s::varchar[] IS NULL OR device_id = ANY(%(device_ids)s::varchar[]))
+			ORDER BY used_date, device_id;
+		"""
+		params = {"start_date": start_date, "end_date": end_date, "device_ids": list(device_ids) if device_ids else None}
+		with self.conn.cursor(name="energy_consumption_export") as cur:
+			cur.itersize = batch_rows
+			cur.execute(sql, params)
+			while True:
+				rows = cur.fetchmany(batch_rows)
+				if not rows:
+					break
+				yield rows
+
+	def month_version(self, device_ids: List[str], month: date) -> tuple:
+		"""
+		(stored days, total Wh) of the given devices in the month starting at `month`, read
+		from the monthly rollups; any insert into that month changes it.
+		"""
+		sql = """
+			SELECT COALESCE(SUM(days), 0), COALESCE(SUM(energy_wh), 0)::float8
+			FROM energy_consumption_rollup
+			WHERE period = 'month' AND period_start = %s AND device_id = ANY(%s);
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (month, list(device_ids)))
+			return tuple(cur.fetchone())
+
+	def synced_through(self, device_ids: Optional[List[str]] = None) -> Optional[date]:
+		"""
+		Last day for which every given device (every registered device when None) has been
+		read from the LG API, or None if any of them was never read.
+		"""
+		sql = """
+			SELECT CASE WHEN COUNT(*) = COUNT(l.end_date) THEN MIN(l.end_date) END
+			FROM devices d
+			LEFT JOIN energy_consumption_read_log l ON l.device_id = d.id
+			WHERE %(device_ids)s::varchar[] IS NULL OR d.id = ANY(%(device_ids)s::varchar[]);
+		"""
 		with self.conn.cursor() as cur:
-			cur.executemany(sql, data)
+			cur.execute(sql, {"device_ids": list(device_ids) if device_ids else None})
+			return cur.fetchone()[0]
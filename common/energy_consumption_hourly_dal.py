@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Dict, Iterable, List
+from psycopg2.extras import execute_values
+from common.energy_consumption import EnergyConsumptionHourly
+
+class EnergyConsumptionHourlyDAL:
+	"""
+	Data Access Layer for energy_consumption_hourly, the near-real-time readings of open days.
+	"""
+	def __init__(self, conn):
+		self.conn = conn
+
+	def get_day(self, device_ids: List[str], day: date) -> Dict[str, Dict[int, float]]:
+		"""Stored readings of `day` as {device_id: {hour: energy_wh}}."""
+		sql = """
+			SELECT device_id, hour, energy_wh
+			FROM energy_consumption_hourly
+			WHERE device_id = ANY(%s) AND used_date = %s;
+		"""
+		readings = {}
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), day))
+			for device_id, hour, energy_wh in cur.fetchall():
+				readings.setdefault(device_id, {})[hour] = float(energy_wh)
+		return readings
+
+	def upsert(self, rows: Iterable[EnergyConsumptionHourly]) -> int:
+		"""
+		Insert new readings and update changed ones; identical readings are left untouched
+		so they cost no row version. Returns the number of rows written.
+		"""
+		rows = [(row.device_id, row.used_date, row.hour, row.energy_wh) for row in rows]
+		if not rows:
+			return 0
+		sql = """
+			INSERT INTO energy_consumption_hourly AS h (device_id, used_date, hour, energy_wh)
+			VALUES %s
+			ON CONFLICT (device_id, used_date, hour) DO UPDATE
+			SET energy_wh = EXCLUDED.energy_wh, updated_at = NOW()
+			WHERE h.energy_wh IS DISTINCT FROM EXCLUDED.energy_wh
+			RETURNING 1;
+		"""
+		with self.conn.cursor() as cur:
+			written = execute_values(cur, sql, rows, fetch=True)
+		return len(written)
+
+	def purge(self, before: date) -> int:
+		sql = "DELETE FROM energy_consumption_hourly WHERE used_date < %s;"
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (before,))
+			return cur.rowcount
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import threading
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from common.device_dal import DeviceDAL
+from common.energy_consumption_dal import EnergyConsumptionDAL
+
+EXPORT_SCHEMA = pa.schema([
+	("device_id", pa.string()),
+	("used_date", pa.date32()),
+	("energy_wh", pa.float64()),
+])
+EXPORT_MEDIA_TYPES = {
+	"arrow": "application/vnd.apache.arrow.stream",
+	"parquet": "application/vnd.apache.parquet",
+}
+
+def _next_month(day: date) -> date:
+	return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def _month_segments(start_date: date, end_date: date):
+	"""Split [start_date, end_date] at month boundaries into (start, end, whole_month) tuples."""
+	segment_start = start_date
+	while segment_start <= end_date:
+		month_end = _next_month(segment_start) - timedelta(days=1)
+		segment_end = min(month_end, end_date)
+		yield segment_start, segment_end, segment_start.day == 1 and segment_end == month_end
+		segment_start = segment_end + timedelta(days=1)
+
+def _to_batch(rows) -> pa.RecordBatch:
+	device_ids, used_dates, energy_wh = zip(*rows)
+	return pa.RecordBatch.from_arrays(
+		[pa.array(device_ids, pa.string()), pa.array(used_dates, pa.date32()), pa.array(energy_wh, pa.float64())],
+		schema=EXPORT_SCHEMA
+	)
+
+class _ChunkSink:
+	"""Write-only file object that collects writer output until it is drained into a response."""
+	def __init__(self):
+		self._chunks = []
+		self._position = 0
+		self.closed = False
+
+	def write(self, data) -> int:
+		data = bytes(data)
+		self._chunks.append(data)
+		self._position += len(data)
+		return len(data)
+
+	def tell(self) -> int:
+		return self._position
+
+	def flush(self):
+		pass
+
+	def close(self):
+		self.closed = True
+
+	def drain(self) -> bytes:
+		data = b"".join(self._chunks)
+		self._chunks = []
+		return data
+
+class _CacheEntryWriter:
+	"""
+	Writes one cache file under a temporary name and publishes it atomically on commit,
+	removing the month's entries for earlier data versions.
+	"""
+	def __init__(self, path: str, stale_prefix: str):
+		self.path = path
+		self.stale_prefix = stale_prefix
+		self.tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		self._writer = ipc.new_file(self.tmp_path, EXPORT_SCHEMA)
+
+	def write(self, batch: pa.RecordBatch):
+		self._writer.write_batch(batch)
+
+	def commit(self):
+		self._writer.close()
+		os.replace(self.tmp_path, self.path)
+		directory, name = os.path.split(self.path)
+		for other in os.listdir(directory):
+			if other.startswith(self.stale_prefix) and other.endswith(".arrow") and other != name:
+				try:
+					os.remove(os.path.join(directory, other))
+				except FileNotFoundError:
+					pass
+
+	def abort(self):
+		self._writer.close()
+		os.remove(self.tmp_path)
+
+class EnergyExportCache:
+	"""
+	Arrow IPC files holding one closed month of energy_consumption for one resolved device
+	set. Each entry is keyed on the exact device IDs and a data version of the month (see
+	`EnergyConsumptionDAL.month_version`), so a device registered later, a backfilled gap or
+	a folded day makes the entry miss and be rebuilt rather than served stale.
+	"""
+	def __init__(self, directory: str):
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+
+	def _path(self, device_ids: List[str], month: date, version: tuple) -> str:
+		selection = hashlib.sha256(",".join(sorted(set(device_ids))).encode()).hexdigest()[:32]
+		data_version = hashlib.sha256(repr(version).encode()).hexdigest()[:16]
+		return os.path.join(self.directory, selection, f"{month:%Y-%m}.{data_version}.arrow")
+
+	def batches(self, device_ids: List[str], month: date, version: tuple) -> Optional[Iterator[pa.RecordBatch]]:
+		"""Record batches of a cached month at `version`, or None when it is not cached."""
+		path = self._path(device_ids, month, version)
+		if not os.path.exists(path):
+			return None
+		reader = ipc.open_file(pa.memory_map(path))
+		return (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+	def writer(self, device_ids: List[str], month: date, version: tuple) -> _CacheEntryWriter:
+		return _CacheEntryWriter(self._path(device_ids, month, version), f"{month:%Y-%m}.")
+
+class EnergyExporter:
+	"""
+	Streams a device/date slice of energy_consumption as Arrow IPC or Parquet.
+	Rows are read month by month through a server-side cursor, so memory stays constant
+	whatever the range. Whole months that are closed and fully synced for the selected
+	devices are written to `cache` on first export and served from there for as long as
+	the month's data version is unchanged.
+	"""
+	def __init__(self, pool, cache: Optional[EnergyExportCache] = None, batch_rows: int = 50000):
+		self.pool = pool
+		self.cache = cache
+		self.batch_rows = batch_rows
+
+	def _batches(self, conn, start_date: date, end_date: date, device_ids: Optional[List[str]]):
+		dal = EnergyConsumptionDAL(conn)
+		if self.cache:
+			# "Every device" is cached under the devices registered right now
+			selection = sorted(set(device_ids)) if device_ids else DeviceDAL(conn).list_ids()
+			synced_through = dal.synced_through(selection) if selection else None
+		else:
+			synced_through = None
+		open_month = date.today().replace(day=1)
+		for segment_start, segment_end, whole_month in _month_segments(start_date, end_date):
+			cacheable = (
+				whole_month
+				and segment_end < open_month
+				and synced_through is not None
+				and segment_end <= synced_through
+			)
+			if not cacheable:
+				for rows in dal.iter_range(segment_start, segment_end, device_ids, self.batch_rows):
+					yield _to_batch(rows)
+				continue
+			version = dal.month_version(selection, segment_start)
+			cached = self.cache.batches(selection, segment_start, version)
+			if cached is not None:
+				yield from cached
+				continue
+			writer = self.cache.writer(selection, segment_start, version)
+			try:
+				for rows in dal.iter_range(segment_start, segment_end, device_ids, self.batch_rows):
+					batch = _to_batch(rows)
+					writer.write(batch)
+					yield batch
+			except BaseException:
+				# Includes the client going away mid-stream: never publish a partial month
+				writer.abort()
+				raise
+			writer.commit()
+
+	def stream(self, start_date: date, end_date: date, device_ids: Optional[List[str]] = None, format: str = "arrow") -> Iterator[bytes]:
+		"""Yield the encoded export chunk by chunk, one chunk per record batch."""
+		if format not in EXPORT_MEDIA_TYPES:
+			raise ValueError(f"format must be one of {', '.join(EXPORT_MEDIA_TYPES)}")
+		sink = _ChunkSink()
+		with self.pool.connection() as conn:
+			if format == "arrow":
+				writer = ipc.new_stream(sink, EXPORT_SCHEMA)
+			else:
+				writer = pq.ParquetWriter(sink, EXPORT_SCHEMA)
+			for batch in self._batches(conn, start_date, end_date, device_ids):
+				if format == "arrow":
+					writer.write_batch(batch)
+				else:
+					# One row group per batch keeps the writer's buffer bounded
+					writer.write_table(pa.Table.from_batches([batch]))
+				data = sink.drain()
+				if data:
+					yield data
+			writer.close()
+		yield sink.drain()
@@ -0,0 +1,52 @@
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+from psycopg2.extras import execute_values
+from common.energy_consumption import EnergyConsumptionBatch
+
+class EnergySyncSpoolDAL:
+	"""
+	Data Access Layer for energy_sync_spool, the fetched-but-unloaded LG API windows.
+	Windows are keyed by (device_id, start_date, end_date).
+	"""
+	def __init__(self, conn):
+		self.conn = conn
+
+	def put(self, device_id: str, start_date: date, end_date: date, batch: EnergyConsumptionBatch):
+		sql = """
+			INSERT INTO energy_sync_spool (device_id, start_date, end_date, used_dates, energy_wh)
+			VALUES (%s, %s, %s, %s::date[], %s::float8[])
+			ON CONFLICT (device_id, start_date, end_date) DO UPDATE
+			SET used_dates = EXCLUDED.used_dates, energy_wh = EXCLUDED.energy_wh, spooled_at = NOW();
+		"""
+		used_dates = [date.fromordinal(ordinal) for ordinal in batch.used_dates]
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (device_id, start_date, end_date, used_dates, list(batch.energy_wh)))
+
+	def get(self, device_ids: Iterable[str]) -> Dict[str, List[Tuple[date, date, EnergyConsumptionBatch]]]:
+		"""Spooled windows of the given devices as {device_id: [(start, end, batch), ...]}, oldest first."""
+		sql = """
+			SELECT device_id, start_date, end_date, used_dates, energy_wh
+			FROM energy_sync_spool
+			WHERE device_id = ANY(%s)
+			ORDER BY device_id, start_date, end_date;
+		"""
+		windows = {}
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids),))
+			for device_id, start_date, end_date, used_dates, energy_wh in cur.fetchall():
+				batch = EnergyConsumptionBatch(device_id, array("l", [d.toordinal() for d in used_dates]), array("d", energy_wh))
+				windows.setdefault(device_id, []).append((start_date, end_date, batch))
+		return windows
+
+	def delete(self, windows: Iterable[Tuple[str, date, date]]):
+		windows = list(windows)
+		if not windows:
+			return
+		sql = """
+			DELETE FROM energy_sync_spool s
+			USING (VALUES %s) AS w(device_id, start_date, end_date)
+			WHERE s.device_id = w.device_id AND s.start_date = w.start_date::date AND s.end_date = w.end_date::date;
+		"""
+		with self.conn.cursor() as cur:
+			execute_values(cur, sql, windows)
@@ -0,0 +1,30 @@
+import threading
+
+class lazy:
+	"""
+	Thread-safe `cached_property`: the wrapped factory runs once per instance, on first
+	access, and concurrent first accesses wait for that single build. Used for service
+	containers whose clients (pools, connections) must not be created at import time.
+	"""
+	def __init__(self, factory):
+		self.factory = factory
+		self.name = factory.__name__
+		self.__doc__ = factory.__doc__
+		self._lock = threading.RLock()
+
+	def __set_name__(self, owner, name):
+		self.name = name
+
+	def __get__(self, instance, owner=None):
+		if instance is None:
+			return self
+		if self.name in instance.__dict__:
+			return instance.__dict__[self.name]
+		with self._lock:
+			if self.name not in instance.__dict__:
+				instance.__dict__[self.name] = self.factory(instance)
+			return instance.__dict__[self.name]
+
+def is_built(instance, name: str) -> bool:
+	"""Whether the lazy attribute `name` has been built on `instance` (e.g. to close it)."""
+	return name in instance.__dict__
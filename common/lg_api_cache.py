@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Optional
+
+class CacheMissError(Exception):
+	"""Raised in replay mode when a response is not in the cache."""
+
+class LGApiResponseCache:
+	"""
+	On-disk cache of raw LG API energy usage responses, one JSON file per
+	(device, period, start date, end date).
+	Windows ending before today are closed and never expire; windows reaching today
+	expire after `open_ttl` seconds. Least recently used files are evicted once the
+	cache grows past `max_bytes`. In replay mode the API is never called and misses
+	raise `CacheMissError`, so reprocessing and benchmarks can run fully offline.
+	"""
+	def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, open_ttl: float = 900.0, replay: bool = False):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.open_ttl = open_ttl
+		self.replay = replay
+		self._lock = threading.Lock()
+		os.makedirs(directory, exist_ok=True)
+		self._size = sum(os.path.getsize(path) for path in self._files())
+
+	def _files(self):
+		for root, _, names in os.walk(self.directory):
+			for name in names:
+				if name.endswith(".json"):
+					yield os.path.join(root, name)
+
+	def _path(self, device_id: str, period: str, start_date: date, end_date: date) -> str:
+		key = hashlib.sha256(f"{device_id}|{period}|{start_date:%Y%m%d}|{end_date:%Y%m%d}".encode()).hexdigest()
+		return os.path.join(self.directory, key[:2], f"{key}.json")
+
+	def get(self, device_id: str, period: str, start_date: date, end_date: date) -> Optional[dict]:
+		path = self._path(device_id, period, start_date, end_date)
+		try:
+			with open(path) as f:
+				entry = json.load(f)
+		except (FileNotFoundError, ValueError):
+			return None
+		if end_date >= date.today() and not self.replay and time.time() - entry["stored_at"] > self.open_ttl:
+			return None
+		# Touch the file so eviction treats it as recently used
+		os.utime(path)
+		return entry["response"]
+
+	def put(self, device_id: str, period: str, start_date: date, end_date: date, response: dict):
+		path = self._path(device_id, period, start_date, end_date)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		data = json.dumps({"stored_at": time.time(), "response": response})
+		tmp_path = f"{path}.{threading.get_ident()}.tmp"
+		with open(tmp_path, "w") as f:
+			f.write(data)
+		with self._lock:
+			try:
+				self._size -= os.path.getsize(path)
+			except FileNotFoundError:
+				pass
+			os.replace(tmp_path, path)
+			self._size += len(data)
+			if self._size > self.max_bytes:
+				self._evict()
+
+	def _evict(self):
+		"""Delete least recently used files until the cache is back under 90% of max_bytes."""
+		entries = []
+		for path in self._files():
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, path))
+		entries.sort()
+		self._size = sum(size for _, size, _ in entries)
+		target = self.max_bytes * 0.9
+		for _, size, path in entries:
+			if self._size <= target:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			self._size -= size
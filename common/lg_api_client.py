@@ -1,9 +1,25 @@
 from common.device import Device
-from common.energy_consumption import EnergyConsumption
+from common.energy_consumption import EnergyConsumption, EnergyConsumptionBatch, EnergyConsumptionHourly
+from common.lg_api_cache import CacheMissError, LGApiResponseCache
+from common.metrics import LG_API_REQUEST_SECONDS, LG_API_RETRIES
+from common.tracing import record_span, span
+import asyncio
+import random
+import time
+import httpx
 import requests
 import uuid
-from datetime import datetime, date
+from datetime import date
+from email.utils import parsedate_to_datetime
 from enum import Enum
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://api-aic.lgthinq.com"
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+DEFAULT_HOURLY_PERIOD = "HOURLY"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 class LGApiResponseCode(Enum):
 	NORMAL_RESPONSE = "0000"
@@ -13,22 +29,101 @@ class LGApiResponseCode(Enum):
 	NOT_SUPPORTED_COUNTRY = "1307"
 	FAIL_REQUEST = "2214"
 
-class LGApiClient:
-	def __init__(self, country, api_key, client_id, token):
-		self.base_url = "https://api-aic.lgthinq.com"
+# Result codes retrying cannot change: the device or its data is out of reach for this account
+PERMANENT_RESULT_CODES = {
+	LGApiResponseCode.NOT_OWNED_DEVICE.value,
+	LGApiResponseCode.NOT_SUPPORTED_PRODUCT.value,
+	LGApiResponseCode.NOT_SUPPORTED_PROPERTY.value,
+	LGApiResponseCode.NOT_SUPPORTED_COUNTRY.value,
+}
+
+class LGApiError(Exception):
+	"""An LG API response carrying a result code other than NORMAL_RESPONSE."""
+	def __init__(self, result_code: str):
+		self.result_code = result_code
+		try:
+			name = LGApiResponseCode(result_code)
+		except ValueError:
+			name = result_code
+		super().__init__(f"Unexpected Result Code '{name}' from LG API.")
+
+	@property
+	def permanent(self) -> bool:
+		return self.result_code in PERMANENT_RESULT_CODES
+
+def _retry_after_seconds(value):
+	"""Parse a Retry-After header given either as seconds or as an HTTP date."""
+	if not value:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		retry_at = parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return None
+	return max(0.0, retry_at.timestamp() - time.time())
+
+def _backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+	"""Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+	delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+	if retry_after is not None:
+		delay = max(delay, min(retry_after, cap))
+	return delay
+
+class _LGApiClientBase:
+	def __init__(self, country, api_key, client_id, token, base_url=DEFAULT_BASE_URL,
+			timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, cache=None, hourly_period=DEFAULT_HOURLY_PERIOD):
+		self.base_url = base_url
+		self.hourly_period = hourly_period
+		self.timeout = timeout
+		self.max_retries = max_retries
+		self.cache = cache
 		self.headers = {
-			"x-message-id": str(uuid.uuid4()),
 			"x-country": country,
 			"x-api-key": api_key,
 			"x-client-id": client_id,
 			"Authorization": "Bearer {}".format(token),
 		}
 
-	def get_devices(self):
-		url = f"{self.base_url}/devices"
-		response = requests.get(url, headers=self.headers)
-		response.raise_for_status()
-		return [self.to_device(d) for d in response.json()["response"]]
+	@classmethod
+	def from_config(cls, config, **kwargs):
+		"""Build a client from an `LgApiConfig`."""
+		if config.LG_API_CACHE_DIR and "cache" not in kwargs:
+			kwargs["cache"] = LGApiResponseCache(
+				config.LG_API_CACHE_DIR,
+				max_bytes=config.LG_API_CACHE_MAX_MB * 1024 * 1024,
+				open_ttl=config.LG_API_CACHE_OPEN_TTL_SECONDS,
+				replay=config.LG_API_REPLAY
+			)
+		return cls(
+			config.LG_COUNTRY,
+			config.LG_API_KEY,
+			config.LG_CLIENT_ID,
+			config.LG_API_TOKEN,
+			base_url=config.LG_API_BASE_URL,
+			timeout=config.LG_API_TIMEOUT,
+			max_retries=config.LG_API_MAX_RETRIES,
+			hourly_period=config.LG_API_HOURLY_PERIOD,
+			**kwargs
+		)
+
+	def _observe(self, endpoint, started, result):
+		"""Record one attempt's latency; `result` is the LG result code when the body has one."""
+		LG_API_REQUEST_SECONDS.labels(endpoint=endpoint, result=result).observe(time.perf_counter() - started)
+		record_span("lg_api_request", started, endpoint=endpoint, result=result)
+
+	@staticmethod
+	def _result_code(response, response_data):
+		body = response_data.get("response") if isinstance(response_data, dict) else None
+		if isinstance(body, dict) and "resultCode" in body:
+			return str(body["resultCode"])
+		return str(response.status_code)
+
+	def request_headers(self):
+		"""Headers for a single request; LG requires a unique x-message-id per call."""
+		return {**self.headers, "x-message-id": str(uuid.uuid4())}
 
 	def to_device(self, device):
 		return Device(
@@ -38,27 +133,196 @@ class LGApiClient:
 			alias=device["deviceInfo"]["alias"]
 		)
 
-	def get_energy_consumption(self, device_id, start_date: date, end_date: date):
+	def to_energy_consumption(self, device_id, consumption):
+		return EnergyConsumption(
+			device_id=device_id,
+			used_date=date.fromisoformat(consumption["usedDate"]),
+			energy_wh=float(consumption["energyUsage"])
+		)
+
+	def to_energy_consumption_hourly(self, device_id, consumption):
+		# Hourly entries carry the hour either in a YYYYMMDDHH usedDate or in a separate usedHour
+		used_date = consumption["usedDate"]
+		hour = int(used_date[8:10]) if len(used_date) >= 10 else int(consumption["usedHour"])
+		return EnergyConsumptionHourly(
+			device_id=device_id,
+			used_date=date.fromisoformat(used_date[:8]),
+			hour=hour,
+			energy_wh=float(consumption["energyUsage"])
+		)
+
+	def _energy_consumption_params(self, start_date: date, end_date: date, period="DAILY"):
 		if (end_date - start_date).days < 0 or (end_date - start_date).days > 30:
 			raise Exception(f"Invalid date range: {start_date} - {end_date}")
-		params = {
-			"period": "DAILY",
+		return {
+			"period": period,
 			"startDate": start_date.strftime("%Y%m%d"),
 			"endDate": end_date.strftime("%Y%m%d")
 		}
-		url = f"{self.base_url}/devices/energy/{device_id}/usage"
-		response = requests.get(url, params=params, headers=self.headers)
-		response.raise_for_status()
-		response_data = response.json()
+
+	def _cached_energy_response(self, device_id, start_date: date, end_date: date, params):
+		"""Cached raw response for the window, or None; raises CacheMissError in replay mode."""
+		if not self.cache:
+			return None
+		response_data = self.cache.get(device_id, params["period"], start_date, end_date)
+		if response_data is None and self.cache.replay:
+			raise CacheMissError(f"No cached LG API response for {device_id} {start_date} - {end_date}")
+		return response_data
+
+	def _store_energy_response(self, device_id, start_date: date, end_date: date, params, response_data):
+		if self.cache and response_data["response"]["resultCode"] == LGApiResponseCode.NORMAL_RESPONSE.value:
+			self.cache.put(device_id, params["period"], start_date, end_date, response_data)
+
+	def _parse_devices(self, response_data):
+		return [self.to_device(d) for d in response_data["response"]]
+
+	def _energy_data_list(self, response_data):
 		if response_data["response"]["resultCode"] == LGApiResponseCode.NORMAL_RESPONSE.value:
-			return [self.to_energy_consumption(device_id, consumption) for consumption in response_data["response"]["result"]["dataList"]]
+			return response_data["response"]["result"]["dataList"]
 		else:
-			result_code = LGApiResponseCode(response_data["response"]["resultCode"])
-			raise Exception(f"Unexpected Result Code '{result_code}' from LG API.")
+			raise LGApiError(str(response_data["response"]["resultCode"]))
 
-	def to_energy_consumption(self, device_id, consumption):
-		return EnergyConsumption(
-			device_id=device_id,
-			used_date=datetime.strptime(consumption["usedDate"], "%Y%m%d").strftime("%Y-%m-%d"),
-			energy_wh=float(consumption["energyUsage"])
-		)
+	def _parse_energy_consumption(self, device_id, response_data):
+		return [self.to_energy_consumption(device_id, consumption) for consumption in self._energy_data_list(response_data)]
+
+	def _parse_energy_consumption_hourly(self, device_id, response_data):
+		return [self.to_energy_consumption_hourly(device_id, consumption) for consumption in self._energy_data_list(response_data)]
+
+class LGApiClient(_LGApiClientBase):
+	"""
+	Synchronous LG ThinQ API client.
+	Requests go through a pooled keep-alive `requests.Session` and are retried with
+	jittered exponential backoff on connection errors, timeouts, 429 and 5xx responses.
+	The client is safe to share between threads.
+	"""
+	def __init__(self, country, api_key, client_id, token, session=None, pool_size=DEFAULT_POOL_SIZE, **kwargs):
+		super().__init__(country, api_key, client_id, token, **kwargs)
+		if session is None:
+			session = requests.Session()
+			adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+			session.mount("https://", adapter)
+			session.mount("http://", adapter)
+		self.session = session
+
+	def _get(self, url, endpoint, params=None):
+		attempt = 0
+		while True:
+			started = time.perf_counter()
+			try:
+				response = self.session.get(url, params=params, headers=self.request_headers(), timeout=self.timeout)
+			except (requests.ConnectionError, requests.Timeout):
+				self._observe(endpoint, started, "connection_error")
+				if attempt >= self.max_retries:
+					raise
+				time.sleep(_backoff_delay(attempt))
+			else:
+				if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+					if not response.ok:
+						self._observe(endpoint, started, str(response.status_code))
+						response.raise_for_status()
+					response_data = response.json()
+					self._observe(endpoint, started, self._result_code(response, response_data))
+					return response_data
+				self._observe(endpoint, started, str(response.status_code))
+				time.sleep(_backoff_delay(attempt, _retry_after_seconds(response.headers.get("Retry-After"))))
+			LG_API_RETRIES.labels(endpoint=endpoint).inc()
+			attempt += 1
+
+	def get_devices(self):
+		return self._parse_devices(self._get(f"{self.base_url}/devices", "devices"))
+
+	def _energy_response(self, device_id, start_date: date, end_date: date):
+		params = self._energy_consumption_params(start_date, end_date)
+		response_data = self._cached_energy_response(device_id, start_date, end_date, params)
+		if response_data is None:
+			url = f"{self.base_url}/devices/energy/{device_id}/usage"
+			response_data = self._get(url, "energy_usage", params=params)
+			self._store_energy_response(device_id, start_date, end_date, params, response_data)
+		return response_data
+
+	def get_energy_consumption(self, device_id, start_date: date, end_date: date):
+		return self._parse_energy_consumption(device_id, self._energy_response(device_id, start_date, end_date))
+
+	def get_energy_consumption_batch(self, device_id, start_date: date, end_date: date) -> EnergyConsumptionBatch:
+		response_data = self._energy_response(device_id, start_date, end_date)
+		with span("parse") as parse_span:
+			batch = EnergyConsumptionBatch.from_api(device_id, self._energy_data_list(response_data))
+			parse_span.set(rows=len(batch))
+		return batch
+
+	def get_energy_consumption_hourly(self, device_id, day: date):
+		"""Hourly usage of one day, typically today's still open period; never cached."""
+		url = f"{self.base_url}/devices/energy/{device_id}/usage"
+		params = self._energy_consumption_params(day, day, self.hourly_period)
+		return self._parse_energy_consumption_hourly(device_id, self._get(url, "energy_usage_hourly", params=params))
+
+	def close(self):
+		self.session.close()
+
+class AsyncLGApiClient(_LGApiClientBase):
+	"""
+	Asynchronous LG ThinQ API client backed by a pooled `httpx.AsyncClient`.
+	Shares the retry, header and parsing behaviour of `LGApiClient`.
+	"""
+	def __init__(self, country, api_key, client_id, token, client=None, pool_size=DEFAULT_POOL_SIZE, **kwargs):
+		super().__init__(country, api_key, client_id, token, **kwargs)
+		if client is None:
+			client = httpx.AsyncClient(
+				timeout=self.timeout,
+				limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+			)
+		self.client = client
+
+	async def _get(self, url, endpoint, params=None):
+		attempt = 0
+		while True:
+			started = time.perf_counter()
+			try:
+				response = await self.client.get(url, params=params, headers=self.request_headers(), timeout=self.timeout)
+			except httpx.TransportError:
+				self._observe(endpoint, started, "connection_error")
+				if attempt >= self.max_retries:
+					raise
+				await asyncio.sleep(_backoff_delay(attempt))
+			else:
+				if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+					if not response.is_success:
+						self._observe(endpoint, started, str(response.status_code))
+						response.raise_for_status()
+					response_data = response.json()
+					self._observe(endpoint, started, self._result_code(response, response_data))
+					return response_data
+				self._observe(endpoint, started, str(response.status_code))
+				await asyncio.sleep(_backoff_delay(attempt, _retry_after_seconds(response.headers.get("Retry-After"))))
+			LG_API_RETRIES.labels(endpoint=endpoint).inc()
+			attempt += 1
+
+	async def get_devices(self):
+		return self._parse_devices(await self._get(f"{self.base_url}/devices", "devices"))
+
+	async def _energy_response(self, device_id, start_date: date, end_date: date):
+		params = self._energy_consumption_params(start_date, end_date)
+		response_data = self._cached_energy_response(device_id, start_date, end_date, params)
+		if response_data is None:
+			url = f"{self.base_url}/devices/energy/{device_id}/usage"
+			response_data = await self._get(url, "energy_usage", params=params)
+			self._store_energy_response(device_id, start_date, end_date, params, response_data)
+		return response_data
+
+	async def get_energy_consumption(self, device_id, start_date: date, end_date: date):
+		return self._parse_energy_consumption(device_id, await self._energy_response(device_id, start_date, end_date))
+
+	async def get_energy_consumption_batch(self, device_id, start_date: date, end_date: date) -> EnergyConsumptionBatch:
+		response_data = await self._energy_response(device_id, start_date, end_date)
+		with span("parse") as parse_span:
+			batch = EnergyConsumptionBatch.from_api(device_id, self._energy_data_list(response_data))
+			parse_span.set(rows=len(batch))
+		return batch
+
+	async def get_energy_consumption_hourly(self, device_id, day: date):
+		url = f"{self.base_url}/devices/energy/{device_id}/usage"
+		params = self._energy_consumption_params(day, day, self.hourly_period)
+		return self._parse_energy_consumption_hourly(device_id, await self._get(url, "energy_usage_hourly", params=params))
+
+	async def aclose(self):
+		await self.client.aclose()
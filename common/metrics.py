@@ -0,0 +1,135 @@
+"""
+Prometheus metrics shared by the coordinator and the ETL worker.
+Metrics live in the default registry: the coordinator serves them on `/metrics`, the
+worker on a sidecar HTTP port (`start_metrics_server`).
+"""
+import time
+from contextlib import contextmanager
+from datetime import date
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, REGISTRY
+from common.sync_retry import ENQUEUED_AT_HEADER, RETRY_COUNT_HEADER
+
+LG_API_REQUEST_SECONDS = Histogram(
+	"lg_api_request_seconds",
+	"LG ThinQ API request latency per attempt.",
+	["endpoint", "result"],
+	buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LG_API_RETRIES = Counter(
+	"lg_api_retries_total",
+	"LG ThinQ API attempts that were retried.",
+	["endpoint"]
+)
+DB_INSERT_SECONDS = Histogram(
+	"db_insert_seconds",
+	"Duration of bulk inserts, staging and merge included.",
+	["table"],
+	buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+DB_INSERTED_ROWS = Counter(
+	"db_inserted_rows_total",
+	"Rows newly inserted by bulk inserts; rate() gives rows/sec.",
+	["table"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+	"sync_queue_wait_seconds",
+	"Time from publishing a sync request to a worker picking it up.",
+	["attempt"],
+	buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+)
+DEVICE_LEASE_CONTENDED = Counter(
+	"sync_device_lease_contended_total",
+	"Sync deliveries deferred because another worker held the device."
+)
+SYNC_SECONDS = Histogram(
+	"sync_run_seconds",
+	"Duration of one multi-device ETL run.",
+	buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+SYNC_DEVICES = Counter(
+	"sync_devices_total",
+	"Devices synced, by outcome.",
+	["result"]
+)
+SYNC_DEAD_LETTERED = Counter(
+	"sync_dead_lettered_total",
+	"Sync requests moved to the dead-letter queue instead of being retried, by reason.",
+	["reason"]
+)
+SYNC_WINDOWS_REPLAYED = Counter(
+	"sync_windows_replayed_total",
+	"Fetched LG API windows loaded from the spool after an interrupted run instead of being fetched again."
+)
+DEVICE_SYNC_LAG_DAYS = Gauge(
+	"device_sync_lag_days",
+	"Days between today and the last synced date of a device.",
+	["device_id"]
+)
+SYNC_ENQUEUED = Counter(
+	"sync_enqueued_total",
+	"Sync requests published or coalesced by the coordinator.",
+	["result"]
+)
+ENERGY_ANOMALIES = Counter(
+	"energy_anomalies_total",
+	"Outlier days flagged on ingest, by kind (spike or drop).",
+	["kind"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+	"http_request_seconds",
+	"Coordinator request latency.",
+	["method", "route", "status"]
+)
+
+@contextmanager
+def timed(histogram, **labels):
+	"""Observe the duration of the block on `histogram`."""
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		(histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+def observe_insert(table: str, started: float, inserted: int):
+	DB_INSERT_SECONDS.labels(table=table).observe(time.perf_counter() - started)
+	DB_INSERTED_ROWS.labels(table=table).inc(inserted)
+
+def observe_queue_wait(properties):
+	"""Record how long a delivery waited, using the publisher's enqueue timestamp header."""
+	headers = (properties.headers if properties else None) or {}
+	enqueued_at = headers.get(ENQUEUED_AT_HEADER)
+	if enqueued_at is None:
+		return
+	attempt = "retry" if headers.get(RETRY_COUNT_HEADER) else "first"
+	QUEUE_WAIT_SECONDS.labels(attempt=attempt).observe(max(0.0, time.time() - float(enqueued_at)))
+
+def set_sync_lag(end_dates, today: date = None):
+	"""Update the lag gauge from {device_id: last synced date}."""
+	today = today or date.today()
+	for device_id, end_date in end_dates.items():
+		DEVICE_SYNC_LAG_DAYS.labels(device_id=device_id).set((today - end_date).days)
+
+class DeviceCatalogCollector:
+	"""Expose a `DeviceCatalog`'s hit/miss/refresh counts as `device_catalog_*_total` counters."""
+	def __init__(self, catalog):
+		self.catalog = catalog
+
+	def collect(self):
+		for name, value in dict(self.catalog.stats).items():
+			yield CounterMetricFamily(f"device_catalog_{name}", f"Device catalog {name.replace('_', ' ')}.", value=value)
+
+_device_catalog_collector = None
+
+def register_device_catalog(catalog):
+	"""Expose `catalog` in the default registry, replacing a previously registered catalog."""
+	global _device_catalog_collector
+	if _device_catalog_collector is not None:
+		REGISTRY.unregister(_device_catalog_collector)
+	_device_catalog_collector = DeviceCatalogCollector(catalog)
+	REGISTRY.register(_device_catalog_collector)
+
+def start_metrics_server(port: int):
+	"""Serve the default registry on `port` from a daemon thread; 0 disables it."""
+	if port:
+		start_http_server(port)
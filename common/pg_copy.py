@@ -0,0 +1,78 @@
+import csv
+import io
+from typing import Iterable, Sequence
+from psycopg2.extras import execute_values
+
+class IterableCsvStream:
+	"""
+	Read-only file-like object rendering an iterable of tuples as CSV on demand.
+	Lets `COPY ... FROM STDIN` stream rows without materializing them as a list.
+	"""
+	def __init__(self, rows: Iterable[tuple]):
+		self._rows = iter(rows)
+		self._buffer = io.StringIO()
+		self._writer = csv.writer(self._buffer, lineterminator="\n")
+		self._exhausted = False
+
+	def read(self, size: int = -1) -> str:
+		while not self._exhausted and (size < 0 or self._buffer.tell() < size):
+			row = next(self._rows, None)
+			if row is None:
+				self._exhausted = True
+			else:
+				self._writer.writerow(row)
+		data = self._buffer.getvalue()
+		rest = ""
+		if 0 <= size < len(data):
+			data, rest = data[:size], data[size:]
+		self._buffer.seek(0)
+		self._buffer.truncate()
+		self._buffer.write(rest)
+		return data
+
+	readline = read
+
+class TextChunkStream:
+	"""Read-only file-like object over an iterable of pre-rendered text chunks."""
+	def __init__(self, chunks: Iterable[str]):
+		self._chunks = iter(chunks)
+		self._pending = ""
+
+	def read(self, size: int = -1) -> str:
+		parts = [self._pending]
+		length = len(self._pending)
+		while size < 0 or length < size:
+			chunk = next(self._chunks, None)
+			if chunk is None:
+				break
+			parts.append(chunk)
+			length += len(chunk)
+		data = "".join(parts)
+		self._pending = ""
+		if 0 <= size < len(data):
+			data, self._pending = data[:size], data[size:]
+		return data
+
+	readline = read
+
+def _create_staging(cur, stage_table: str, column_defs: str):
+	cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage_table} ({column_defs});")
+	cur.execute(f"TRUNCATE {stage_table};")
+
+def load_staging(cur, stage_table: str, column_defs: str, columns: Sequence[str], rows: Iterable[tuple],
+		use_copy: bool = True, page_size: int = 1000):
+	"""
+	Fill a session-local temp staging table with `rows`, replacing its previous content.
+	Rows are streamed with COPY FROM STDIN, or with paged `execute_values` when `use_copy` is False.
+	"""
+	_create_staging(cur, stage_table, column_defs)
+	column_list = ", ".join(columns)
+	if use_copy:
+		cur.copy_expert(f"COPY {stage_table} ({column_list}) FROM STDIN WITH (FORMAT csv)", IterableCsvStream(rows))
+	else:
+		execute_values(cur, f"INSERT INTO {stage_table} ({column_list}) VALUES %s", rows, page_size=page_size)
+
+def load_staging_csv(cur, stage_table: str, column_defs: str, columns: Sequence[str], chunks: Iterable[str]):
+	"""Like `load_staging`, for rows already rendered as CSV text chunks."""
+	_create_staging(cur, stage_table, column_defs)
+	cur.copy_expert(f"COPY {stage_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", TextChunkStream(chunks))
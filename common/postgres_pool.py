@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
+
+class PostgresPool:
+	"""
+	Thread-safe PostgreSQL connection pool.
+	`connection()` behaves like `PostgresConn`: it commits on success and rolls back on error,
+	but returns the connection to the pool instead of closing it. Callers block while all
+	`max_size` connections are checked out. Connections idle for longer than
+	`health_check_interval` seconds are pinged before being handed out.
+	"""
+	def __init__(self, conn_string: str, min_size: int = 1, max_size: int = 10,
+			statement_timeout_ms: int = 0, health_check_interval: float = 30.0, checkout_timeout: float = 30.0):
+		kwargs = {}
+		if statement_timeout_ms:
+			kwargs["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+		self._pool = pool.ThreadedConnectionPool(min_size, max_size, conn_string, **kwargs)
+		self._slots = threading.BoundedSemaphore(max_size)
+		self._last_used = {}
+		self.health_check_interval = health_check_interval
+		self.checkout_timeout = checkout_timeout
+
+	@classmethod
+	def from_config(cls, config):
+		"""Build a pool from a `PostgresConfig`."""
+		return cls(
+			config.conn_string,
+			min_size=config.POSTGRES_POOL_MIN,
+			max_size=config.POSTGRES_POOL_MAX,
+			statement_timeout_ms=config.POSTGRES_STATEMENT_TIMEOUT_MS
+		)
+
+	def _is_healthy(self, conn) -> bool:
+		if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+			return False
+		if time.monotonic() - self._last_used.get(id(conn), 0.0) < self.health_check_interval:
+			return True
+		try:
+			with conn.cursor() as cur:
+				cur.execute("SELECT 1;")
+			conn.rollback()
+			return True
+		except Exception:
+			return False
+
+	def getconn(self):
+		"""Check out a healthy connection; pair every call with `putconn`."""
+		if not self._slots.acquire(timeout=self.checkout_timeout):
+			raise pool.PoolError("Timed out waiting for a PostgreSQL connection")
+		try:
+			while True:
+				conn = self._pool.getconn()
+				if self._is_healthy(conn):
+					return conn
+				self._discard(conn)
+		except BaseException:
+			self._slots.release()
+			raise
+
+	def putconn(self, conn, close: bool = False):
+		try:
+			if not close and not conn.closed:
+				try:
+					conn.rollback()
+					conn.autocommit = False
+				except Exception:
+					close = True
+			if close or conn.closed:
+				self._discard(conn)
+			else:
+				self._last_used[id(conn)] = time.monotonic()
+				self._pool.putconn(conn)
+		finally:
+			self._slots.release()
+
+	def _discard(self, conn):
+		self._last_used.pop(id(conn), None)
+		self._pool.putconn(conn, close=True)
+
+	@contextmanager
+	def connection(self):
+		conn = self.getconn()
+		broken = False
+		try:
+			yield conn
+			conn.commit()
+		except BaseException:
+			try:
+				conn.rollback()
+			except Exception:
+				broken = True
+			raise
+		finally:
+			self.putconn(conn, close=broken)
+
+	def close(self):
+		self._pool.closeall()
@@ -0,0 +1,33 @@
+import threading
+import time
+
+class TokenBucket:
+	"""
+	Thread-safe token bucket rate limiter.
+	Tokens are refilled continuously at `rate` per second, up to `capacity`.
+	"""
+	def __init__(self, rate: float, capacity: int):
+		if rate <= 0:
+			raise ValueError("rate must be a positive number")
+		if capacity < 1:
+			raise ValueError("capacity must be at least 1")
+		self.rate = rate
+		self.capacity = capacity
+		self._tokens = float(capacity)
+		self._updated_at = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self, tokens: int = 1):
+		"""Block until `tokens` are available and consume them."""
+		if tokens > self.capacity:
+			raise ValueError("tokens must not exceed the bucket capacity")
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+				self._updated_at = now
+				if self._tokens >= tokens:
+					self._tokens -= tokens
+					return
+				wait = (tokens - self._tokens) / self.rate
+			time.sleep(wait)
@@ -0,0 +1,75 @@
+from typing import Iterable, List
+
+class SyncLeaseDAL:
+	"""
+	Data Access Layer for the energy_sync_leases table.
+	A lease marks a device as being synced by `owner` until `expires_at`. Claims are plain
+	rows, so one connection can hold any number of them between short transactions;
+	expired leases are taken over by the next claimer.
+	"""
+	def __init__(self, conn, owner: str, ttl_seconds: float = 120):
+		self.conn = conn
+		self.owner = owner
+		self.ttl_seconds = ttl_seconds
+
+	def claim(self, device_ids: Iterable[str]) -> List[str]:
+		"""
+		Lease the given devices to this owner and return the ones claimed. Expired leases
+		are stolen; leases another transaction is stealing right now are skipped rather
+		than waited for.
+		"""
+		device_ids = list(dict.fromkeys(device_ids))
+		steal_sql = """
+			UPDATE energy_sync_leases l
+			SET owner = %(owner)s, acquired_at = NOW(), expires_at = NOW() + %(ttl)s * INTERVAL '1 second'
+			FROM (
+				SELECT device_id FROM energy_sync_leases
+				WHERE device_id = ANY(%(ids)s) AND expires_at < NOW()
+				ORDER BY device_id
+				FOR UPDATE SKIP LOCKED
+			) expired
+			WHERE l.device_id = expired.device_id
+			RETURNING l.device_id;
+		"""
+		insert_sql = """
+			INSERT INTO energy_sync_leases (device_id, owner, expires_at)
+			SELECT unnest(%(ids)s::varchar[]), %(owner)s, NOW() + %(ttl)s * INTERVAL '1 second'
+			ON CONFLICT (device_id) DO NOTHING
+			RETURNING device_id;
+		"""
+		params = {"ids": device_ids, "owner": self.owner, "ttl": self.ttl_seconds}
+		with self.conn.cursor() as cur:
+			cur.execute(steal_sql, params)
+			claimed = {row[0] for row in cur.fetchall()}
+			cur.execute(insert_sql, params)
+			claimed.update(row[0] for row in cur.fetchall())
+		return [device_id for device_id in device_ids if device_id in claimed]
+
+	def renew(self, device_ids: Iterable[str]) -> List[str]:
+		"""Extend this owner's leases; devices missing from the result were lost to another worker."""
+		sql = """
+			UPDATE energy_sync_leases
+			SET expires_at = NOW() + %s * INTERVAL '1 second'
+			WHERE device_id = ANY(%s) AND owner = %s
+			RETURNING device_id;
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (self.ttl_seconds, list(device_ids), self.owner))
+			return [row[0] for row in cur.fetchall()]
+
+	def release(self, device_ids: Iterable[str]):
+		sql = "DELETE FROM energy_sync_leases WHERE device_id = ANY(%s) AND owner = %s;"
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), self.owner))
+
+	def active(self) -> List[tuple]:
+		"""Unexpired leases as (device_id, owner, acquired_at, expires_at) tuples."""
+		sql = """
+			SELECT device_id, owner, acquired_at, expires_at
+			FROM energy_sync_leases
+			WHERE expires_at >= NOW()
+			ORDER BY acquired_at;
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql)
+			return cur.fetchall()
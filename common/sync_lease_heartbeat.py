@@ -0,0 +1,61 @@
+import logging
+import threading
+from typing import Iterable
+from common.sync_lease_dal import SyncLeaseDAL
+
+logger = logging.getLogger(__name__)
+
+class SyncLeaseHeartbeat:
+	"""
+	Renews the leases a worker holds every `interval_seconds` from a daemon thread, on a
+	short pooled checkout per beat. Leases found to be lost (expired and taken over by
+	another worker) are dropped and logged; the sync keeps running, as its writes are
+	idempotent.
+	"""
+	def __init__(self, pool, owner: str, ttl_seconds: float = 120, interval_seconds: float = 40):
+		self.pool = pool
+		self.owner = owner
+		self.ttl_seconds = ttl_seconds
+		self.interval_seconds = interval_seconds
+		self._held = set()
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread = None
+
+	def dal(self, conn) -> SyncLeaseDAL:
+		return SyncLeaseDAL(conn, self.owner, self.ttl_seconds)
+
+	def add(self, device_ids: Iterable[str]):
+		with self._lock:
+			self._held.update(device_ids)
+
+	def discard(self, device_ids: Iterable[str]):
+		with self._lock:
+			self._held.difference_update(device_ids)
+
+	def beat(self):
+		with self._lock:
+			held = list(self._held)
+		if not held:
+			return
+		with self.pool.connection() as conn:
+			renewed = set(self.dal(conn).renew(held))
+		lost = [device_id for device_id in held if device_id not in renewed]
+		if lost:
+			logger.warning("Sync leases lost to another worker: %s", ", ".join(lost))
+			self.discard(lost)
+
+	def _loop(self):
+		while not self._stop.wait(self.interval_seconds):
+			try:
+				self.beat()
+			except Exception:
+				logger.exception("Sync lease heartbeat failed")
+
+	def start(self):
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._loop, name="sync-lease-heartbeat", daemon=True)
+			self._thread.start()
+
+	def stop(self):
+		self._stop.set()
@@ -0,0 +1,38 @@
+from typing import Iterable, List
+
+class SyncPendingDAL:
+	"""
+	Data Access Layer for the energy_sync_pending table.
+	A row means a sync message for the device is already queued, so further
+	requests for it can be coalesced instead of published again.
+	"""
+	def __init__(self, conn, stale_after_seconds: int = 3600):
+		self.conn = conn
+		self.stale_after_seconds = stale_after_seconds
+
+	def mark_pending(self, device_ids: Iterable[str]) -> List[str]:
+		"""
+		Mark devices as pending and return the ones that were not pending yet.
+		Marks older than `stale_after_seconds` are taken over, so a message lost
+		between the commit and the broker cannot block a device forever.
+		"""
+		sql = """
+			INSERT INTO energy_sync_pending (device_id)
+			SELECT DISTINCT unnest(%s::varchar[])
+			ON CONFLICT (device_id) DO UPDATE SET enqueued_at = NOW()
+			WHERE energy_sync_pending.enqueued_at < NOW() - %s * INTERVAL '1 second'
+			RETURNING device_id;
+		"""
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids), self.stale_after_seconds))
+			return [row[0] for row in cur.fetchall()]
+
+	def clear(self, device_id: str):
+		sql = "DELETE FROM energy_sync_pending WHERE device_id = %s;"
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (device_id,))
+
+	def clear_many(self, device_ids: Iterable[str]):
+		sql = "DELETE FROM energy_sync_pending WHERE device_id = ANY(%s);"
+		with self.conn.cursor() as cur:
+			cur.execute(sql, (list(device_ids),))
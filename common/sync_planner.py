@@ -0,0 +1,69 @@
+import logging
+import threading
+from datetime import date, timedelta
+from typing import Callable, List
+from common.energy_consumption_dal import EnergyConsumptionDAL
+
+logger = logging.getLogger(__name__)
+
+class SyncPlanner:
+	"""
+	Periodically enqueues syncs for registered devices whose read log is behind yesterday.
+	Devices furthest behind go first, and batches are spread evenly over `spread_seconds`
+	so a pass does not burst the LG API. `enqueue(conn, device_ids)` publishes a batch
+	and returns the IDs actually published.
+	"""
+	def __init__(self, pool, enqueue: Callable[..., List[str]], interval_seconds: float = 3600,
+			spread_seconds: float = 600, batch_size: int = 10):
+		self.pool = pool
+		self.enqueue = enqueue
+		self.interval_seconds = interval_seconds
+		self.spread_seconds = spread_seconds
+		self.batch_size = batch_size
+		self._stop = threading.Event()
+		self._wake = threading.Event()
+		self._thread = None
+
+	def lagging_devices(self) -> List[str]:
+		with self.pool.connection() as conn:
+			lagging = EnergyConsumptionDAL(conn).lagging_devices(date.today() - timedelta(days=1))
+		return [device_id for device_id, _ in lagging]
+
+	def run_once(self) -> int:
+		"""Plan and enqueue one pass; returns the number of devices published."""
+		device_ids = self.lagging_devices()
+		batches = [device_ids[i:i + self.batch_size] for i in range(0, len(device_ids), self.batch_size)]
+		delay = self.spread_seconds / len(batches) if batches else 0
+		published = 0
+		for i, batch in enumerate(batches):
+			if i and self._stop.wait(delay):
+				break
+			with self.pool.connection() as conn:
+				published += len(self.enqueue(conn, batch))
+		logger.info("Sync planner: %d devices behind, %d enqueued", len(device_ids), published)
+		return published
+
+	def _loop(self):
+		while not self._stop.is_set():
+			self._wake.wait(self.interval_seconds if self.interval_seconds > 0 else None)
+			self._wake.clear()
+			if self._stop.is_set():
+				break
+			try:
+				self.run_once()
+			except Exception:
+				logger.exception("Sync planner pass failed")
+
+	def start(self):
+		"""Run passes every `interval_seconds` (or only when triggered if it is 0) in a daemon thread."""
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._loop, name="sync-planner", daemon=True)
+			self._thread.start()
+
+	def trigger(self):
+		"""Start a pass now instead of waiting for the next interval."""
+		self._wake.set()
+
+	def stop(self):
+		self._stop.set()
+		self._wake.set()
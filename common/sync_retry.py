@@ -0,0 +1,60 @@
+from typing import Sequence
+import pika
+
+RETRY_COUNT_HEADER = "x-retry-count"
+# Why a message was dead-lettered instead of retried
+DEAD_LETTER_REASON_HEADER = "x-dead-letter-reason"
+# Epoch seconds at first publish; kept across retries so queue wait covers the whole journey
+ENQUEUED_AT_HEADER = "x-enqueued-at"
+
+def retry_queue_name(queue: str, delay_seconds: int) -> str:
+	return f"{queue}.retry.{delay_seconds}s"
+
+def dead_letter_queue_name(queue: str) -> str:
+	return f"{queue}.dead"
+
+def retry_count(properties) -> int:
+	"""How many times the message has already been sent to a delay queue."""
+	headers = (properties.headers if properties else None) or {}
+	return int(headers.get(RETRY_COUNT_HEADER, 0))
+
+def declare_retry_queues(channel, queue: str, delays: Sequence[int]):
+	"""
+	Declare one delay queue per backoff step. Messages wait there for the step's TTL
+	and are then dead-lettered back onto `queue`. A queue per delay avoids the
+	head-of-line blocking of per-message expirations. Messages that are not retried
+	any more are parked on the dead-letter queue for inspection.
+	"""
+	channel.queue_declare(queue=dead_letter_queue_name(queue))
+	for delay in delays:
+		channel.queue_declare(
+			queue=retry_queue_name(queue, delay),
+			arguments={
+				"x-message-ttl": int(delay * 1000),
+				"x-dead-letter-exchange": "",
+				"x-dead-letter-routing-key": queue,
+			}
+		)
+
+def publish_retry(channel, queue: str, delays: Sequence[int], body: bytes, properties=None) -> int:
+	"""Republish `body` onto the delay queue for its next attempt and return the delay used."""
+	headers = (properties.headers if properties else None) or {}
+	attempt = retry_count(properties)
+	delay = delays[min(attempt, len(delays) - 1)]
+	channel.basic_publish(
+		exchange='',
+		routing_key=retry_queue_name(queue, delay),
+		body=body,
+		properties=pika.BasicProperties(delivery_mode=2, headers={**headers, RETRY_COUNT_HEADER: attempt + 1})
+	)
+	return delay
+
+def publish_dead_letter(channel, queue: str, body: bytes, reason: str, properties=None):
+	"""Park `body` on the dead-letter queue, keeping its headers and recording `reason`."""
+	headers = (properties.headers if properties else None) or {}
+	channel.basic_publish(
+		exchange='',
+		routing_key=dead_letter_queue_name(queue),
+		body=body,
+		properties=pika.BasicProperties(delivery_mode=2, headers={**headers, DEAD_LETTER_REASON_HEADER: reason})
+	)
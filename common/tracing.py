@@ -0,0 +1,210 @@
+"""
+Opt-in span tracing for ETL syncs. A `Tracer` opens one root span per sync and writes the
+finished span tree as a JSON line; code along the way adds child spans with `span()` and
+`record_span()`, which are no-ops costing one context variable lookup when no trace is
+active. Work handed to other threads keeps its parent span when wrapped with `bind()`.
+A sampled fraction of syncs also runs under cProfile, and the profiles of the slowest
+`profile_top` of them are kept as `.prof` files (readable with `pstats` or snakeviz).
+"""
+import cProfile
+import functools
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar, copy_context
+
+logger = logging.getLogger(__name__)
+
+_current_span = ContextVar("current_span", default=None)
+# Since Python 3.12 cProfile hooks into the process-wide sys.monitoring, so only one
+# profile can be active at a time; batches sampled while another is running go unprofiled.
+_profiling = threading.Lock()
+
+class Span:
+	"""A timed operation with attributes (e.g. row counts) and child spans."""
+	__slots__ = ("name", "attrs", "started", "duration_ms", "children")
+
+	def __init__(self, name: str, attrs: dict, started: float = None):
+		self.name = name
+		self.attrs = attrs
+		self.started = time.perf_counter() if started is None else started
+		self.duration_ms = None
+		self.children = []
+
+	def set(self, **attrs):
+		self.attrs.update(attrs)
+
+	def finish(self):
+		self.duration_ms = round((time.perf_counter() - self.started) * 1000, 3)
+
+	def to_dict(self) -> dict:
+		span = {"name": self.name, "duration_ms": self.duration_ms, **self.attrs}
+		if self.children:
+			span["children"] = [child.to_dict() for child in self.children]
+		return span
+
+class _NullSpan:
+	"""Stand-in returned while no trace is active."""
+	__slots__ = ()
+
+	def set(self, **attrs):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return False
+
+NULL_SPAN = _NullSpan()
+
+class _SpanContext:
+	__slots__ = ("span", "token")
+
+	def __init__(self, parent: Span, name: str, attrs: dict):
+		self.span = Span(name, attrs)
+		# list.append is atomic, so spans from fetch threads can attach concurrently
+		parent.children.append(self.span)
+
+	def __enter__(self) -> Span:
+		self.token = _current_span.set(self.span)
+		return self.span
+
+	def __exit__(self, exc_type, exc, tb):
+		self.span.finish()
+		if exc_type is not None:
+			self.span.attrs["error"] = exc_type.__name__
+		_current_span.reset(self.token)
+		return False
+
+def span(name: str, **attrs):
+	"""Context manager timing a child of the current span; a no-op when not tracing."""
+	parent = _current_span.get()
+	if parent is None:
+		return NULL_SPAN
+	return _SpanContext(parent, name, attrs)
+
+def record_span(name: str, started: float, **attrs):
+	"""Add an already finished child span that began at `started` (a `time.perf_counter()` value)."""
+	parent = _current_span.get()
+	if parent is None:
+		return
+	child = Span(name, attrs, started)
+	child.finish()
+	parent.children.append(child)
+
+def bind(fn):
+	"""`fn` running under the current span, for executors; `fn` itself when not tracing."""
+	if _current_span.get() is None:
+		return fn
+	return functools.partial(copy_context().run, fn)
+
+class Tracer:
+	"""
+	Writes one JSON line per traced sync to `path`. With `profile_dir`, a `profile_rate`
+	fraction of syncs is profiled and the `profile_top` slowest profiles are kept there.
+	"""
+	def __init__(self, path: str, profile_dir: str = "", profile_rate: float = 0.0, profile_top: int = 5):
+		self.path = path
+		self.profile_dir = profile_dir
+		self.profile_rate = profile_rate if profile_dir and profile_top > 0 else 0.0
+		self.profile_top = profile_top
+		self._lock = threading.Lock()
+		# Min-heap of (duration_ms, profile path) for the slowest profiled syncs
+		self._slowest = []
+		if profile_dir:
+			os.makedirs(profile_dir, exist_ok=True)
+
+	@classmethod
+	def from_config(cls, config):
+		"""Build a tracer from an `EtlConfig`; None when ETL_TRACE_FILE is unset."""
+		if not config.ETL_TRACE_FILE:
+			return None
+		return cls(
+			config.ETL_TRACE_FILE,
+			profile_dir=config.ETL_TRACE_PROFILE_DIR,
+			profile_rate=config.ETL_TRACE_PROFILE_RATE,
+			profile_top=config.ETL_TRACE_PROFILE_TOP
+		)
+
+	def trace(self, name: str, **attrs):
+		"""Context manager opening a root span (a new trace); the tree is written when it exits."""
+		return _TraceContext(self, Span(name, {"trace_id": uuid.uuid4().hex, **attrs}))
+
+	def _write(self, root: Span):
+		line = json.dumps({"ts": time.time(), **root.to_dict()}, default=str)
+		try:
+			with self._lock:
+				with open(self.path, "a") as f:
+					f.write(line + "\n")
+		except OSError:
+			logger.exception("Could not write trace %s", root.attrs.get("trace_id"))
+
+	def _keep_profile(self, root: Span, profiler: cProfile.Profile):
+		"""Save the profile if it is among the `profile_top` slowest, dropping the one it displaces."""
+		path = os.path.join(self.profile_dir, f"{root.attrs['trace_id']}.prof")
+		with self._lock:
+			if len(self._slowest) >= self.profile_top and root.duration_ms <= self._slowest[0][0]:
+				return
+			profiler.dump_stats(path)
+			root.attrs["profile"] = path
+			if len(self._slowest) < self.profile_top:
+				heapq.heappush(self._slowest, (root.duration_ms, path))
+			else:
+				_, evicted = heapq.heapreplace(self._slowest, (root.duration_ms, path))
+				os.remove(evicted)
+
+class _TraceContext:
+	__slots__ = ("tracer", "span", "token", "profiler")
+
+	def __init__(self, tracer: Tracer, root: Span):
+		self.tracer = tracer
+		self.span = root
+		self.profiler = None
+
+	def __enter__(self) -> Span:
+		if self.tracer.profile_rate and random.random() < self.tracer.profile_rate:
+			self.profiler = _start_profiler()
+		self.token = _current_span.set(self.span)
+		self.span.started = time.perf_counter()
+		return self.span
+
+	def __exit__(self, exc_type, exc, tb):
+		if self.profiler:
+			try:
+				self.profiler.disable()
+			finally:
+				_profiling.release()
+		self.span.finish()
+		if exc_type is not None:
+			self.span.attrs["error"] = exc_type.__name__
+		_current_span.reset(self.token)
+		if self.profiler:
+			try:
+				self.tracer._keep_profile(self.span, self.profiler)
+			except OSError:
+				logger.exception("Could not save profile of trace %s", self.span.attrs["trace_id"])
+		self.tracer._write(self.span)
+		return False
+
+def _start_profiler():
+	"""
+	An enabled profiler, or None when another profile is running or cProfile refuses to start.
+	On Python 3.12+ the profile records every thread while it is enabled (fetch threads
+	and concurrent batches included); before 3.12 only the calling thread.
+	"""
+	if not _profiling.acquire(blocking=False):
+		return None
+	profiler = cProfile.Profile()
+	try:
+		profiler.enable()
+	except Exception:
+		_profiling.release()
+		logger.warning("Profiling skipped: cProfile could not be enabled", exc_info=True)
+		return None
+	return profiler
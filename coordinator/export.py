@@ -0,0 +1,50 @@
+"""
+Export daily energy consumption straight from Postgres to a Parquet or Arrow IPC file,
+sharing the closed-month cache with the coordinator's `/energy/export` endpoint:
+
+    python -m coordinator.export --start 2025-01-01 --end 2025-06-30 --device <id> --output energy.parquet
+
+The coordinator image copies this directory to /app, so there the module is `export`:
+
+    docker compose exec coordinator python -m export --start 2025-01-01 --end 2025-06-30 --output /tmp/energy.parquet
+"""
+import argparse
+import sys
+from datetime import date
+from common.config import CoordinatorConfig, PostgresConfig
+from common.energy_export import EXPORT_MEDIA_TYPES, EnergyExportCache, EnergyExporter
+from common.postgres_pool import PostgresPool
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--device", action="append", help="Device ID to export (repeatable); every device when omitted.")
+    parser.add_argument("--format", choices=sorted(EXPORT_MEDIA_TYPES), default="parquet")
+    parser.add_argument("--output", help="Output file; stdout when omitted.")
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--end must not be before --start")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    coordinator_config = CoordinatorConfig()
+    pool = PostgresPool.from_config(PostgresConfig())
+    exporter = EnergyExporter(
+        pool,
+        cache=EnergyExportCache(coordinator_config.EXPORT_CACHE_DIR) if coordinator_config.EXPORT_CACHE_DIR else None,
+        batch_rows=coordinator_config.EXPORT_BATCH_ROWS
+    )
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in exporter.stream(args.start, args.end, args.device, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,304 @@
-from fastapi import FastAPI
+import time
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from prometheus_client import make_asgi_app
 from pydantic import BaseModel
-from typing import List
-from common.config import LgApiConfig, PostgresConfig, RabbitMQConfig
+from dataclasses import asdict
+from datetime import date, timedelta
+from typing import List, Literal, Optional
+from common.config import CoordinatorConfig, LgApiConfig, PostgresConfig, RabbitMQConfig, SyncConfig
+from common.device_catalog import DeviceCatalog
 from common.device_dal import DeviceDAL
-from common.lg_api_client import LGApiClient
-from common.postgres_connection import PostgresConn
-import pika
+from common.energy_anomaly_dal import EnergyAnomalyDAL
+from common.energy_consumption_dal import EnergyConsumptionDAL
+from common.lazy import is_built, lazy
+from common.lg_api_client import AsyncLGApiClient
+from common.metrics import HTTP_REQUEST_SECONDS, SYNC_ENQUEUED, register_device_catalog
+from common.postgres_pool import PostgresPool
+from common.rabbitmq_publisher import RabbitMQPublisher
+from common.sync_lease_dal import SyncLeaseDAL
+from common.sync_pending_dal import SyncPendingDAL
+from common.sync_planner import SyncPlanner
 
 app = FastAPI()
+app.mount("/metrics", make_asgi_app())
 
-rabbitmq_config = RabbitMQConfig()
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep device IDs out of the series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
 
-postgres_config = PostgresConfig()
-postgres_conn_string = f"postgresql://{postgres_config.POSTGRES_USER}:{postgres_config.POSTGRES_PASSWORD}@{postgres_config.POSTGRES_HOST}:5432/{postgres_config.POSTGRES_DB}"
+class CoordinatorServices:
+    """
+    Settings and clients used by the coordinator, each built on first use so importing
+    the app neither connects anywhere nor needs every secret. Any of them can be injected
+    by keyword (e.g. `CoordinatorServices(lg_api_client=stub_client)`).
+    """
+    def __init__(self, **overrides):
+        self.__dict__.update(overrides)
 
-lg_api_config = LgApiConfig()
-lg_api_client = LGApiClient(
-    lg_api_config.LG_COUNTRY,
-    lg_api_config.LG_API_KEY,
-    lg_api_config.LG_CLIENT_ID,
-    lg_api_config.LG_API_TOKEN
-)
+    @lazy
+    def rabbitmq_config(self):
+        return RabbitMQConfig()
+
+    @lazy
+    def sync_config(self):
+        return SyncConfig()
+
+    @lazy
+    def coordinator_config(self):
+        return CoordinatorConfig()
+
+    @lazy
+    def postgres_pool(self):
+        return PostgresPool.from_config(PostgresConfig())
+
+    @lazy
+    def publisher(self):
+        return RabbitMQPublisher.from_config(self.rabbitmq_config)
+
+    @lazy
+    def lg_api_client(self):
+        return AsyncLGApiClient.from_config(LgApiConfig())
+
+    @lazy
+    def device_catalog(self):
+        device_catalog = DeviceCatalog(
+            self.lg_api_client.get_devices,
+            ttl=self.coordinator_config.DEVICE_CATALOG_TTL_SECONDS,
+            stale_ttl=self.coordinator_config.DEVICE_CATALOG_STALE_SECONDS
+        )
+        register_device_catalog(device_catalog)
+        return device_catalog
+
+    @lazy
+    def sync_planner(self):
+        return SyncPlanner(
+            self.postgres_pool,
+            enqueue_sync,
+            interval_seconds=self.sync_config.SYNC_PLANNER_INTERVAL_SECONDS,
+            spread_seconds=self.sync_config.SYNC_PLANNER_SPREAD_SECONDS,
+            batch_size=self.sync_config.SYNC_PLANNER_BATCH_SIZE
+        )
+
+    @lazy
+    def energy_exporter(self):
+        # pyarrow is only imported once an export is requested
+        from common.energy_export import EnergyExportCache, EnergyExporter
+        coordinator_config = self.coordinator_config
+        return EnergyExporter(
+            self.postgres_pool,
+            cache=EnergyExportCache(coordinator_config.EXPORT_CACHE_DIR) if coordinator_config.EXPORT_CACHE_DIR else None,
+            batch_rows=coordinator_config.EXPORT_BATCH_ROWS
+        )
+
+    def close(self):
+        """Stop and release whatever was built, except the async LG client (see `aclose`)."""
+        if is_built(self, "sync_planner"):
+            self.sync_planner.stop()
+        if is_built(self, "publisher"):
+            self.publisher.close()
+        if is_built(self, "postgres_pool"):
+            self.postgres_pool.close()
+
+    async def aclose(self):
+        """`close`, plus the async LG client, which has to be closed on the event loop."""
+        if is_built(self, "lg_api_client"):
+            await self.lg_api_client.aclose()
+        self.close()
+
+services = CoordinatorServices()
+
+def configure(new_services: CoordinatorServices):
+    """Replace the services behind the app, e.g. before serving it in-process."""
+    global services
+    services = new_services
+
+def get_conn():
+    """FastAPI dependency yielding a pooled connection, committed when the request succeeds."""
+    with services.postgres_pool.connection() as conn:
+        yield conn
+
+@app.on_event("startup")
+def start_sync_planner():
+    services.sync_planner.start()
+
+@app.on_event("shutdown")
+async def close_connections():
+    await services.aclose()
+
+def _matches(device, q: str) -> bool:
+    q = q.lower()
+    return any(q in (value or "").lower() for value in (device.alias, device.device_type, device.model_name, device.id))
 
 @app.get("/devices")
-def list_devices():
-    with PostgresConn(postgres_conn_string) as conn:
-        device_dal = DeviceDAL(conn)
-        registered_devices = {d.id for d in device_dal.list()}
-        all_devices = lg_api_client.get_devices()  # Returns List[Device]
-        unregistered_devices = [d for d in all_devices if d.id not in registered_devices]
-        return {
-            "registered": [d.__dict__ for d in all_devices if d.id in registered_devices],
-            "unregistered": [d.__dict__ for d in unregistered_devices]
-        }
+async def list_devices(q: Optional[str] = None, offset: int = 0, limit: Optional[int] = None, conn=Depends(get_conn)):
+    """
+    Registered and unregistered devices, optionally filtered by a case-insensitive
+    substring `q` and paged with `offset`/`limit` (applied to each list).
+    The LG device list comes from the event loop; database calls run in the threadpool.
+    """
+    device_dal = DeviceDAL(conn)
+    registered_devices = set(await run_in_threadpool(device_dal.list_ids))
+    all_devices = await services.device_catalog.get()  # Returns List[Device]
+    if q:
+        all_devices = [d for d in all_devices if _matches(d, q)]
+    registered = [d for d in all_devices if d.id in registered_devices]
+    unregistered_devices = [d for d in all_devices if d.id not in registered_devices]
+    end = offset + limit if limit is not None else None
+    return {
+        "registered": [asdict(d) for d in registered[offset:end]],
+        "unregistered": [asdict(d) for d in unregistered_devices[offset:end]],
+        "registered_total": len(registered),
+        "unregistered_total": len(unregistered_devices)
+    }
+
+@app.get("/devices/catalog/stats")
+def device_catalog_stats():
+    return dict(services.device_catalog.stats)
 
 class DeviceRegisterRequest(BaseModel):
     device_ids: List[str]
 
 @app.post("/devices/register")
-def register_devices(request: DeviceRegisterRequest):
-    with PostgresConn(postgres_conn_string) as conn:
-        device_dal = DeviceDAL(conn)
-        all_devices = {d.id: d for d in lg_api_client.get_devices()}
-        to_register = []
-        not_found = []
-        for device_id in request.device_ids:
-            device = all_devices.get(device_id)
-            if device:
-                to_register.append(device)
-            else:
-                not_found.append(device_id)
-        if to_register:
-            device_dal.bulk_insert(to_register)
-        return {
-            "registered": [d.id for d in to_register],
-            "not_found": not_found
-        }
+async def register_devices(request: DeviceRegisterRequest, conn=Depends(get_conn)):
+    device_dal = DeviceDAL(conn)
+    all_devices = {d.id: d for d in await services.device_catalog.get()}
+    if any(device_id not in all_devices for device_id in request.device_ids):
+        # The device may have been added to the LG account after the catalog was cached
+        services.device_catalog.invalidate()
+        all_devices = {d.id: d for d in await services.device_catalog.get()}
+    to_register = []
+    not_found = []
+    for device_id in request.device_ids:
+        device = all_devices.get(device_id)
+        if device:
+            to_register.append(device)
+        else:
+            not_found.append(device_id)
+    if to_register:
+        await run_in_threadpool(device_dal.bulk_insert, to_register)
+    return {
+        "registered": [d.id for d in to_register],
+        "not_found": not_found
+    }
     
 class DeviceSyncRequest(BaseModel):
     device_id: str
 
+def enqueue_sync(conn, device_ids: List[str]) -> List[str]:
+    """
+    Publish sync messages for devices that have none pending and return their IDs.
+    The pending marks are committed before publishing, so a worker that picks a message up
+    right away always finds (and clears) its mark; they are removed again if publishing fails.
+    """
+    pending_dal = SyncPendingDAL(conn, services.sync_config.SYNC_PENDING_TTL_SECONDS)
+    to_publish = pending_dal.mark_pending(device_ids)
+    conn.commit()
+    if to_publish:
+        try:
+            services.publisher.publish_batch(device_id.encode() for device_id in to_publish)
+        except Exception:
+            pending_dal.clear_many(to_publish)
+            conn.commit()
+            raise
+    SYNC_ENQUEUED.labels(result="published").inc(len(to_publish))
+    SYNC_ENQUEUED.labels(result="coalesced").inc(len(set(device_ids)) - len(to_publish))
+    return to_publish
+
 @app.post("/devices/sync_energy")
-def sync_energy(request: DeviceSyncRequest):
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_config.RABBITMQ_HOST))
-    channel = connection.channel()
-    channel.queue_declare(queue=rabbitmq_config.RABBITMQ_QUEUE)
-    channel.basic_publish(
-        exchange='',
-        routing_key=rabbitmq_config.RABBITMQ_QUEUE,
-        body=request.device_id.encode(),
-        properties=pika.BasicProperties(delivery_mode=2)
+def sync_energy(request: DeviceSyncRequest, conn=Depends(get_conn)):
+    published = enqueue_sync(conn, [request.device_id])
+    return {"status": "published" if published else "coalesced", "device_id": request.device_id}
+
+class DeviceSyncBatchRequest(BaseModel):
+    device_ids: List[str]
+
+@app.post("/devices/sync_energy/batch")
+def sync_energy_batch(request: DeviceSyncBatchRequest, conn=Depends(get_conn)):
+    published = enqueue_sync(conn, request.device_ids)
+    return {"status": "published", "device_ids": published, "coalesced": sorted(set(request.device_ids) - set(published))}
+
+@app.post("/devices/sync_energy/all")
+def sync_energy_all(conn=Depends(get_conn)):
+    device_ids = [d.id for d in DeviceDAL(conn).list()]
+    published = enqueue_sync(conn, device_ids)
+    return {"status": "published", "device_ids": published, "coalesced": sorted(set(device_ids) - set(published))}
+
+@app.post("/devices/sync_energy/plan")
+def sync_energy_plan():
+    """Start a planned pass over all lagging devices now, in the background."""
+    services.sync_planner.trigger()
+    return {"status": "planned"}
+
+@app.get("/devices/sync_energy/leases")
+def sync_energy_leases(conn=Depends(get_conn)):
+    """Devices currently claimed by ETL workers and which worker holds them."""
+    leases = SyncLeaseDAL(conn, owner="coordinator").active()
+    return {
+        "leases": [
+            {"device_id": device_id, "owner": owner, "acquired_at": acquired_at, "expires_at": expires_at}
+            for device_id, owner, acquired_at, expires_at in leases
+        ]
+    }
+
+RollupPeriod = Literal["day", "week", "month", "year"]
+
+def _default_range(start_date: Optional[date], end_date: Optional[date]):
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=365)
+    return start_date, end_date
+
+@app.get("/energy/totals")
+def fleet_energy_totals(period: RollupPeriod = "month", start_date: Optional[date] = None, end_date: Optional[date] = None, conn=Depends(get_conn)):
+    start_date, end_date = _default_range(start_date, end_date)
+    return {
+        "period": period,
+        "totals": EnergyConsumptionDAL(conn).totals(period, start_date, end_date)
+    }
+
+@app.get("/devices/{device_id}/energy/totals")
+def device_energy_totals(device_id: str, period: RollupPeriod = "month", start_date: Optional[date] = None, end_date: Optional[date] = None, conn=Depends(get_conn)):
+    start_date, end_date = _default_range(start_date, end_date)
+    return {
+        "device_id": device_id,
+        "period": period,
+        "totals": EnergyConsumptionDAL(conn).totals(period, start_date, end_date, device_id=device_id)
+    }
+
+@app.get("/energy/anomalies")
+def energy_anomalies(since: Optional[date] = None, device_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), conn=Depends(get_conn)):
+    """
+    Outlier days flagged on ingest since `since` (default: the last 30 days), newest first,
+    optionally for one device. Reads energy_anomalies only.
+    """
+    since = since or date.today() - timedelta(days=30)
+    return {
+        "since": since,
+        "anomalies": EnergyAnomalyDAL(conn).recent(since, device_id=device_id, limit=limit)
+    }
+
+ExportFormat = Literal["arrow", "parquet"]
+
+@app.get("/energy/export")
+def export_energy(start_date: date, end_date: date, device_id: Optional[List[str]] = Query(None), format: ExportFormat = "parquet"):
+    """
+    Stream daily energy consumption in [start_date, end_date] as Parquet or an Arrow IPC
+    stream, for the given `device_id`s (repeatable) or every device.
+    """
+    from common.energy_export import EXPORT_MEDIA_TYPES
+    filename = f"energy_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{'arrows' if format == 'arrow' else 'parquet'}"
+    return StreamingResponse(
+        services.energy_exporter.stream(start_date, end_date, device_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
-    connection.close()
-    return {"status": "published", "device_id": request.device_id}
\ No newline at end of file
@@ -1,63 +1,350 @@
 import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import date, timedelta
-from common.config import LgApiConfig, PostgresConfig
+from common.config import EtlConfig, LgApiConfig, PostgresConfig
 from common.device_dal import DeviceDAL
 from common.lg_api_client import LGApiClient
 from common.energy_consumption_dal import EnergyConsumptionDAL
-from common.postgres_connection import PostgresConn
+from common.energy_anomaly import EwmaAnomalyDetector
+from common.energy_anomaly_dal import EnergyAnomalyDAL
+from common.energy_sync_spool_dal import EnergySyncSpoolDAL
+from common.lazy import is_built, lazy
+from common.metrics import ENERGY_ANOMALIES, SYNC_WINDOWS_REPLAYED, set_sync_lag
+from common.postgres_pool import PostgresPool
 from common.date_range_splitter import DateRangeSplitter
+from common.rate_limiter import TokenBucket
+from common.tracing import Tracer, bind, span
 
-postgres_config = PostgresConfig()
-postgres_conn_string = f"postgresql://{postgres_config.POSTGRES_USER}:{postgres_config.POSTGRES_PASSWORD}@{postgres_config.POSTGRES_HOST}:5432/{postgres_config.POSTGRES_DB}"
+class EtlServices:
+    """
+    Settings and clients shared by the ETL entry points, each built on first use.
+    Any of them can be injected by keyword (e.g. `EtlServices(api_client=stub_client)`),
+    so the ETL can be embedded in-process without the full environment.
+    """
+    def __init__(self, **overrides):
+        self.__dict__.update(overrides)
 
-lg_api_config = LgApiConfig()
-api_client = LGApiClient(
-    lg_api_config.LG_COUNTRY,
-    lg_api_config.LG_API_KEY,
-    lg_api_config.LG_CLIENT_ID,
-    lg_api_config.LG_API_TOKEN
-)
+    @lazy
+    def etl_config(self):
+        return EtlConfig()
 
-def run(device_id: str):            
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
-    logger = logging.getLogger(__name__)
+    @lazy
+    def postgres_pool(self):
+        return PostgresPool.from_config(PostgresConfig())
 
-    yesterday = date.today() - timedelta(days=1)
-    default_start = date(2025, 1, 1)
-
-    with PostgresConn(postgres_conn_string) as conn:
-        device_dal = DeviceDAL(conn)
-        device = device_dal.get(device_id)
-        if not device:
-            logger.error(f"Device with ID {device_id} not found.")
-            return
-        
-        energy_consumption_dal = EnergyConsumptionDAL(conn)
-        log = energy_consumption_dal.get_log(device.id)
-        if not log:
-            energy_consumption_dal.create_log(device.id, default_start)
-            start_date = default_start
-            end_date = yesterday
-        else:
-            start_date, last_end_date = log
-            if last_end_date:
-                start_date = last_end_date + timedelta(days=1)
-            else:
-                start_date = default_start
-            end_date = yesterday
-        if start_date > end_date:
-            logger.warning(f"Device {device.id}: No new data to fetch.")
-            return
-        
-        splitter = DateRangeSplitter(max_count_records=30)
-        ranges = splitter.split(start_date, end_date)
-        for r_start, r_end in ranges:
-            logger.info(f"Device {device.id}: Fetching {r_start} to {r_end} from LG API")
-            consumption = api_client.get_energy_consumption(device.id, r_start, r_end)
+    @lazy
+    def api_client(self):
+        return LGApiClient.from_config(LgApiConfig(), pool_size=self.etl_config.ETL_FETCH_CONCURRENCY)
+
+    @lazy
+    def fetch_executor(self):
+        # Shared across runs so the LG API sees at most ETL_FETCH_CONCURRENCY requests in flight per process
+        return ThreadPoolExecutor(max_workers=self.etl_config.ETL_FETCH_CONCURRENCY, thread_name_prefix="lg-fetch")
+
+    @lazy
+    def rate_limiter(self):
+        # The daily sync gets the LG API quota minus the hourly poller's slice
+        return self._rate_limiter(1 - self.etl_config.ETL_POLL_RATE_SHARE)
+
+    @lazy
+    def poll_rate_limiter(self):
+        if self.etl_config.LG_API_RATE_LIMIT > 0 and self.etl_config.ETL_POLL_RATE_SHARE <= 0:
+            raise ValueError("ETL_POLL_RATE_SHARE must be positive to run the poller while LG_API_RATE_LIMIT is set")
+        return self._rate_limiter(self.etl_config.ETL_POLL_RATE_SHARE)
+
+    def _rate_limiter(self, share: float):
+        if self.etl_config.LG_API_RATE_LIMIT > 0:
+            return TokenBucket(
+                self.etl_config.LG_API_RATE_LIMIT * share,
+                max(1, round(self.etl_config.LG_API_RATE_BURST * share))
+            )
+        return None
+
+    @lazy
+    def tracer(self):
+        return Tracer.from_config(self.etl_config)
+
+    @lazy
+    def anomaly_detector(self):
+        if self.etl_config.ETL_ANOMALY_DETECTION:
+            return EwmaAnomalyDetector(
+                alpha=self.etl_config.ETL_ANOMALY_ALPHA,
+                z_threshold=self.etl_config.ETL_ANOMALY_Z_THRESHOLD,
+                min_samples=self.etl_config.ETL_ANOMALY_MIN_SAMPLES
+            )
+        return None
+
+    def close(self):
+        """Release whatever was built."""
+        if is_built(self, "fetch_executor"):
+            self.fetch_executor.shutdown(wait=True)
+        if is_built(self, "api_client"):
+            self.api_client.close()
+        if is_built(self, "postgres_pool"):
+            self.postgres_pool.close()
+
+services = EtlServices()
+
+def configure(new_services: EtlServices):
+    """Replace the services used by the ETL functions of this module."""
+    global services
+    services = new_services
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START = date(2025, 1, 1)
+
+def _fetch(device_id: str, r_start: date, r_end: date):
+    with span("fetch", device_id=device_id, start=r_start, end=r_end) as fetch_span:
+        if services.rate_limiter:
+            with span("rate_limit"):
+                services.rate_limiter.acquire()
+        logger.info(f"Device {device_id}: Fetching {r_start} to {r_end} from LG API")
+        consumption = services.api_client.get_energy_consumption_batch(device_id, r_start, r_end)
+        fetch_span.set(rows=len(consumption))
+        return consumption
+
+def fetch_ranges(tasks, skip=frozenset(), preloaded=None):
+    """
+    Fetch (device_id, start, end, ...) tasks concurrently and yield (task, consumption, error)
+    in task order, with `error` set instead of raising when a fetch fails. Up to twice
+    ETL_FETCH_CONCURRENCY tasks are queued ahead. Devices the consumer adds to `skip` are
+    dropped: their queued fetches are cancelled and their later tasks never submitted. Pending
+    fetches are also cancelled if the consumer stops early. Tasks whose (device_id, start, end)
+    is in `preloaded` yield that consumption instead.
+    """
+    tasks = iter(tasks)
+    pending = deque()
+    preloaded = preloaded or {}
+
+    def drop_skipped():
+        for entry in [entry for entry in pending if entry[0][0] in skip]:
+            # A fetch that already started finishes in the background; its result is discarded
+            entry[1].cancel()
+            pending.remove(entry)
+
+    def submit_next():
+        for task in tasks:
+            if task[0] not in skip:
+                if task[:3] in preloaded:
+                    future = Future()
+                    future.set_result(preloaded[task[:3]])
+                else:
+                    future = services.fetch_executor.submit(bind(_fetch), *task[:3])
+                pending.append((task, future))
+                return True
+        return False
+
+    depth = services.etl_config.ETL_FETCH_CONCURRENCY * 2
+    try:
+        for _ in range(depth):
+            submit_next()
+        while pending:
+            task, future = pending.popleft()
             try:
-                energy_consumption_dal.bulk_insert(consumption)
-                energy_consumption_dal.update_log(device.id, r_end)
-                logger.info(f"Device {device.id}: Updated log to {r_end}")
+                consumption, error = future.result(), None
             except Exception as e:
-                logger.error(f"Device {device.id}: Error saving data or updating log: {e}")
-                break
\ No newline at end of file
+                consumption, error = None, e
+            submit_next()
+            yield task, consumption, error
+            if skip:
+                drop_skipped()
+                while len(pending) < depth and submit_next():
+                    pass
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def detect_anomalies(conn, rows) -> int:
+    """
+    Pipeline stage run on each batch right after it lands: fold the newly inserted
+    (device_id, used_date, energy_wh) rows into the per-device weekday statistics and store
+    the outlier days in energy_anomalies. Only the statistics of the batch's devices are
+    read, so the cost is proportional to the batch. Returns the number of anomalies stored.
+    """
+    detector = services.anomaly_detector
+    if not detector or not rows:
+        return 0
+    with span("anomalies", rows=len(rows)) as anomalies_span:
+        anomaly_dal = EnergyAnomalyDAL(conn)
+        stats = anomaly_dal.get_stats({row[0] for row in rows})
+        changed, anomalies = detector.observe(stats, rows)
+        anomaly_dal.save_stats(changed)
+        # Days flagged by an earlier run are not stored again, so only new rows are reported
+        stored = anomaly_dal.insert_anomalies(anomalies)
+        anomalies_span.set(anomalies=len(stored))
+    for anomaly in stored:
+        ENERGY_ANOMALIES.labels(kind=anomaly.kind).inc()
+        logger.info(f"Device {anomaly.device_id}: {anomaly.kind} on {anomaly.used_date} ({anomaly.energy_wh} Wh, expected {anomaly.expected_wh} Wh, z={anomaly.z_score})")
+    return len(stored)
+
+def _replay_spool(conn, energy_consumption_dal, spool_dal, devices, logs):
+    """
+    Load spooled windows that continue a device's read log (left over by a run that died
+    after fetching them) and advance the log over them, dropping windows the log already
+    covers. Returns the remaining windows as {(device_id, start, end): consumption}, to be
+    used in place of fetching the same windows again.
+    """
+    replayed, superseded, remaining = [], [], {}
+    end_dates = {}
+    for device_id, windows in spool_dal.get(devices).items():
+        log_end = logs[device_id][1] if device_id in logs else None
+        next_start = log_end + timedelta(days=1) if log_end else DEFAULT_START
+        for r_start, r_end, consumption in windows:
+            if log_end and r_end <= log_end:
+                superseded.append((device_id, r_start, r_end))
+            elif r_start <= next_start:
+                replayed.append(((device_id, r_start, r_end), consumption))
+                next_start = max(next_start, r_end + timedelta(days=1))
+                end_dates[device_id] = next_start - timedelta(days=1)
+            else:
+                remaining[(device_id, r_start, r_end)] = consumption
+    if replayed:
+        energy_consumption_dal.ensure_partitions(min(key[1] for key, _ in replayed), max(key[2] for key, _ in replayed))
+        inserted = energy_consumption_dal.bulk_insert_batches((consumption for _, consumption in replayed), return_inserted=True)
+        detect_anomalies(conn, inserted)
+        energy_consumption_dal.update_logs(end_dates)
+        set_sync_lag(end_dates)
+        for device_id, end_date in end_dates.items():
+            logs[device_id] = (logs[device_id][0] if device_id in logs else DEFAULT_START, end_date)
+            logger.info(f"Device {device_id}: Replayed spooled windows, updated log to {end_date}")
+        SYNC_WINDOWS_REPLAYED.inc(len(replayed))
+    spool_dal.delete([key for key, _ in replayed] + superseded)
+    return remaining
+
+def _plan_ranges(energy_consumption_dal, devices, logs, yesterday):
+    """
+    Date windows to fetch per device. By default windows continue from the read log's
+    end date; with ETL_COVERAGE_PLANNING they cover exactly the days missing from
+    energy_consumption since DEFAULT_START, so holes are backfilled and stored spans skipped.
+    Days the LG API answered without data are only asked for again after ETL_GAP_RECHECK_DAYS.
+    """
+    splitter = DateRangeSplitter(max_count_records=30)
+    plans = {}
+    if services.etl_config.ETL_COVERAGE_PLANNING:
+        gaps = energy_consumption_dal.missing_ranges(list(devices), DEFAULT_START, yesterday, services.etl_config.ETL_GAP_RECHECK_DAYS)
+    for device_id in devices:
+        if services.etl_config.ETL_COVERAGE_PLANNING:
+            ranges = splitter.split_gaps(gaps.get(device_id, []))
+        else:
+            log = logs.get(device_id)
+            last_end_date = log[1] if log else None
+            start_date = last_end_date + timedelta(days=1) if last_end_date else DEFAULT_START
+            ranges = splitter.split(start_date, yesterday)
+        if not ranges:
+            logger.warning(f"Device {device_id}: No new data to fetch.")
+            continue
+        plans[device_id] = ranges
+    return plans
+
+def run_many(device_ids, conn=None):
+    """
+    Sync several devices' energy consumption up to yesterday on one connection.
+    Devices and read logs are loaded with one query each. Windows are fetched concurrently
+    across devices, and each round (the next window of every device) is written with one
+    combined bulk insert; a device's read log still only advances over its own contiguous
+    prefix of windows. Unknown devices are logged and skipped.
+    Each round is a checkpoint: its rows, the read logs and the removal of its windows from
+    the spool (ETL_WINDOW_SPOOL) are committed together, and every window is spooled and
+    committed as soon as it is fetched, so a crash loses at most the fetches in flight;
+    the next run replays the spooled windows. `conn` defaults to a pooled connection.
+    Database errors propagate; only the uncommitted round is lost.
+    Returns {device_id: exception} for devices whose LG API fetch failed.
+    """
+    yesterday = date.today() - timedelta(days=1)
+    failed = {}
+
+    with (nullcontext(conn) if conn else services.postgres_pool.connection()) as conn:
+        devices = DeviceDAL(conn).get_many(device_ids)
+        for device_id in device_ids:
+            if device_id not in devices:
+                logger.error(f"Device with ID {device_id} not found.")
+
+        energy_consumption_dal = EnergyConsumptionDAL(conn)
+        logs = energy_consumption_dal.get_logs(list(devices))
+        new_devices = [device_id for device_id in devices if device_id not in logs]
+        if new_devices:
+            energy_consumption_dal.create_logs(new_devices, DEFAULT_START)
+        set_sync_lag({device_id: end_date for device_id, (_, end_date) in logs.items() if end_date})
+
+        spool_dal = EnergySyncSpoolDAL(conn) if services.etl_config.ETL_WINDOW_SPOOL else None
+        with span("replay") as replay_span:
+            spooled = _replay_spool(conn, energy_consumption_dal, spool_dal, list(devices), logs) if spool_dal else {}
+            conn.commit()
+            replay_span.set(remaining=len(spooled))
+
+        coverage = services.etl_config.ETL_COVERAGE_PLANNING
+        with span("plan") as plan_span:
+            plans = _plan_ranges(energy_consumption_dal, devices, logs, yesterday)
+            plan_span.set(windows=sum(len(ranges) for ranges in plans.values()))
+            if coverage:
+                # Nothing left to fetch: move the log to yesterday so the planner stops enqueuing the device
+                covered = {device_id: yesterday for device_id in devices if device_id not in plans}
+                if covered:
+                    energy_consumption_dal.update_logs(covered)
+                    conn.commit()
+                    set_sync_lag(covered)
+        if not plans:
+            return failed
+        energy_consumption_dal.ensure_partitions(min(ranges[0][0] for ranges in plans.values()), max(ranges[-1][1] for ranges in plans.values()))
+
+        # Interleave windows round by round so every device makes progress in each combined write
+        tasks = [
+            (device_id, *ranges[i], i)
+            for i in range(max(len(ranges) for ranges in plans.values()))
+            for device_id, ranges in plans.items()
+            if i < len(ranges)
+        ]
+
+        def write_round(batch):
+            with span("insert", windows=len(batch)) as insert_span:
+                inserted = energy_consumption_dal.bulk_insert_batches((consumption for _, consumption in batch), return_inserted=True)
+                insert_span.set(rows=len(inserted))
+            detect_anomalies(conn, inserted)
+            end_dates = {device_id: r_end for (device_id, _, r_end, _), _ in batch}
+            if coverage:
+                energy_consumption_dal.mark_empty_days(task[:3] for task, _ in batch)
+                # Coverage windows span every missing day, so after a device's last one it is complete through yesterday
+                for (device_id, _, _, round_index), _ in batch:
+                    if round_index == len(plans[device_id]) - 1:
+                        end_dates[device_id] = yesterday
+            with span("log_update", devices=len(end_dates)):
+                energy_consumption_dal.update_logs(end_dates)
+                if spool_dal:
+                    spool_dal.delete(task[:3] for task, _ in batch)
+                conn.commit()
+            set_sync_lag(end_dates)
+            for device_id, r_end in end_dates.items():
+                logger.info(f"Device {device_id}: Updated log to {r_end}")
+
+        batch = []
+        for task, consumption, error in fetch_ranges(tasks, skip=failed, preloaded=spooled):
+            device_id, r_start, r_end, round_index = task
+            if batch and batch[-1][0][3] != round_index:
+                write_round(batch)
+                batch = []
+            if device_id in failed:
+                continue
+            if error:
+                logger.error(f"Device {device_id}: Error fetching {r_start} to {r_end}: {error}")
+                failed[device_id] = error
+                continue
+            if spool_dal and task[:3] not in spooled:
+                with span("spool", device_id=device_id, rows=len(consumption)):
+                    spool_dal.put(device_id, r_start, r_end, consumption)
+                    conn.commit()
+            batch.append((task, consumption))
+        if batch:
+            write_round(batch)
+    return failed
+
+def run(device_id: str, conn=None):
+    """
+    Sync a device's energy consumption up to yesterday, on `conn` or a pooled connection;
+    fetched windows are committed as they go (see `run_many`).
+    """
+    failed = run_many([device_id], conn)
+    if device_id in failed:
+        raise failed[device_id]
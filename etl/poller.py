@@ -0,0 +1,101 @@
+"""
+Near-real-time poller: every ETL_POLL_INTERVAL_SECONDS, fetch today's hourly usage of all
+registered devices and upsert the readings that changed into energy_consumption_hourly.
+After midnight the previous day is polled one last time, complete days are folded into
+energy_consumption and hourly rows past ETL_HOURLY_RETENTION_DAYS are purged.
+"""
+import logging
+import sys
+import time
+from datetime import date, timedelta
+import app
+from common.device_dal import DeviceDAL
+from common.energy_consumption_dal import EnergyConsumptionDAL
+from common.energy_consumption_hourly_dal import EnergyConsumptionHourlyDAL
+from common.metrics import observe_insert, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Last stored reading per device and hour of the polled day, so unchanged readings are
+# skipped without a database round trip; reloaded from the table whenever the day changes.
+last_readings = {}
+last_readings_day = None
+
+def _fetch_hourly(device_id: str, day: date):
+    services = app.services
+    if services.poll_rate_limiter:
+        services.poll_rate_limiter.acquire()
+    return services.api_client.get_energy_consumption_hourly(device_id, day)
+
+def poll(day: date) -> int:
+    """Fetch `day` for every registered device and store the changed readings; returns how many changed."""
+    global last_readings, last_readings_day
+    services = app.services
+    with services.postgres_pool.connection() as conn:
+        device_ids = DeviceDAL(conn).list_ids()
+        if last_readings_day != day:
+            last_readings = EnergyConsumptionHourlyDAL(conn).get_day(device_ids, day)
+            last_readings_day = day
+
+    futures = {device_id: services.fetch_executor.submit(_fetch_hourly, device_id, day) for device_id in device_ids}
+    changed = []
+    for device_id, future in futures.items():
+        try:
+            readings = future.result()
+        except Exception as e:
+            logger.error(f"Device {device_id}: Error polling {day}: {e}")
+            continue
+        known = last_readings.get(device_id, {})
+        # Stored values have three decimals, compare at the same precision
+        changed.extend(
+            reading for reading in readings
+            if reading.used_date == day and known.get(reading.hour) != round(reading.energy_wh, 3)
+        )
+
+    if changed:
+        started = time.perf_counter()
+        with services.postgres_pool.connection() as conn:
+            written = EnergyConsumptionHourlyDAL(conn).upsert(changed)
+        observe_insert("energy_consumption_hourly", started, written)
+        for reading in changed:
+            last_readings.setdefault(reading.device_id, {})[reading.hour] = round(reading.energy_wh, 3)
+    logger.info(f"Polled {day} for {len(device_ids)} devices: {len(changed)} readings changed")
+    return len(changed)
+
+def fold_closed_days(today: date):
+    """Fold complete days before `today` into the daily table and purge expired hourly rows."""
+    with app.services.postgres_pool.connection() as conn:
+        folded = EnergyConsumptionDAL(conn).fold_hourly(today, return_inserted=True)
+        anomalies = app.detect_anomalies(conn, folded)
+        purged = EnergyConsumptionHourlyDAL(conn).purge(today - timedelta(days=app.services.etl_config.ETL_HOURLY_RETENTION_DAYS))
+    logger.info(f"Folded {len(folded)} device-days into energy_consumption ({anomalies} anomalies), purged {purged} hourly rows")
+
+def main():
+    etl_config = app.services.etl_config
+    start_metrics_server(etl_config.ETL_METRICS_PORT)
+    polled_day = None
+    while True:
+        today = date.today()
+        try:
+            if polled_day != today:
+                if polled_day is not None:
+                    # The last hours of the previous day are final only after midnight
+                    poll(polled_day)
+                fold_closed_days(today)
+            poll(today)
+            polled_day = today
+        except Exception:
+            logger.exception("Polling pass failed")
+        time.sleep(etl_config.ETL_POLL_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    # Configure logger to write to stdout so docker logs capture it reliably
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
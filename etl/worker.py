@@ -1,88 +1,226 @@
-import hashlib
+import functools
 import logging
+import os
+import socket
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import pika
-import psycopg2
-from app import run
-from common.config import RabbitMQConfig, PostgresConfig
-
-rabbitmq_config = RabbitMQConfig()
-postgres_config = PostgresConfig()
-
-connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_config.RABBITMQ_HOST))
-channel = connection.channel()
-channel.queue_declare(queue=rabbitmq_config.RABBITMQ_QUEUE)
-
-# Ensure a single unacknowledged message per consumer (fair dispatch)
-channel.basic_qos(prefetch_count=1)
-
-# Configure logger to write to stdout so docker logs capture it reliably
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+import app
+from common.config import RabbitMQConfig, SyncConfig
+from common.lg_api_client import LGApiError
+from common.metrics import DEVICE_LEASE_CONTENDED, SYNC_DEAD_LETTERED, SYNC_DEVICES, SYNC_SECONDS, observe_queue_wait, start_metrics_server, timed
+from common.sync_lease_heartbeat import SyncLeaseHeartbeat
+from common.sync_pending_dal import SyncPendingDAL
+from common.sync_retry import declare_retry_queues, publish_dead_letter, publish_retry, retry_count
+from common.tracing import span
+
 logger = logging.getLogger(__name__)
 
-def _device_lock_key(device_id: str) -> int:
-    """Derive a 64-bit lock key from device_id using a stable hash."""
-    h = hashlib.sha256(device_id.encode()).digest()
-    return int.from_bytes(h[:8], byteorder='big', signed=False)
-
-def callback(ch, method, properties, body):
-    device_id = body.decode()
-    delivery_tag = method.delivery_tag
-    lock_key = _device_lock_key(device_id)
-
-    conn = None
-    try:
-        # connect to Postgres to acquire advisory lock
-        conn = psycopg2.connect(
-            dbname=postgres_config.POSTGRES_DB,
-            user=postgres_config.POSTGRES_USER,
-            password=postgres_config.POSTGRES_PASSWORD,
-            host=postgres_config.POSTGRES_HOST,
-            port=postgres_config.POSTGRES_PORT,
+class EtlWorker:
+    """
+    Consumes device IDs from RabbitMQ and syncs them in batches on a thread pool.
+    Nothing connects until `run()`, so the worker can be built (and embedded) without a broker.
+    """
+    def __init__(self, services=None, rabbitmq_config=None, sync_config=None):
+        self.services = services or app.services
+        self.rabbitmq_config = rabbitmq_config or RabbitMQConfig()
+        self.sync_config = sync_config or SyncConfig()
+        self.etl_config = self.services.etl_config
+        self.connection = None
+        self.channel = None
+        self.executor = None
+        # Devices are claimed through leases named after this process, renewed while they are synced
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_heartbeat = None
+        # Deliveries are buffered on the connection thread until a batch is full or the wait expires
+        self.pending_messages = []
+        self.flush_scheduled = False
+
+    def _connect(self):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.rabbitmq_config.RABBITMQ_HOST))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=self.rabbitmq_config.RABBITMQ_QUEUE)
+        declare_retry_queues(self.channel, self.rabbitmq_config.RABBITMQ_QUEUE, self.sync_config.SYNC_RETRY_DELAYS)
+
+        # Devices are processed on a thread pool; the prefetch bounds how many unacknowledged
+        # messages this consumer holds (fair dispatch across workers).
+        self.channel.basic_qos(prefetch_count=self.etl_config.ETL_WORKER_PREFETCH)
+        self.executor = ThreadPoolExecutor(max_workers=self.etl_config.ETL_WORKER_CONCURRENCY, thread_name_prefix="etl-device")
+        self.lease_heartbeat = SyncLeaseHeartbeat(
+            self.services.postgres_pool,
+            self.worker_id,
+            ttl_seconds=self.sync_config.SYNC_LEASE_TTL_SECONDS,
+            interval_seconds=self.sync_config.SYNC_LEASE_HEARTBEAT_SECONDS
         )
-        conn.autocommit = True
-        with conn.cursor() as cur:
-            cur.execute("SELECT pg_try_advisory_lock(%s);", (lock_key,))
-            got_lock = cur.fetchone()[0]
 
-        if not got_lock:
-            # Another worker is processing this device — requeue to try later
-            ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
-            return
+    def _ack(self, ch, delivery_tag):
+        # pika channels are not thread-safe: acks are marshalled back to the connection thread
+        self.connection.add_callback_threadsafe(functools.partial(ch.basic_ack, delivery_tag=delivery_tag))
 
-        logger.info("[etl worker] Received device_id: %s (locked)", device_id)
+    def _nack(self, ch, delivery_tag, requeue=True):
+        self.connection.add_callback_threadsafe(functools.partial(ch.basic_nack, delivery_tag=delivery_tag, requeue=requeue))
 
-        try:
-            run(device_id)
-            # processing succeeded -> ack
+    def _retry_later(self, ch, delivery_tag, body, properties, error=None):
+        """
+        Move the message to its next delay queue instead of requeueing it for immediate redelivery.
+        Once SYNC_MAX_RETRIES is spent, or when `error` is an LG API error retrying cannot fix,
+        the message goes to the dead-letter queue instead.
+        """
+        queue = self.rabbitmq_config.RABBITMQ_QUEUE
+        if isinstance(error, LGApiError) and error.permanent:
+            reason = "permanent_error"
+        elif retry_count(properties) >= self.sync_config.SYNC_MAX_RETRIES:
+            reason = "max_retries"
+        else:
+            reason = None
+
+        def retry():
+            if reason:
+                publish_dead_letter(ch, queue, body, reason, properties)
+                ch.basic_ack(delivery_tag=delivery_tag)
+                SYNC_DEAD_LETTERED.labels(reason=reason).inc()
+                logger.error("[etl worker] Giving up on device_id: %s after %d retries (%s): %s", body.decode(), retry_count(properties), reason, error)
+                return
+            delay = publish_retry(ch, queue, self.sync_config.SYNC_RETRY_DELAYS, body, properties)
             ch.basic_ack(delivery_tag=delivery_tag)
-        except Exception as e:
-            # processing failed -> nack and requeue
-            logger.exception("[etl worker] Error processing %s", device_id)
-            ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
-            raise
-        finally:
-            # release advisory lock
-            with conn.cursor() as cur:
-                cur.execute("SELECT pg_advisory_unlock(%s);", (lock_key,))
-                logger.info("[etl worker] Release device_id: %s (unlocked)", device_id)
+            logger.info("[etl worker] Retrying device_id: %s in %ds", body.decode(), delay)
+        self.connection.add_callback_threadsafe(retry)
+
+    def process_batch(self, ch, messages):
+        """
+        Lease, sync and settle a batch of (delivery_tag, body, properties) deliveries.
+        Claimed devices run together through `run_many` on one pooled session; devices leased
+        by another worker and failed devices are retried later, duplicates of a device share
+        its outcome. With ETL_TRACE_FILE set, the batch is recorded as one span tree.
+        """
+        tracer = self.services.tracer
+        if tracer is None:
+            return self._process_batch(ch, messages)
+        device_ids = sorted({body.decode() for _, body, _ in messages})
+        with tracer.trace("sync", worker_id=self.worker_id, messages=len(messages), device_ids=device_ids):
+            self._process_batch(ch, messages)
+
+    def _process_batch(self, ch, messages):
+        by_device = {}
+        for message in messages:
+            by_device.setdefault(message[1].decode(), []).append(message)
+        settled = set()
+
+        def settle(device_id, ok, error=None):
+            for delivery_tag, body, properties in by_device[device_id]:
+                if ok:
+                    self._ack(ch, delivery_tag)
+                else:
+                    self._retry_later(ch, delivery_tag, body, properties, error)
+            settled.add(device_id)
 
-    except Exception as exc:
-        # If something unexpected happened, ensure message is requeued
+        lease_heartbeat = self.lease_heartbeat
+        claimed = []
         try:
-            ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+            # Leases are rows committed right away, so they outlive the ETL transaction
+            # and share its pooled connection.
+            with self.services.postgres_pool.connection() as conn:
+                try:
+                    with span("lease") as lease_span:
+                        claimed = lease_heartbeat.dal(conn).claim(by_device)
+                        conn.commit()
+                        lease_span.set(claimed=len(claimed), contended=len(by_device) - len(claimed))
+                    lease_heartbeat.add(claimed)
+                    for device_id in by_device:
+                        if device_id in claimed:
+                            logger.info("[etl worker] Received device_id: %s (leased)", device_id)
+                        else:
+                            # Another worker holds this device — retry after a backoff delay
+                            DEVICE_LEASE_CONTENDED.inc()
+                            settle(device_id, False)
+                    if not claimed:
+                        return
+
+                    # From here on a new sync request must be queued again rather than coalesced
+                    pending_dal = SyncPendingDAL(conn)
+                    for device_id in claimed:
+                        pending_dal.clear(device_id)
+                    conn.commit()
+
+                    try:
+                        with timed(SYNC_SECONDS), span("run", devices=len(claimed)) as run_span:
+                            failed = app.run_many(claimed, conn)
+                            conn.commit()
+                            run_span.set(failed=len(failed))
+                    except Exception:
+                        # processing failed -> retry every claimed device after a backoff delay;
+                        # rounds committed by run_many are kept and spooled windows are replayed
+                        conn.rollback()
+                        logger.exception("[etl worker] Error processing %s", ", ".join(claimed))
+                        failed = dict.fromkeys(claimed)
+                    SYNC_DEVICES.labels(result="failed").inc(len(failed))
+                    SYNC_DEVICES.labels(result="ok").inc(len(claimed) - len(failed))
+                    for device_id in claimed:
+                        settle(device_id, device_id not in failed, failed.get(device_id))
+                finally:
+                    # release leases
+                    if claimed:
+                        lease_heartbeat.discard(claimed)
+                        conn.rollback()
+                        with span("release"):
+                            lease_heartbeat.dal(conn).release(claimed)
+                            conn.commit()
+                        logger.info("[etl worker] Released device_ids: %s", ", ".join(claimed))
+
         except Exception:
-            pass
-        logger.exception("[etl worker] Unexpected error")
-    finally:
-        if conn:
-            conn.close()
+            # If something unexpected happened, ensure unsettled messages are requeued
+            for device_id, device_messages in by_device.items():
+                if device_id not in settled:
+                    for delivery_tag, _, _ in device_messages:
+                        self._nack(ch, delivery_tag)
+            logger.exception("[etl worker] Unexpected error")
+
+    def flush_batch(self):
+        self.flush_scheduled = False
+        if self.pending_messages:
+            self.executor.submit(self.process_batch, self.channel, self.pending_messages)
+            self.pending_messages = []
+
+    def callback(self, ch, method, properties, body):
+        observe_queue_wait(properties)
+        self.pending_messages.append((method.delivery_tag, body, properties))
+        if len(self.pending_messages) >= self.etl_config.ETL_WORKER_BATCH_SIZE:
+            self.flush_batch()
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.connection.call_later(self.etl_config.ETL_WORKER_BATCH_WAIT_SECONDS, self.flush_batch)
+
+    def run(self):
+        """Connect and consume until interrupted, then drain in-flight devices."""
+        self._connect()
+        start_metrics_server(self.etl_config.ETL_METRICS_PORT)
+        self.lease_heartbeat.start()
+        self.channel.basic_consume(queue=self.rabbitmq_config.RABBITMQ_QUEUE, on_message_callback=self.callback, auto_ack=False)
+        logger.info(
+            "[etl worker] Waiting for device IDs in queue '%s' (concurrency=%d, prefetch=%d, batch=%d)...",
+            self.rabbitmq_config.RABBITMQ_QUEUE,
+            self.etl_config.ETL_WORKER_CONCURRENCY,
+            self.etl_config.ETL_WORKER_PREFETCH,
+            self.etl_config.ETL_WORKER_BATCH_SIZE,
+        )
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            self.channel.stop_consuming()
+        finally:
+            # Let buffered and in-flight devices finish and flush their acks before closing
+            self.flush_batch()
+            self.executor.shutdown(wait=True)
+            self.lease_heartbeat.stop()
+            self.connection.process_data_events(time_limit=1)
+            self.connection.close()
 
 
-channel.basic_consume(queue=rabbitmq_config.RABBITMQ_QUEUE, on_message_callback=callback, auto_ack=False)
-logger.info("[etl worker] Waiting for device IDs in queue '%s'...", rabbitmq_config.RABBITMQ_QUEUE)
-channel.start_consuming()
+if __name__ == "__main__":
+    # Configure logger to write to stdout so docker logs capture it reliably
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    EtlWorker().run()
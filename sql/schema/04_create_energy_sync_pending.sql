@@ -0,0 +1,5 @@
+-- Devices that already have a sync message queued; used to coalesce duplicate sync requests
+CREATE TABLE IF NOT EXISTS energy_sync_pending (
+    device_id VARCHAR(65) PRIMARY KEY,
+    enqueued_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
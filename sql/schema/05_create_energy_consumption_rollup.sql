@@ -0,0 +1,21 @@
+-- Per-device energy totals by day/week/month/year (weeks start on Monday).
+-- Maintained incrementally by EnergyConsumptionDAL.bulk_insert; fleet-wide totals sum these rows.
+CREATE TABLE IF NOT EXISTS energy_consumption_rollup (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    period VARCHAR(5) NOT NULL CHECK (period IN ('day', 'week', 'month', 'year')),
+    period_start DATE NOT NULL,
+    energy_wh DECIMAL(16,3) NOT NULL,
+    days INTEGER NOT NULL,
+    PRIMARY KEY (device_id, period, period_start)
+);
+
+CREATE INDEX IF NOT EXISTS energy_consumption_rollup_period_idx
+    ON energy_consumption_rollup (period, period_start) INCLUDE (energy_wh, days);
+
+-- Seed the rollups from data loaded before this table existed. Run once, before the ETL resumes.
+INSERT INTO energy_consumption_rollup (device_id, period, period_start, energy_wh, days)
+SELECT e.device_id, p.period, date_trunc(p.period, e.used_date)::date, SUM(e.energy_wh), COUNT(*)
+FROM energy_consumption e
+CROSS JOIN (VALUES ('day'), ('week'), ('month'), ('year')) AS p(period)
+GROUP BY e.device_id, p.period, date_trunc(p.period, e.used_date)
+ON CONFLICT DO NOTHING;
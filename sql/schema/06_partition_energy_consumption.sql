@@ -0,0 +1,102 @@
+-- Migrates energy_consumption to monthly range partitions on used_date.
+-- Run it with the ETL workers stopped. The original table is kept as
+-- energy_consumption_unpartitioned and can be dropped once the migration is verified.
+-- Safe to re-run: it does nothing once energy_consumption is partitioned, and on a database
+-- without energy_consumption it creates the partitioned table directly.
+-- The DAL needs no changes: inserts use ON CONFLICT on (device_id, used_date), now the primary key.
+-- Rows dated outside the monthly partitions land in energy_consumption_default instead of
+-- failing the insert; ensure_energy_consumption_partitions moves them out when it creates
+-- their month.
+
+CREATE OR REPLACE FUNCTION ensure_energy_consumption_partitions(from_date DATE, to_date DATE)
+RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::date;
+    partition_name TEXT;
+BEGIN
+    WHILE month_start <= to_date LOOP
+        partition_name := format('energy_consumption_%s', to_char(month_start, 'YYYY_MM'));
+        -- Only take the parent's lock when a partition is actually missing
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                IF to_regclass('energy_consumption_default') IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM energy_consumption_default
+                    WHERE used_date >= month_start AND used_date < (month_start + INTERVAL '1 month')::date
+                ) THEN
+                    -- The default partition holds rows of this month: move them into the new
+                    -- partition before attaching it, or the attach would fail
+                    EXECUTE format('CREATE TABLE %I (LIKE energy_consumption INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM energy_consumption_default WHERE used_date >= %L AND used_date < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                        month_start, (month_start + INTERVAL '1 month')::date, partition_name
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE energy_consumption ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+                    );
+                ELSE
+                    EXECUTE format(
+                        'CREATE TABLE IF NOT EXISTS %I PARTITION OF energy_consumption FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+                    );
+                END IF;
+            EXCEPTION WHEN duplicate_table OR unique_violation THEN
+                -- Created concurrently by another worker
+                NULL;
+            END;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+END;
+$$;
+
+DO $$
+DECLARE
+    current_kind "char" := (SELECT relkind FROM pg_class WHERE oid = to_regclass('energy_consumption'));
+    orphaned BIGINT;
+BEGIN
+    IF current_kind = 'p' THEN
+        RAISE NOTICE 'energy_consumption is already partitioned';
+        CREATE TABLE IF NOT EXISTS energy_consumption_default PARTITION OF energy_consumption DEFAULT;
+        RETURN;
+    END IF;
+
+    CREATE TABLE energy_consumption_partitioned (
+        id BIGSERIAL,
+        device_id VARCHAR(65) REFERENCES devices(id),
+        used_date DATE NOT NULL,
+        energy_wh DECIMAL(12,3) NOT NULL,  -- consumo em Watt-hour
+        created_at TIMESTAMP DEFAULT NOW(),
+        -- Covering key: per-device range reads are served from the index alone
+        PRIMARY KEY (device_id, used_date) INCLUDE (energy_wh)
+    ) PARTITION BY RANGE (used_date);
+    CREATE TABLE energy_consumption_default PARTITION OF energy_consumption_partitioned DEFAULT;
+
+    IF current_kind IS NULL THEN
+        ALTER TABLE energy_consumption_partitioned RENAME TO energy_consumption;
+        PERFORM ensure_energy_consumption_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '1 month')::date);
+    ELSE
+        ALTER TABLE energy_consumption RENAME TO energy_consumption_unpartitioned;
+        ALTER TABLE energy_consumption_partitioned RENAME TO energy_consumption;
+
+        PERFORM ensure_energy_consumption_partitions(
+            COALESCE((SELECT MIN(used_date) FROM energy_consumption_unpartitioned), CURRENT_DATE),
+            (CURRENT_DATE + INTERVAL '1 month')::date
+        );
+
+        INSERT INTO energy_consumption (device_id, used_date, energy_wh, created_at)
+        SELECT device_id, used_date, energy_wh, created_at
+        FROM energy_consumption_unpartitioned
+        WHERE device_id IS NOT NULL;
+
+        -- device_id is part of the primary key now, so rows without one cannot be copied
+        SELECT COUNT(*) INTO orphaned FROM energy_consumption_unpartitioned WHERE device_id IS NULL;
+        IF orphaned > 0 THEN
+            RAISE NOTICE '% rows without device_id were not copied; they remain in energy_consumption_unpartitioned', orphaned;
+        END IF;
+    END IF;
+
+    -- Daily rows arrive roughly in date order, so a BRIN index keeps fleet-wide date scans cheap
+    CREATE INDEX energy_consumption_used_date_brin ON energy_consumption USING BRIN (used_date);
+END;
+$$;
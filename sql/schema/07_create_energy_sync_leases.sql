@@ -0,0 +1,11 @@
+-- Devices currently claimed by an ETL worker. A lease is renewed by the owner's heartbeat
+-- and may be taken over by another worker once expires_at has passed.
+-- Replaces the session-level advisory locks; create it before restarting the workers.
+CREATE TABLE IF NOT EXISTS energy_sync_leases (
+    device_id VARCHAR(65) PRIMARY KEY,
+    owner VARCHAR(255) NOT NULL,
+    acquired_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS energy_sync_leases_expires_at_idx ON energy_sync_leases (expires_at);
@@ -0,0 +1,20 @@
+-- Hourly readings of the current (still open) day, written by etl/poller.py.
+-- Rows are only rewritten when a reading changes; complete days are folded into
+-- energy_consumption once they close and purged after ETL_HOURLY_RETENTION_DAYS.
+CREATE TABLE IF NOT EXISTS energy_consumption_hourly (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    used_date DATE NOT NULL,
+    hour SMALLINT NOT NULL CHECK (hour BETWEEN 0 AND 23),
+    energy_wh DECIMAL(12,3) NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, used_date, hour)
+);
+
+-- Days that entered energy_consumption as the sum of their hourly readings. When the daily
+-- sync later fetches such a day, its value replaces the folded one and the mark is removed.
+CREATE TABLE IF NOT EXISTS energy_consumption_folded (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    used_date DATE NOT NULL,
+    folded_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, used_date)
+);
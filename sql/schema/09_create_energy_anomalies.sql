@@ -0,0 +1,28 @@
+-- Rolling usage statistics per device and weekday (0 = Monday): an exponentially weighted
+-- mean and variance of daily energy_wh, folded forward from each newly inserted batch so
+-- history is never rescanned.
+CREATE TABLE IF NOT EXISTS energy_usage_stats (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    weekday SMALLINT NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+    mean_wh DOUBLE PRECISION NOT NULL,
+    var_wh DOUBLE PRECISION NOT NULL,
+    samples INTEGER NOT NULL,
+    last_date DATE NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, weekday)
+);
+
+-- Days whose usage deviated from the device's weekday statistics by more than
+-- ETL_ANOMALY_Z_THRESHOLD standard deviations when they were inserted.
+CREATE TABLE IF NOT EXISTS energy_anomalies (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    used_date DATE NOT NULL,
+    energy_wh DECIMAL(12,3) NOT NULL,
+    expected_wh DECIMAL(12,3) NOT NULL,
+    z_score DOUBLE PRECISION NOT NULL,
+    kind VARCHAR(8) NOT NULL CHECK (kind IN ('spike', 'drop')),
+    detected_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, used_date)
+);
+
+CREATE INDEX IF NOT EXISTS energy_anomalies_used_date_idx ON energy_anomalies (used_date DESC);
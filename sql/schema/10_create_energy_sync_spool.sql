@@ -0,0 +1,13 @@
+-- Write-ahead spool of LG API windows fetched by the ETL but not yet loaded. A window is
+-- committed here as soon as it is fetched and deleted in the same transaction that loads
+-- it into energy_consumption and advances the read log, so after a crash the fetched
+-- windows are replayed instead of being requested again.
+CREATE TABLE IF NOT EXISTS energy_sync_spool (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    used_dates DATE[] NOT NULL,
+    energy_wh DOUBLE PRECISION[] NOT NULL,
+    spooled_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, start_date, end_date)
+);
@@ -0,0 +1,9 @@
+-- Days the LG API was asked for (with ETL_COVERAGE_PLANNING) but answered without a daily
+-- value. Coverage planning skips them until ETL_GAP_RECHECK_DAYS have passed since the last
+-- check, so a permanent hole in the API's data is not requested again on every sync.
+CREATE TABLE IF NOT EXISTS energy_consumption_empty_days (
+    device_id VARCHAR(65) REFERENCES devices(id),
+    used_date DATE NOT NULL,
+    checked_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (device_id, used_date)
+);
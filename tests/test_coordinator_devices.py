@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+import httpx
+from fastapi.testclient import TestClient
+from common.lg_api_client import AsyncLGApiClient
+from coordinator import main
+
+class ConnPool:
+    """Stand-in for PostgresPool handing out the test connection."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+        self.conn.commit()
+
+    def close(self):
+        pass
+
+def _device(device_id):
+    return {"deviceId": device_id, "deviceInfo": {"deviceType": "DEVICE_WASHER", "modelName": "M", "alias": device_id}}
+
+def test_device_endpoints_go_through_the_async_lg_client(pg_conn, monkeypatch):
+    lg_devices = [_device("d1"), _device("d2")]
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(200, json={"response": list(lg_devices)})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    lg_api_client = AsyncLGApiClient("BR", "key", "client", "token", base_url="http://lg.test", client=client)
+    monkeypatch.setattr(main, "services", main.CoordinatorServices(lg_api_client=lg_api_client, postgres_pool=ConnPool(pg_conn)))
+    http = TestClient(main.app)
+
+    assert http.post("/devices/register", json={"device_ids": ["d1"]}).json() == {"registered": ["d1"], "not_found": []}
+    devices = http.get("/devices").json()
+    assert [d["id"] for d in devices["registered"]] == ["d1"]
+    assert [d["id"] for d in devices["unregistered"]] == ["d2"]
+    assert requests == ["/devices"]
+
+    # An ID missing from the cached list reloads it once before giving up
+    lg_devices.append(_device("d3"))
+    assert http.post("/devices/register", json={"device_ids": ["d3", "nope"]}).json() == {"registered": ["d3"], "not_found": ["nope"]}
+    assert requests == ["/devices", "/devices"]
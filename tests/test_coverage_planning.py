@@ -0,0 +1,80 @@
+from array import array
+from datetime import date, timedelta
+import app
+from common.energy_consumption import EnergyConsumptionBatch
+from common.energy_consumption_dal import EnergyConsumptionDAL
+
+YESTERDAY = date.today() - timedelta(days=1)
+HOLE = (YESTERDAY - timedelta(days=20), YESTERDAY - timedelta(days=18))
+
+class HoleyApi:
+    """Reports 1 Wh for every day except those in HOLE, which the LG API never has."""
+    def __init__(self):
+        self.calls = []
+
+    def get_energy_consumption_batch(self, device_id, start, end):
+        self.calls.append((device_id, start, end))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        days = [day for day in days if not HOLE[0] <= day <= HOLE[1]]
+        return EnergyConsumptionBatch(device_id, array("l", [day.toordinal() for day in days]), array("d", [1.0] * len(days)))
+
+    def close(self):
+        pass
+
+def _run(etl_services, conn, api, recheck_days=7):
+    etl_services(api, ETL_COVERAGE_PLANNING=True, ETL_GAP_RECHECK_DAYS=recheck_days)
+    return app.run_many(["d1"], conn)
+
+def _log_end(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT end_date FROM energy_consumption_read_log WHERE device_id = 'd1';")
+        return cur.fetchone()[0]
+
+def test_missing_ranges_counts_folded_days_and_skips_recent_empty_days(pg_conn):
+    from benchmarks.harness import insert_devices
+    insert_devices(pg_conn, ["d1"])
+    start = date(2025, 3, 1)
+    dal = EnergyConsumptionDAL(pg_conn)
+    dal.bulk_insert_batches([EnergyConsumptionBatch("d1", array("l", [(start + timedelta(days=i)).toordinal() for i in (0, 1, 4, 5)]), array("d", [1.0] * 4))])
+    with pg_conn.cursor() as cur:
+        cur.execute("INSERT INTO energy_consumption_folded (device_id, used_date) VALUES ('d1', %s);", (start + timedelta(days=5),))
+    assert dal.missing_ranges(["d1"], start, start + timedelta(days=6)) == {
+        "d1": [(start + timedelta(days=2), start + timedelta(days=3)), (start + timedelta(days=5), start + timedelta(days=6))]
+    }
+    dal.mark_empty_days([("d1", start, start + timedelta(days=3))])
+    assert dal.missing_ranges(["d1"], start, start + timedelta(days=6), recheck_days=7) == {
+        "d1": [(start + timedelta(days=5), start + timedelta(days=6))]
+    }
+    assert len(dal.missing_ranges(["d1"], start, start + timedelta(days=6), recheck_days=0)["d1"]) == 2
+
+def test_permanent_api_gaps_are_not_refetched(pg_conn, etl_services):
+    from benchmarks.harness import insert_devices
+    insert_devices(pg_conn, ["d1"])
+    api = HoleyApi()
+    assert _run(etl_services, pg_conn, api) == {}
+    assert api.calls
+    assert _log_end(pg_conn) == YESTERDAY
+
+    api = HoleyApi()
+    assert _run(etl_services, pg_conn, api) == {}
+    assert api.calls == []
+    assert EnergyConsumptionDAL(pg_conn).lagging_devices(YESTERDAY) == []
+
+    # Once the recheck interval has passed the hole is asked for again, and only the hole
+    api = HoleyApi()
+    assert _run(etl_services, pg_conn, api, recheck_days=0) == {}
+    assert api.calls == [("d1", *HOLE)]
+
+def test_covered_device_log_catches_up_without_fetching(pg_conn, etl_services):
+    from benchmarks.harness import insert_devices
+    insert_devices(pg_conn, ["d1"])
+    _run(etl_services, pg_conn, HoleyApi())
+    with pg_conn.cursor() as cur:
+        cur.execute("UPDATE energy_consumption_read_log SET end_date = %s;", (YESTERDAY - timedelta(days=90),))
+    pg_conn.commit()
+    assert EnergyConsumptionDAL(pg_conn).lagging_devices(YESTERDAY) != []
+    api = HoleyApi()
+    _run(etl_services, pg_conn, api)
+    assert api.calls == []
+    assert _log_end(pg_conn) == YESTERDAY
+    assert EnergyConsumptionDAL(pg_conn).lagging_devices(YESTERDAY) == []
@@ -0,0 +1,47 @@
+import random
+from datetime import date, timedelta
+from common.date_range_splitter import DateRangeSplitter
+
+D = date(2025, 1, 1)
+
+def _d(offset: int) -> date:
+    return D + timedelta(days=offset)
+
+def test_split_gaps_without_gaps():
+    assert DateRangeSplitter(30).split_gaps([]) == []
+
+def test_split_gaps_covers_a_short_gap_exactly():
+    assert DateRangeSplitter(30).split_gaps([(_d(3), _d(8))]) == [(_d(3), _d(8))]
+
+def test_split_gaps_merges_nearby_gaps_into_one_window():
+    assert DateRangeSplitter(30).split_gaps([(_d(10), _d(12)), (_d(0), _d(2))]) == [(_d(0), _d(12))]
+
+def test_split_gaps_keeps_distant_gaps_apart():
+    assert DateRangeSplitter(30).split_gaps([(_d(0), _d(2)), (_d(40), _d(41))]) == [(_d(0), _d(2)), (_d(40), _d(41))]
+
+def test_split_gaps_continues_a_gap_that_overflows_the_window():
+    assert DateRangeSplitter(30).split_gaps([(_d(0), _d(2)), (_d(30), _d(35))]) == [(_d(0), _d(30)), (_d(31), _d(35))]
+
+def test_split_gaps_cuts_long_gaps_like_split():
+    splitter = DateRangeSplitter(30)
+    assert splitter.split_gaps([(_d(0), _d(100))]) == splitter.split(_d(0), _d(100))
+
+def test_split_gaps_windows_are_legal_and_cover_every_gap_day():
+    rng = random.Random(13)
+    splitter = DateRangeSplitter(30)
+    for _ in range(200):
+        gaps, day = [], 0
+        for _ in range(rng.randint(1, 12)):
+            day += rng.randint(1, 40)
+            length = rng.randint(0, 70)
+            gaps.append((_d(day), _d(day + length)))
+            day += length + 1
+        windows = splitter.split_gaps(gaps)
+        missing = {gap_start + timedelta(days=i) for gap_start, gap_end in gaps for i in range((gap_end - gap_start).days + 1)}
+        covered = {start + timedelta(days=i) for start, end in windows for i in range((end - start).days + 1)}
+        assert missing <= covered
+        for (start, end), following in zip(windows, windows[1:] + [None]):
+            assert 0 <= (end - start).days <= 30
+            # Windows start and end on missing days and never overlap
+            assert start in missing and end in missing
+            assert following is None or end < following[0]
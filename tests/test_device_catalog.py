@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from common import device_catalog
+from common.device_catalog import DeviceCatalog
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(device_catalog, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        if self.release:
+            await self.release.wait()
+        if self.error:
+            raise self.error
+        return [f"device-{self.calls}"]
+
+def test_fresh_entries_are_served_from_cache(clock):
+    async def scenario():
+        loader = Loader()
+        catalog = DeviceCatalog(loader, ttl=60, stale_ttl=600)
+        assert await catalog.get() == ["device-1"]
+        clock.now += 59
+        assert await catalog.get() == ["device-1"]
+        assert loader.calls == 1
+        assert catalog.stats["misses"] == 1 and catalog.stats["hits"] == 1
+
+    asyncio.run(scenario())
+
+def test_stale_entries_are_served_while_one_background_refresh_runs(clock):
+    async def scenario():
+        loader = Loader()
+        catalog = DeviceCatalog(loader, ttl=60, stale_ttl=600)
+        await catalog.get()
+        clock.now += 61
+        loader.release = asyncio.Event()
+        assert await catalog.get() == ["device-1"]
+        assert await catalog.get() == ["device-1"]
+        refresh = catalog._refresh_task
+        loader.release.set()
+        await refresh
+        assert loader.calls == 2
+        assert catalog.stats["stale_hits"] == 2
+        assert await catalog.get() == ["device-2"]
+
+    asyncio.run(scenario())
+
+def test_expired_entries_wait_for_a_reload(clock):
+    async def scenario():
+        loader = Loader()
+        catalog = DeviceCatalog(loader, ttl=60, stale_ttl=600)
+        await catalog.get()
+        clock.now += 661
+        assert await catalog.get() == ["device-2"]
+        assert catalog.stats["misses"] == 2
+
+    asyncio.run(scenario())
+
+def test_concurrent_misses_share_one_load(clock):
+    async def scenario():
+        loader = Loader()
+        loader.release = asyncio.Event()
+        catalog = DeviceCatalog(loader)
+        callers = [asyncio.ensure_future(catalog.get()) for _ in range(8)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        assert await asyncio.gather(*callers) == [["device-1"]] * 8
+        assert loader.calls == 1
+        assert catalog.stats["misses"] == 8
+
+    asyncio.run(scenario())
+
+def test_cancelled_caller_does_not_cancel_the_shared_load(clock):
+    async def scenario():
+        loader = Loader()
+        loader.release = asyncio.Event()
+        catalog = DeviceCatalog(loader)
+        first, second = asyncio.ensure_future(catalog.get()), asyncio.ensure_future(catalog.get())
+        await asyncio.sleep(0)
+        first.cancel()
+        loader.release.set()
+        assert await second == ["device-1"]
+        assert loader.calls == 1
+
+    asyncio.run(scenario())
+
+def test_failed_reload_raises_once_entries_expire(clock):
+    async def scenario():
+        loader = Loader()
+        catalog = DeviceCatalog(loader, ttl=60, stale_ttl=600)
+        await catalog.get()
+        clock.now += 661
+        loader.error = ConnectionError("LG API down")
+        with pytest.raises(ConnectionError):
+            await catalog.get()
+        assert catalog.stats["refresh_errors"] == 1
+
+    asyncio.run(scenario())
+
+def test_invalidate_forces_a_reload(clock):
+    async def scenario():
+        loader = Loader()
+        catalog = DeviceCatalog(loader)
+        await catalog.get()
+        catalog.invalidate()
+        assert await catalog.get() == ["device-2"]
+
+    asyncio.run(scenario())
+
+def test_refresh_started_before_invalidate_is_discarded(clock):
+    async def scenario():
+        loader = Loader()
+        loader.release = asyncio.Event()
+        catalog = DeviceCatalog(loader)
+        waiting = asyncio.ensure_future(catalog.get())
+        await asyncio.sleep(0)
+        stale_load = catalog._refresh_task
+        catalog.invalidate()
+        loader.release.set()
+        await stale_load
+        # The waiting caller gets the list loaded after the invalidation, not the one racing it
+        assert await waiting == ["device-2"]
+        assert loader.calls == 2
+        assert await catalog.get() == ["device-2"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from common.energy_export import _month_segments
+from coordinator import export
+
+def test_month_segments_within_one_month():
+    assert list(_month_segments(date(2025, 3, 5), date(2025, 3, 20))) == [(date(2025, 3, 5), date(2025, 3, 20), False)]
+
+def test_month_segments_split_at_month_boundaries():
+    assert list(_month_segments(date(2024, 11, 15), date(2025, 2, 28))) == [
+        (date(2024, 11, 15), date(2024, 11, 30), False),
+        (date(2024, 12, 1), date(2024, 12, 31), True),
+        (date(2025, 1, 1), date(2025, 1, 31), True),
+        (date(2025, 2, 1), date(2025, 2, 28), True),
+    ]
+
+def test_month_segments_partial_last_month_and_empty_range():
+    assert list(_month_segments(date(2024, 2, 1), date(2024, 2, 28))) == [(date(2024, 2, 1), date(2024, 2, 28), False)]
+    assert list(_month_segments(date(2025, 1, 2), date(2025, 1, 1))) == []
+
+def test_export_cli_parses_dates_devices_and_format():
+    args = export.parse_args(["--start", "2025-01-01", "--end", "2025-06-30", "--device", "d1", "--device", "d2", "--format", "arrow"])
+    assert (args.start, args.end, args.device, args.format, args.output) == (date(2025, 1, 1), date(2025, 6, 30), ["d1", "d2"], "arrow", None)
+    args = export.parse_args(["--start", "2025-01-01", "--end", "2025-01-01", "--output", "energy.parquet"])
+    assert (args.device, args.format, args.output) == (None, "parquet", "energy.parquet")
+
+@pytest.mark.parametrize("argv", [
+    ["--start", "2025-01-01"],
+    ["--start", "2025-13-01", "--end", "2025-06-30"],
+    ["--start", "2025-06-30", "--end", "2025-01-01"],
+    ["--start", "2025-01-01", "--end", "2025-06-30", "--format", "csv"],
+])
+def test_export_cli_rejects_bad_arguments(argv):
+    with pytest.raises(SystemExit):
+        export.parse_args(argv)
+
+def test_export_cli_writes_the_stream_to_the_output_file(tmp_path, monkeypatch):
+    calls = []
+
+    class FakeExporter:
+        def __init__(self, pool, cache=None, batch_rows=None):
+            pass
+
+        def stream(self, start_date, end_date, device_ids, format):
+            calls.append((start_date, end_date, device_ids, format))
+            yield from (b"chunk-1", b"chunk-2")
+
+    monkeypatch.setattr(export, "PostgresConfig", lambda: None)
+    monkeypatch.setattr(export, "PostgresPool", SimpleNamespace(from_config=lambda config: SimpleNamespace(close=lambda: None)))
+    monkeypatch.setattr(export, "EnergyExporter", FakeExporter)
+    output = tmp_path / "energy.parquet"
+    export.main(["--start", "2025-01-01", "--end", "2025-01-31", "--device", "d1", "--output", str(output)])
+    assert calls == [(date(2025, 1, 1), date(2025, 1, 31), ["d1"], "parquet")]
+    assert output.read_bytes() == b"chunk-1chunk-2"
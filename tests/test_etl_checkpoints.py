@@ -0,0 +1,233 @@
+"""
+Spool replay and round checkpoints of `app.run_many`. The fake-DAL tests pin the order of
+writes and commits; the Postgres test crashes a sync midway and resumes it.
+"""
+import threading
+from array import array
+from concurrent.futures import Future
+from datetime import date, timedelta
+import pytest
+import app
+from common.energy_consumption import EnergyConsumptionBatch
+
+YESTERDAY = date.today() - timedelta(days=1)
+
+def _day(offset: int) -> date:
+    return YESTERDAY - timedelta(days=offset)
+
+def _batch(device_id, start, end):
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return EnergyConsumptionBatch(device_id, array("l", [d.toordinal() for d in days]), array("d", [1.0] * len(days)))
+
+class FakeApi:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+        self._lock = threading.Lock()
+
+    def get_energy_consumption_batch(self, device_id, start, end):
+        with self._lock:
+            self.calls.append((device_id, start, end))
+        if (device_id, start, end) in self.failing:
+            raise ConnectionError("LG API unavailable")
+        return _batch(device_id, start, end)
+
+    def close(self):
+        pass
+
+class DeferredFuture(Future):
+    def __init__(self, fn, args):
+        super().__init__()
+        self.fn, self.args = fn, args
+
+    def result(self, timeout=None):
+        if self.set_running_or_notify_cancel():
+            try:
+                self.set_result(self.fn(*self.args))
+            except Exception as e:
+                self.set_exception(e)
+        return super().result(timeout)
+
+class DeferredExecutor:
+    """Runs a fetch only when its result is first awaited, so queued fetches stay cancellable."""
+    def submit(self, fn, *args):
+        return DeferredFuture(fn, args)
+
+    def shutdown(self, wait=True):
+        pass
+
+class FakeStore:
+    """Read logs and spooled windows, plus the ordered writes and commits made against them."""
+    def __init__(self, devices, logs, spool=None):
+        self.devices = set(devices)
+        self.logs = dict(logs)
+        self.spool = dict(spool or {})
+        self.events = []
+
+    def commit(self):
+        self.events.append(("commit",))
+
+    def rollback(self):
+        pass
+
+class FakeDeviceDAL:
+    def __init__(self, store):
+        self.store = store
+
+    def get_many(self, device_ids):
+        return {device_id: device_id for device_id in device_ids if device_id in self.store.devices}
+
+class FakeEnergyConsumptionDAL:
+    def __init__(self, store):
+        self.store = store
+
+    def get_logs(self, device_ids):
+        return {device_id: self.store.logs[device_id] for device_id in device_ids if device_id in self.store.logs}
+
+    def create_logs(self, device_ids, start_date):
+        for device_id in device_ids:
+            self.store.logs[device_id] = (start_date, None)
+
+    def ensure_partitions(self, start_date, end_date):
+        pass
+
+    def bulk_insert_batches(self, batches, return_inserted=False):
+        batches = list(batches)
+        self.store.events.append(("insert", sorted((b.device_id, date.fromordinal(b.used_dates[0]), date.fromordinal(b.used_dates[-1])) for b in batches)))
+        return [(b.device_id, date.fromordinal(d), w) for b in batches for d, w in zip(b.used_dates, b.energy_wh)]
+
+    def update_logs(self, end_dates):
+        self.store.events.append(("update_logs", dict(end_dates)))
+
+class FakeSpoolDAL:
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, device_ids):
+        windows = {}
+        for (device_id, start, end), batch in sorted(self.store.spool.items()):
+            if device_id in device_ids:
+                windows.setdefault(device_id, []).append((start, end, batch))
+        return windows
+
+    def put(self, device_id, start, end, batch):
+        self.store.events.append(("spool_put", (device_id, start, end)))
+
+    def delete(self, windows):
+        windows = sorted(windows)
+        if windows:
+            self.store.events.append(("spool_delete", windows))
+
+@pytest.fixture
+def run_fake(monkeypatch, etl_services):
+    def run(store, api, device_ids, **overrides):
+        etl_services(api, overrides, ETL_COVERAGE_PLANNING=False)
+        monkeypatch.setattr(app, "DeviceDAL", FakeDeviceDAL)
+        monkeypatch.setattr(app, "EnergyConsumptionDAL", FakeEnergyConsumptionDAL)
+        monkeypatch.setattr(app, "EnergySyncSpoolDAL", FakeSpoolDAL)
+        return app.run_many(device_ids, store)
+    return run
+
+def test_each_round_commits_its_rows_logs_and_spool_removal_together(run_fake):
+    first, second = (_day(39), _day(9)), (_day(8), _day(0))
+    store = FakeStore(["a", "b"], {"a": (app.DEFAULT_START, _day(40)), "b": (app.DEFAULT_START, _day(40))})
+    api = FakeApi()
+    assert run_fake(store, api, ["a", "b"]) == {}
+    assert store.events == [
+        ("commit",),
+        ("spool_put", ("a", *first)), ("commit",),
+        ("spool_put", ("b", *first)), ("commit",),
+        ("insert", [("a", *first), ("b", *first)]),
+        ("update_logs", {"a": first[1], "b": first[1]}),
+        ("spool_delete", [("a", *first), ("b", *first)]),
+        ("commit",),
+        ("spool_put", ("a", *second)), ("commit",),
+        ("spool_put", ("b", *second)), ("commit",),
+        ("insert", [("a", *second), ("b", *second)]),
+        ("update_logs", {"a": second[1], "b": second[1]}),
+        ("spool_delete", [("a", *second), ("b", *second)]),
+        ("commit",),
+    ]
+
+def test_spooled_windows_are_replayed_before_fetching(run_fake):
+    chain, superseded = ("a", _day(39), _day(9)), ("a", _day(70), _day(41))
+    detached = ("b", _day(8), _day(0))
+    store = FakeStore(
+        ["a", "b"],
+        {"a": (app.DEFAULT_START, _day(40)), "b": (app.DEFAULT_START, _day(40))},
+        {key: _batch(*key) for key in (chain, superseded, detached)}
+    )
+    api = FakeApi()
+    assert run_fake(store, api, ["a", "b"]) == {}
+    # The window continuing a's log is loaded first; the one it already covers is only dropped
+    assert store.events[:4] == [
+        ("insert", [chain]),
+        ("update_logs", {"a": chain[2]}),
+        ("spool_delete", sorted([chain, superseded])),
+        ("commit",),
+    ]
+    # b's spooled window does not continue its log, so it stands in for the matching fetch
+    assert sorted(api.calls) == [("a", _day(8), _day(0)), ("b", _day(39), _day(9))]
+    assert ("spool_put", detached) not in store.events
+    assert store.events[-4:] == [
+        ("insert", [detached]),
+        ("update_logs", {"b": _day(0)}),
+        ("spool_delete", [detached]),
+        ("commit",),
+    ]
+
+def test_failed_fetch_stops_only_that_device(run_fake):
+    store = FakeStore(["a", "b"], {"a": (app.DEFAULT_START, _day(40)), "b": (app.DEFAULT_START, _day(40))})
+    api = FakeApi(failing=[("b", _day(39), _day(9))])
+    failed = run_fake(store, api, ["a", "b", "unknown"])
+    assert list(failed) == ["b"]
+    log_updates = [event[1] for event in store.events if event[0] == "update_logs"]
+    assert log_updates == [{"a": _day(9)}, {"a": _day(0)}]
+
+def test_failed_device_queued_fetches_are_cancelled(run_fake):
+    store = FakeStore(["a", "b"], {"a": (app.DEFAULT_START, _day(40)), "b": (app.DEFAULT_START, _day(40))})
+    api = FakeApi(failing=[("b", _day(39), _day(9))])
+    # b's second window is queued behind its failing first one when the failure comes back
+    failed = run_fake(store, api, ["a", "b"], fetch_executor=DeferredExecutor())
+    assert list(failed) == ["b"]
+    assert sorted(api.calls) == [("a", _day(39), _day(9)), ("a", _day(8), _day(0)), ("b", _day(39), _day(9))]
+    assert ("spool_put", ("b", _day(8), _day(0))) not in store.events
+
+def _fetchall(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchall()
+
+def test_sync_resumes_from_the_spool_after_a_crash(pg_conn, monkeypatch, etl_services):
+    from benchmarks.harness import insert_devices
+    insert_devices(pg_conn, ["a", "b"])
+    with pg_conn.cursor() as cur:
+        cur.execute("INSERT INTO energy_consumption_read_log (device_id, start_date, end_date) VALUES ('a', %s, %s), ('b', %s, %s);",
+            (app.DEFAULT_START, _day(40), app.DEFAULT_START, _day(40)))
+    pg_conn.commit()
+
+    rounds = []
+
+    def crash_on_second_round(conn, rows):
+        rounds.append(len(rows))
+        if len(rounds) == 2:
+            raise RuntimeError("worker died")
+        return 0
+
+    etl_services(FakeApi(), ETL_COVERAGE_PLANNING=False)
+    monkeypatch.setattr(app, "detect_anomalies", crash_on_second_round)
+    with pytest.raises(RuntimeError):
+        app.run_many(["a", "b"], pg_conn)
+    pg_conn.rollback()
+    assert _fetchall(pg_conn, "SELECT device_id, end_date FROM energy_consumption_read_log ORDER BY 1;") == [("a", _day(9)), ("b", _day(9))]
+    assert _fetchall(pg_conn, "SELECT device_id, start_date, end_date FROM energy_sync_spool ORDER BY 1;") == [("a", _day(8), _day(0)), ("b", _day(8), _day(0))]
+
+    api = FakeApi()
+    etl_services(api, ETL_COVERAGE_PLANNING=False)
+    monkeypatch.setattr(app, "detect_anomalies", lambda conn, rows: 0)
+    assert app.run_many(["a", "b"], pg_conn) == {}
+    assert api.calls == []
+    assert _fetchall(pg_conn, "SELECT device_id, end_date FROM energy_consumption_read_log ORDER BY 1;") == [("a", _day(0)), ("b", _day(0))]
+    assert _fetchall(pg_conn, "SELECT COUNT(*) FROM energy_sync_spool;") == [(0,)]
+    assert _fetchall(pg_conn, "SELECT device_id, COUNT(*) FROM energy_consumption GROUP BY 1 ORDER BY 1;") == [("a", 40), ("b", 40)]
+    assert _fetchall(pg_conn, "SELECT device_id, SUM(days) FROM energy_consumption_rollup WHERE period = 'year' GROUP BY 1 ORDER BY 1;") == [("a", 40), ("b", 40)]
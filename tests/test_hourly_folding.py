@@ -0,0 +1,19 @@
+from datetime import date
+from common.energy_consumption import EnergyConsumption, EnergyConsumptionHourly
+from common.energy_consumption_dal import EnergyConsumptionDAL
+from common.energy_consumption_hourly_dal import EnergyConsumptionHourlyDAL
+
+DAY = date(2025, 3, 4)
+
+def test_daily_value_replacing_a_folded_day_is_returned_for_rescoring(pg_conn):
+    from benchmarks.harness import insert_devices
+    insert_devices(pg_conn, ["d1"])
+    EnergyConsumptionHourlyDAL(pg_conn).upsert(EnergyConsumptionHourly("d1", DAY, hour, 10.0) for hour in range(24))
+    dal = EnergyConsumptionDAL(pg_conn)
+    assert dal.fold_hourly(date(2025, 3, 5), return_inserted=True) == [("d1", DAY, 240.0)]
+
+    returned = dal.bulk_insert([EnergyConsumption("d1", DAY, 300.0), EnergyConsumption("d1", date(2025, 3, 5), 50.0)], return_inserted=True)
+    assert sorted(returned) == [("d1", DAY, 300.0), ("d1", date(2025, 3, 5), 50.0)]
+    with pg_conn.cursor() as cur:
+        cur.execute("SELECT energy_wh::float8, days FROM energy_consumption_rollup WHERE period = 'month';")
+        assert cur.fetchall() == [(350.0, 2)]
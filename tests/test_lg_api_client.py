@@ -0,0 +1,88 @@
+import asyncio
+import random
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+import httpx
+import pytest
+from common import lg_api_client
+from common.lg_api_client import AsyncLGApiClient, _backoff_delay, _retry_after_seconds
+
+def test_backoff_delay_stays_within_the_exponential_cap():
+    random.seed(1)
+    for attempt in range(10):
+        for _ in range(50):
+            assert 0 <= _backoff_delay(attempt, base=0.5, cap=30.0) <= min(30.0, 0.5 * 2 ** attempt)
+
+def test_backoff_delay_honours_retry_after_up_to_the_cap():
+    assert _backoff_delay(0, retry_after=5.0, base=0.5, cap=30.0) >= 5.0
+    assert _backoff_delay(0, retry_after=120.0, base=0.5, cap=30.0) == 30.0
+
+def test_retry_after_seconds_parses_seconds_and_http_dates():
+    assert _retry_after_seconds("7") == 7.0
+    assert _retry_after_seconds("-3") == 0.0
+    assert _retry_after_seconds(None) is None
+    assert _retry_after_seconds("soon") is None
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 <= _retry_after_seconds(format_datetime(retry_at, usegmt=True)) <= 60
+
+DEVICES = {"response": [{"deviceId": "d1", "deviceInfo": {"deviceType": "DEVICE_WASHER", "modelName": "M", "alias": "Washer"}}]}
+
+def _async_client(handler, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncLGApiClient("BR", "key", "client", "token", base_url="http://lg.test", client=client, **kwargs)
+
+def test_async_client_retries_throttled_requests_honouring_retry_after(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(lg_api_client.asyncio, "sleep", sleep)
+    message_ids = []
+
+    def handler(request):
+        message_ids.append(request.headers["x-message-id"])
+        if len(message_ids) < 3:
+            return httpx.Response(429, headers={"Retry-After": "2"})
+        return httpx.Response(200, json=DEVICES)
+
+    async def scenario():
+        api = _async_client(handler, max_retries=3)
+        try:
+            return await api.get_devices()
+        finally:
+            await api.aclose()
+
+    devices = asyncio.run(scenario())
+    assert [device.id for device in devices] == ["d1"]
+    assert len(delays) == 2 and all(delay >= 2 for delay in delays)
+    assert len(set(message_ids)) == 3
+
+def test_async_client_gives_up_after_max_retries(monkeypatch):
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(lg_api_client.asyncio, "sleep", sleep)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    async def scenario():
+        api = _async_client(handler, max_retries=2)
+        try:
+            await api.get_devices()
+        finally:
+            await api.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scenario())
+    assert len(calls) == 3
+
+def test_abnormal_result_codes_raise_lg_api_errors():
+    client = _async_client(lambda request: httpx.Response(200, json={"response": {"resultCode": "1212"}}))
+    with pytest.raises(lg_api_client.LGApiError) as raised:
+        asyncio.run(client.get_energy_consumption("d1", date(2025, 1, 1), date(2025, 1, 31)))
+    assert raised.value.result_code == "1212" and raised.value.permanent
+    assert not lg_api_client.LGApiError("9999").permanent
@@ -0,0 +1,38 @@
+from datetime import date
+from benchmarks.harness import PARTITION_SCRIPT, SCHEMA_DIR, insert_devices
+from common.energy_consumption import EnergyConsumption
+from common.energy_consumption_dal import EnergyConsumptionDAL
+
+def _fetchall(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchall()
+
+def _partition_of(conn, device_id, used_date):
+    with conn.cursor() as cur:
+        cur.execute("SELECT tableoid::regclass::text FROM energy_consumption WHERE device_id = %s AND used_date = %s;", (device_id, used_date))
+        return cur.fetchone()[0]
+
+def test_migration_reports_rows_it_cannot_copy(pg_conn):
+    insert_devices(pg_conn, ["d1"])
+    with pg_conn.cursor() as cur:
+        cur.execute("INSERT INTO energy_consumption (device_id, used_date, energy_wh) VALUES ('d1', '2024-05-01', 1), (NULL, '2024-05-02', 2);")
+        cur.execute((SCHEMA_DIR / PARTITION_SCRIPT).read_text())
+    pg_conn.commit()
+    assert any("1 rows without device_id were not copied" in notice for notice in pg_conn.notices)
+    assert _fetchall(pg_conn, "SELECT device_id, used_date FROM energy_consumption;") == [("d1", date(2024, 5, 1))]
+    assert _fetchall(pg_conn, "SELECT COUNT(*) FROM energy_consumption_unpartitioned WHERE device_id IS NULL;") == [(1,)]
+
+def test_rows_outside_the_partitions_wait_in_the_default_partition(pg_conn):
+    insert_devices(pg_conn, ["d1"])
+    with pg_conn.cursor() as cur:
+        cur.execute((SCHEMA_DIR / PARTITION_SCRIPT).read_text())
+    dal = EnergyConsumptionDAL(pg_conn)
+    # No ensure_partitions before the insert: the row is kept rather than rejected
+    assert dal.bulk_insert([EnergyConsumption("d1", date(2020, 1, 15), 5.0)]) == 1
+    assert _partition_of(pg_conn, "d1", date(2020, 1, 15)) == "energy_consumption_default"
+
+    dal.ensure_partitions(date(2020, 1, 1), date(2020, 2, 1))
+    assert _partition_of(pg_conn, "d1", date(2020, 1, 15)) == "energy_consumption_2020_01"
+    assert _fetchall(pg_conn, "SELECT COUNT(*) FROM energy_consumption_default;") == [(0,)]
+    assert dal.bulk_insert([EnergyConsumption("d1", date(2020, 1, 15), 5.0), EnergyConsumption("d1", date(2020, 2, 3), 1.0)]) == 1
@@ -0,0 +1,40 @@
+import csv
+import io
+import pytest
+from common.pg_copy import IterableCsvStream
+
+ROWS = [("d1", "2025-01-01", 1.5), ("d,2", "2025-01-02", None), ('d"3', "2025-01-03", 0)]
+
+def _expected_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+def test_iterable_csv_stream_reads_everything_at_once():
+    stream = IterableCsvStream(iter(ROWS))
+    assert stream.read() == _expected_csv(ROWS)
+    assert stream.read() == ""
+
+@pytest.mark.parametrize("size", [1, 7, 16, 1024])
+def test_iterable_csv_stream_reads_in_chunks(size):
+    stream = IterableCsvStream(iter(ROWS * 20))
+    chunks = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        assert len(chunk) <= size
+        chunks.append(chunk)
+    assert "".join(chunks) == _expected_csv(ROWS * 20)
+
+def test_iterable_csv_stream_is_lazy():
+    consumed = []
+
+    def rows():
+        for row in ROWS * 100:
+            consumed.append(row)
+            yield row
+
+    stream = IterableCsvStream(rows())
+    stream.read(10)
+    assert len(consumed) < len(ROWS) * 100
@@ -0,0 +1,75 @@
+import pytest
+from pika.exceptions import AMQPConnectionError
+from common import rabbitmq_publisher
+from common.rabbitmq_publisher import RabbitMQPublisher
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_closed = False
+        self.pending = []
+
+    def queue_declare(self, queue):
+        pass
+
+    def tx_select(self):
+        self.broker.events.append("tx_select")
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if self.broker.fail_on == body:
+            self.broker.fail_on = None
+            raise AMQPConnectionError("connection reset")
+        self.pending.append(body)
+
+    def tx_commit(self):
+        self.broker.events.append(("commit", len(self.pending)))
+        self.broker.queue.extend(self.pending)
+        self.pending = []
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+        self.is_closed = False
+
+    def channel(self):
+        return FakeChannel(self.broker)
+
+    def process_data_events(self, time_limit):
+        pass
+
+    def close(self):
+        self.is_open, self.is_closed = False, True
+
+class FakeBroker:
+    def __init__(self, monkeypatch):
+        self.queue = []
+        self.events = []
+        self.fail_on = None
+        monkeypatch.setattr(rabbitmq_publisher.pika, "BlockingConnection", lambda params: FakeConnection(self))
+        monkeypatch.setattr(rabbitmq_publisher.time, "sleep", lambda seconds: None)
+
+def test_batch_waits_for_the_broker_once_per_chunk(monkeypatch):
+    broker = FakeBroker(monkeypatch)
+    publisher = RabbitMQPublisher("rabbitmq", "queue", commit_every=4)
+    bodies = [str(i).encode() for i in range(10)]
+    assert publisher.publish_batch(bodies) == 10
+    assert broker.events == ["tx_select", ("commit", 4), ("commit", 4), ("commit", 2)]
+    assert broker.queue == bodies
+
+def test_uncommitted_messages_are_resent_after_reconnecting(monkeypatch):
+    broker = FakeBroker(monkeypatch)
+    publisher = RabbitMQPublisher("rabbitmq", "queue", commit_every=4)
+    bodies = [str(i).encode() for i in range(6)]
+    broker.fail_on = b"5"
+    assert publisher.publish_batch(bodies) == 6
+    # The first chunk was committed; the second is published again in full on the new channel
+    assert broker.events == ["tx_select", ("commit", 4), "tx_select", ("commit", 2)]
+    assert broker.queue == bodies
+
+def test_gives_up_after_max_reconnects(monkeypatch):
+    FakeBroker(monkeypatch)
+    monkeypatch.setattr(rabbitmq_publisher.pika, "BlockingConnection", lambda params: (_ for _ in ()).throw(AMQPConnectionError("refused")))
+    publisher = RabbitMQPublisher("rabbitmq", "queue", max_reconnects=2)
+    with pytest.raises(AMQPConnectionError):
+        publisher.publish_batch([b"d1"])
@@ -0,0 +1,59 @@
+from dataclasses import replace
+from types import SimpleNamespace
+import pika
+import pytest
+import worker
+from common.config import EtlConfig, RabbitMQConfig, SyncConfig
+from common.lg_api_client import LGApiError, LGApiResponseCode
+from common.sync_retry import DEAD_LETTER_REASON_HEADER, RETRY_COUNT_HEADER
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+        self.acked = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, properties.headers))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+class InlineConnection:
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+@pytest.fixture
+def retry_later():
+    etl_worker = worker.EtlWorker(
+        services=SimpleNamespace(etl_config=EtlConfig()),
+        rabbitmq_config=replace(RabbitMQConfig(), RABBITMQ_QUEUE="sync"),
+        sync_config=replace(SyncConfig(), SYNC_RETRY_DELAYS=(5, 30), SYNC_MAX_RETRIES=2)
+    )
+    etl_worker.connection = InlineConnection()
+    channel = FakeChannel()
+
+    def retry(retries, error=None):
+        properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: retries} if retries else None)
+        etl_worker._retry_later(channel, 7, b"d1", properties, error)
+        (published,) = channel.published
+        channel.published = []
+        return published
+    retry.channel = channel
+    return retry
+
+def test_failed_syncs_back_off_through_the_delay_queues(retry_later):
+    assert retry_later(0, ConnectionError("LG API down")) == ("sync.retry.5s", b"d1", {RETRY_COUNT_HEADER: 1})
+    assert retry_later(1, ConnectionError("LG API down")) == ("sync.retry.30s", b"d1", {RETRY_COUNT_HEADER: 2})
+    assert retry_later.channel.acked == [7, 7]
+
+def test_sync_is_dead_lettered_once_retries_are_spent(retry_later):
+    queue, _, headers = retry_later(2, ConnectionError("LG API down"))
+    assert queue == "sync.dead"
+    assert headers == {RETRY_COUNT_HEADER: 2, DEAD_LETTER_REASON_HEADER: "max_retries"}
+    assert retry_later.channel.acked == [7]
+
+def test_permanent_lg_errors_are_dead_lettered_without_retrying(retry_later):
+    queue, _, headers = retry_later(0, LGApiError(LGApiResponseCode.NOT_OWNED_DEVICE.value))
+    assert queue == "sync.dead"
+    assert headers == {DEAD_LETTER_REASON_HEADER: "permanent_error"}
+    assert retry_later(0, LGApiError(LGApiResponseCode.FAIL_REQUEST.value))[0] == "sync.retry.5s"
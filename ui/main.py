@@ -1,46 +1,72 @@
+import html
+import os
+from string import Template
+from urllib.parse import urlencode
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import requests
+import httpx
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-COORDINATOR_URL = "http://coordinator:8000"
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "http://coordinator:8000")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ROWS_PER_CHUNK = 100
 
-@app.get("/", response_class=HTMLResponse)
-def index():
-    resp = requests.get(f"{COORDINATOR_URL}/devices")
-    data = resp.json()
-    registered = data.get("registered", [])
-    unregistered = data.get("unregistered", [])
-    html = f"""
+# Shared pooled client, opened with the app so every request reuses keep-alive connections
+coordinator_client = None
+
+@app.on_event("startup")
+async def open_coordinator_client():
+    global coordinator_client
+    coordinator_client = httpx.AsyncClient(base_url=COORDINATOR_URL, timeout=30.0)
+
+@app.on_event("shutdown")
+async def close_coordinator_client():
+    await coordinator_client.aclose()
+
+# Templates are parsed once at import; rows are rendered into lists and joined per chunk
+PAGE_HEAD = """
     <html>
     <head>
         <title>Device Management UI</title>
         <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; background: #f7f7f7; }}
-            h1 {{ color: #333; text-align: center; }}
-            .container {{ max-width: 1400px; margin: auto; background: #fff; padding: 30px; border-radius: 8px; box-shadow: 0 2px 8px #ccc; }}
-            .section {{ margin-bottom: 30px; }}
-            table {{ width: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-            th, td {{ padding: 10px; text-align: left; }}
-            th {{ background: #1976d2; color: #fff; }}
-            tr.registered {{ background: #e8f5e9; }}
-            tr.unregistered {{ background: #ffebee; }}
-            tr:nth-child(even) {{ background: #f5f5f5; }}
-            .registered-text {{ color: #2e7d32; font-weight: bold; }}
-            .unregistered-text {{ color: #c62828; font-weight: bold; }}
-            .msg {{ background: #e3f2fd; color: #1565c0; padding: 10px; border-radius: 5px; margin-bottom: 20px; }}
-            button {{ background: #1976d2; color: #fff; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; }}
-            button:hover {{ background: #1565c0; }}
+            body { font-family: Arial, sans-serif; margin: 40px; background: #f7f7f7; }
+            h1 { color: #333; text-align: center; }
+            .container { max-width: 1400px; margin: auto; background: #fff; padding: 30px; border-radius: 8px; box-shadow: 0 2px 8px #ccc; }
+            .section { margin-bottom: 30px; }
+            table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
+            th, td { padding: 10px; text-align: left; }
+            th { background: #1976d2; color: #fff; }
+            tr.registered { background: #e8f5e9; }
+            tr.unregistered { background: #ffebee; }
+            tr:nth-child(even) { background: #f5f5f5; }
+            .registered-text { color: #2e7d32; font-weight: bold; }
+            .unregistered-text { color: #c62828; font-weight: bold; }
+            .msg { background: #e3f2fd; color: #1565c0; padding: 10px; border-radius: 5px; margin-bottom: 20px; }
+            .pager a { margin-right: 15px; }
+            button { background: #1976d2; color: #fff; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; }
+            button:hover { background: #1565c0; }
         </style>
     </head>
     <body>
     <div class="container">
     <h1></h1>
+"""
+
+FILTER_FORM = Template("""
+        <form method='get' action='/' class="section">
+            <input type='text' name='q' value='$q' placeholder='Filter by alias, type, model or ID'>
+            <input type='hidden' name='page_size' value='$page_size'>
+            <button type='submit'>Filter</button>
+        </form>
+""")
+
+REGISTERED_HEAD = Template("""
         <div class="section">
-            <h2>Registered Devices</h2>
+            <h2>Registered Devices ($total)</h2>
             <table>
                 <tr>
                     <th>Alias</th>
@@ -49,14 +75,15 @@ def index():
                     <th>ID</th>
                     <th>Action</th>
                 </tr>
-    """
-    for d in registered:
-        html += f"<tr class='registered'><td class='registered-text'>{d['alias']}</td><td>{d['device_type']}</td><td>{d['model_name']}</td><td>{d['id']}</td><td><form method='post' action='/sync_energy' style='display:inline;'><input type='hidden' name='device_id' value='{d['id']}'><button type='submit'>Sync Energy</button></form></td></tr>"
-    html += """
+""")
+
+REGISTERED_ROW = Template("<tr class='registered'><td class='registered-text'>$alias</td><td>$device_type</td><td>$model_name</td><td>$id</td><td><form method='post' action='/sync_energy' style='display:inline;'><input type='hidden' name='device_id' value='$id'><button type='submit'>Sync Energy</button></form></td></tr>")
+
+UNREGISTERED_HEAD = Template("""
             </table>
         </div>
         <div class="section">
-            <h2>Unregistered Devices</h2>
+            <h2>Unregistered Devices ($total)</h2>
             <form method='post' action='/register'>
             <table>
                 <tr>
@@ -66,26 +93,79 @@ def index():
                     <th>ID</th>
                     <th>Action</th>
                 </tr>
-    """
-    for d in unregistered:
-        html += f"<tr class='unregistered'><td class='unregistered-text'>{d['alias']}</td><td>{d['device_type']}</td><td>{d['model_name']}</td><td>{d['id']}</td><td><input type='checkbox' name='device_ids' value='{d['id']}'></td></tr>"
-    html += """
+""")
+
+UNREGISTERED_ROW = Template("<tr class='unregistered'><td class='unregistered-text'>$alias</td><td>$device_type</td><td>$model_name</td><td>$id</td><td><input type='checkbox' name='device_ids' value='$id'></td></tr>")
+
+PAGE_TAIL = Template("""
             </table>
             <button type='submit'>Register Selected Devices</button>
             </form>
         </div>
+        <div class="pager">$pager</div>
     </div>
     </body>
     </html>
-    """
-    return html
+""")
+
+ERROR_MESSAGE = Template("<div class='msg'>Could not load devices from the coordinator: $error</div></div></body></html>")
+
+def _escaped(device):
+    return {key: html.escape(str(device.get(key) or ""), quote=True) for key in ("alias", "device_type", "model_name", "id")}
+
+def _render_rows(template, devices):
+    for i in range(0, len(devices), ROWS_PER_CHUNK):
+        yield "".join([template.substitute(_escaped(d)) for d in devices[i:i + ROWS_PER_CHUNK]])
+
+def _pager(q, page, page_size, total):
+    links = []
+    if page > 1:
+        links.append(f"<a href='/?{html.escape(urlencode({'q': q, 'page': page - 1, 'page_size': page_size}))}'>&laquo; Previous</a>")
+    if page * page_size < total:
+        links.append(f"<a href='/?{html.escape(urlencode({'q': q, 'page': page + 1, 'page_size': page_size}))}'>Next &raquo;</a>")
+    return f"Page {page} " + "".join(links)
+
+@app.get("/")
+async def index(q: str = "", page: int = 1, page_size: int = DEFAULT_PAGE_SIZE):
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+
+    async def render():
+        # Send the page head before waiting on the coordinator so the browser can start rendering
+        yield PAGE_HEAD
+        yield FILTER_FORM.substitute(q=html.escape(q, quote=True), page_size=page_size)
+        params = {"offset": (page - 1) * page_size, "limit": page_size}
+        if q:
+            params["q"] = q
+        try:
+            resp = await coordinator_client.get("/devices", params=params)
+            resp.raise_for_status()
+            data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # ValueError covers a body that is not valid JSON (e.g. a proxy's HTML error page)
+            yield ERROR_MESSAGE.substitute(error=html.escape(str(e)))
+            return
+        registered = data.get("registered", [])
+        unregistered = data.get("unregistered", [])
+        registered_total = data.get("registered_total", len(registered))
+        unregistered_total = data.get("unregistered_total", len(unregistered))
+
+        yield REGISTERED_HEAD.substitute(total=registered_total)
+        for chunk in _render_rows(REGISTERED_ROW, registered):
+            yield chunk
+        yield UNREGISTERED_HEAD.substitute(total=unregistered_total)
+        for chunk in _render_rows(UNREGISTERED_ROW, unregistered):
+            yield chunk
+        yield PAGE_TAIL.substitute(pager=_pager(q, page, page_size, max(registered_total, unregistered_total)))
+
+    return StreamingResponse(render(), media_type="text/html")
 
 
 @app.post("/register")
 async def register(request: Request):
     form = await request.form()
     device_ids = form.getlist('device_ids')
-    resp = requests.post(f"{COORDINATOR_URL}/devices/register", json={"device_ids": device_ids})
+    await coordinator_client.post("/devices/register", json={"device_ids": device_ids})
     return RedirectResponse("/", status_code=303)
 
 # Endpoint to trigger device energy consumption sync
@@ -94,5 +174,5 @@ async def sync_energy(request: Request):
     form = await request.form()
     device_id = form.get('device_id')
     if device_id:
-        requests.post(f"{COORDINATOR_URL}/devices/sync_energy", json={"device_id": device_id})
+        await coordinator_client.post("/devices/sync_energy", json={"device_id": device_id})
     return RedirectResponse("/", status_code=303)